@@ -12,7 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 # Import our database models
 from app.database import Base
-from app.db_models import User, Goal, Path, Recipe, RecipeSuggestion, RecipeFeedback, UserPreference
+from app.db_models import User, Goal, Path, Recipe, RecipeIndexOutbox, RecipeCard, CacheInvalidation, RecipeSuggestion, RecipeFeedback, RecipeStats, UserPreference, UserTasteVector, LlmUsage, UserTokenUsage
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,121 @@
+"""Add query-shaped indexes and promote recipe metadata to indexed columns
+
+Revision ID: 8d41f0c6a2e7
+Revises: 3a7c2e9b41d5
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+import re
+from typing import Any, Dict, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0c6a2e7'
+down_revision: Union[str, Sequence[str], None] = '3a7c2e9b41d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Frozen copy of app.db_models.recipe_metadata_columns as of this revision, so
+# later changes to the app don't change what this migration does
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)\b", re.IGNORECASE)
+
+
+def _parse_minutes(value: Any) -> Optional[int]:
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return int(sum(float(n) * (60 if unit.lower().startswith("h") else 1) for n, unit in parts))
+
+
+def _recipe_metadata_columns(metadata: Optional[Dict]) -> Dict:
+    metadata = metadata or {}
+    return {
+        "cuisine": metadata.get("cuisine"),
+        "difficulty": metadata.get("difficulty"),
+        "prep_minutes": _parse_minutes(metadata.get("prep_time")),
+        "cook_minutes": _parse_minutes(metadata.get("cook_time")),
+    }
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Goals: match get_user_goals (user_id [, status] ORDER BY created_at DESC)
+    op.create_index('ix_goals_user_status_created', 'goals', ['user_id', 'status', 'created_at'], unique=False)
+    op.create_index('ix_goals_user_created', 'goals', ['user_id', 'created_at'], unique=False)
+
+    # Foreign-key indexes
+    op.create_index(op.f('ix_paths_goal_id'), 'paths', ['goal_id'], unique=False)
+    op.create_index('ix_recipe_suggestions_user_suggested', 'recipe_suggestions', ['user_id', 'suggested_at'], unique=False)
+    op.create_index(op.f('ix_recipe_suggestions_goal_id'), 'recipe_suggestions', ['goal_id'], unique=False)
+    op.create_index(op.f('ix_recipe_suggestions_recipe_id'), 'recipe_suggestions', ['recipe_id'], unique=False)
+    op.create_index(op.f('ix_recipe_feedback_recipe_id'), 'recipe_feedback', ['recipe_id'], unique=False)
+    op.create_index(op.f('ix_recipe_feedback_user_id'), 'recipe_feedback', ['user_id'], unique=False)
+    op.create_index(op.f('ix_user_preferences_user_id'), 'user_preferences', ['user_id'], unique=False)
+
+    # Recipes: promote metadata_json fields to real columns
+    op.add_column('recipes', sa.Column('cuisine', sa.String(length=50), nullable=True))
+    op.add_column('recipes', sa.Column('difficulty', sa.String(length=20), nullable=True))
+    op.add_column('recipes', sa.Column('prep_minutes', sa.Integer(), nullable=True))
+    op.add_column('recipes', sa.Column('cook_minutes', sa.Integer(), nullable=True))
+
+    # Backfill from metadata_json (durations are free text, so parse in Python)
+    recipes = sa.table(
+        'recipes',
+        sa.column('id', sa.Integer()),
+        sa.column('metadata_json', sa.JSON()),
+        sa.column('cuisine', sa.String()),
+        sa.column('difficulty', sa.String()),
+        sa.column('prep_minutes', sa.Integer()),
+        sa.column('cook_minutes', sa.Integer()),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(recipes.c.id, recipes.c.metadata_json)).all()
+    updates = [{"recipe_id": row.id, **_recipe_metadata_columns(row.metadata_json)} for row in rows]
+    if updates:
+        connection.execute(
+            recipes.update()
+            .where(recipes.c.id == sa.bindparam('recipe_id'))
+            .values(
+                cuisine=sa.bindparam('cuisine'),
+                difficulty=sa.bindparam('difficulty'),
+                prep_minutes=sa.bindparam('prep_minutes'),
+                cook_minutes=sa.bindparam('cook_minutes'),
+            ),
+            updates
+        )
+
+    op.create_index('ix_recipes_cuisine_difficulty', 'recipes', ['cuisine', 'difficulty'], unique=False)
+    op.create_index('ix_recipes_difficulty', 'recipes', ['difficulty'], unique=False)
+    op.create_index('ix_recipes_prep_minutes', 'recipes', ['prep_minutes'], unique=False)
+    op.create_index('ix_recipes_cook_minutes', 'recipes', ['cook_minutes'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_recipes_cook_minutes', table_name='recipes')
+    op.drop_index('ix_recipes_prep_minutes', table_name='recipes')
+    op.drop_index('ix_recipes_difficulty', table_name='recipes')
+    op.drop_index('ix_recipes_cuisine_difficulty', table_name='recipes')
+    with op.batch_alter_table('recipes') as batch_op:
+        batch_op.drop_column('cook_minutes')
+        batch_op.drop_column('prep_minutes')
+        batch_op.drop_column('difficulty')
+        batch_op.drop_column('cuisine')
+
+    op.drop_index(op.f('ix_user_preferences_user_id'), table_name='user_preferences')
+    op.drop_index(op.f('ix_recipe_feedback_user_id'), table_name='recipe_feedback')
+    op.drop_index(op.f('ix_recipe_feedback_recipe_id'), table_name='recipe_feedback')
+    op.drop_index(op.f('ix_recipe_suggestions_recipe_id'), table_name='recipe_suggestions')
+    op.drop_index(op.f('ix_recipe_suggestions_goal_id'), table_name='recipe_suggestions')
+    op.drop_index('ix_recipe_suggestions_user_suggested', table_name='recipe_suggestions')
+    op.drop_index(op.f('ix_paths_goal_id'), table_name='paths')
+    op.drop_index('ix_goals_user_created', table_name='goals')
+    op.drop_index('ix_goals_user_status_created', table_name='goals')
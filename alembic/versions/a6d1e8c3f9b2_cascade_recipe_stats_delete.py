@@ -0,0 +1,42 @@
+"""Delete recipe_stats rows with their recipe
+
+Revision ID: a6d1e8c3f9b2
+Revises: f2c8d5a1b7e4
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d1e8c3f9b2'
+down_revision: Union[str, Sequence[str], None] = 'f2c8d5a1b7e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FK_NAME = 'fk_recipe_stats_recipe_id_recipes'
+# SQLite foreign keys are unnamed; batch mode reflects them under this convention
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _replace_recipe_fk(old_name: str, ondelete) -> None:
+    with op.batch_alter_table('recipe_stats', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(old_name, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'recipes', ['recipe_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # c5a8f1e2d6b9 created the constraint without a name
+    if op.get_bind().dialect.name == 'postgresql':
+        old_name = 'recipe_stats_recipe_id_fkey'
+    else:
+        old_name = FK_NAME
+    _replace_recipe_fk(old_name, 'CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_recipe_fk(FK_NAME, None)
@@ -0,0 +1,40 @@
+"""Suggest a recipe at most once per goal
+
+Revision ID: b3e9f4a7c2d8
+Revises: a6d1e8c3f9b2
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9f4a7c2d8'
+down_revision: Union[str, Sequence[str], None] = 'a6d1e8c3f9b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Concurrent requests could suggest a recipe twice for a goal; keep the first
+    op.execute("""
+        DELETE FROM recipe_suggestions
+        WHERE goal_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM recipe_suggestions
+              WHERE goal_id IS NOT NULL
+              GROUP BY goal_id, recipe_id
+          )
+    """)
+    op.create_index('uq_recipe_suggestions_goal_recipe', 'recipe_suggestions', ['goal_id', 'recipe_id'], unique=True)
+    # goal_id is the unique index's leading column, so it serves goal lookups too
+    op.drop_index(op.f('ix_recipe_suggestions_goal_id'), table_name='recipe_suggestions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_recipe_suggestions_goal_id'), 'recipe_suggestions', ['goal_id'], unique=False)
+    op.drop_index('uq_recipe_suggestions_goal_recipe', table_name='recipe_suggestions')
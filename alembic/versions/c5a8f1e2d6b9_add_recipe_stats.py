@@ -0,0 +1,59 @@
+"""Add recipe_stats feedback rollup table
+
+Revision ID: c5a8f1e2d6b9
+Revises: b7e2d9a4c1f3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a8f1e2d6b9'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d9a4c1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('recipe_stats',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('feedback_count', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('avg_rating', sa.Float(), nullable=True),
+    sa.Column('likes', sa.Integer(), nullable=False),
+    sa.Column('dislikes', sa.Integer(), nullable=False),
+    sa.Column('last_feedback_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+    sa.PrimaryKeyConstraint('recipe_id')
+    )
+    op.create_index('ix_recipe_stats_likes', 'recipe_stats', ['likes'], unique=False)
+    op.create_index('ix_recipe_stats_avg_rating', 'recipe_stats', ['avg_rating'], unique=False)
+
+    # Backfill from the feedback already recorded
+    op.execute("""
+        INSERT INTO recipe_stats (recipe_id, feedback_count, rating_count, rating_sum, avg_rating,
+                                  likes, dislikes, last_feedback_at)
+        SELECT recipe_id,
+               COUNT(*),
+               COUNT(rating),
+               COALESCE(SUM(rating), 0),
+               AVG(rating),
+               SUM(CASE WHEN liked THEN 1 ELSE 0 END),
+               SUM(CASE WHEN liked = false THEN 1 ELSE 0 END),
+               MAX(created_at)
+        FROM recipe_feedback
+        GROUP BY recipe_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_recipe_stats_avg_rating', table_name='recipe_stats')
+    op.drop_index('ix_recipe_stats_likes', table_name='recipe_stats')
+    op.drop_table('recipe_stats')
@@ -0,0 +1,123 @@
+"""Add pre-rendered recipe_cards and the recipes (created_at, id) index
+
+Revision ID: f2c8d5a1b7e4
+Revises: e4b7c2a9f5d3
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8d5a1b7e4'
+down_revision: Union[str, Sequence[str], None] = 'e4b7c2a9f5d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Frozen copy of app.recipe_cards.render_recipe_card as of this revision, so
+# later changes to the app don't change what this migration does
+_INGREDIENT_SEPARATOR = re.compile(r",\s*(?![^()]*\))|\n+")
+_STEP_SEPARATOR = re.compile(r"(?<=[.!?])\s+(?=[A-Z¿¡])|\n+")
+_STEP_NUMBER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+
+
+def _ingredient_list(ingredients: str) -> List[str]:
+    text = (ingredients or "").strip()
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+            if isinstance(items, list):
+                return [str(item).strip() for item in items if str(item).strip()]
+        except ValueError:
+            pass
+    return [_STEP_NUMBER.sub("", item).strip() for item in _INGREDIENT_SEPARATOR.split(text) if item.strip()]
+
+
+def _instruction_steps(instructions: str) -> List[str]:
+    text = (instructions or "").strip()
+    separator = re.compile(r"\n+") if "\n" in text else _STEP_SEPARATOR
+    return [_STEP_NUMBER.sub("", step).strip() for step in separator.split(text) if step.strip()]
+
+
+def _render_recipe_card(recipe: Mapping[str, Any]) -> Tuple[str, str]:
+    prep_minutes, cook_minutes = recipe["prep_minutes"], recipe["cook_minutes"]
+    created_at = recipe["created_at"]
+    card: Dict[str, Any] = {
+        "id": recipe["id"],
+        "title": recipe["title"],
+        "ingredients": recipe["ingredients"],
+        "instructions": recipe["instructions"],
+        "created_by_ai": bool(recipe["created_by_ai"]),
+        "source_url": recipe["source_url"],
+        "metadata_json": recipe["metadata_json"] or {},
+        "created_at": created_at.isoformat() if created_at is not None else None,
+        "cuisine": recipe["cuisine"],
+        "difficulty": recipe["difficulty"],
+        "prep_minutes": prep_minutes,
+        "cook_minutes": cook_minutes,
+        "total_minutes": (prep_minutes or 0) + (cook_minutes or 0) or None,
+        "ingredient_list": _ingredient_list(recipe["ingredients"]),
+        "steps": _instruction_steps(recipe["instructions"]),
+    }
+    parts = [card["cuisine"], card["difficulty"]]
+    if card["total_minutes"]:
+        parts.append(f"{card['total_minutes']} min")
+    card["summary"] = " · ".join(str(part) for part in parts if part)
+    body = json.dumps(card, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()[:32], body
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('recipe_cards',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('etag', sa.String(length=64), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('recipe_id')
+    )
+    op.create_index('ix_recipes_created_id', 'recipes', ['created_at', 'id'], unique=False)
+
+    # Render a card for every existing recipe
+    recipes = sa.table(
+        'recipes',
+        sa.column('id', sa.Integer()),
+        sa.column('title', sa.String()),
+        sa.column('ingredients', sa.Text()),
+        sa.column('instructions', sa.Text()),
+        sa.column('created_by_ai', sa.Boolean()),
+        sa.column('source_url', sa.String()),
+        sa.column('metadata_json', sa.JSON()),
+        sa.column('created_at', sa.DateTime(timezone=True)),
+        sa.column('cuisine', sa.String()),
+        sa.column('difficulty', sa.String()),
+        sa.column('prep_minutes', sa.Integer()),
+        sa.column('cook_minutes', sa.Integer()),
+    )
+    recipe_cards = sa.table(
+        'recipe_cards',
+        sa.column('recipe_id', sa.Integer()),
+        sa.column('etag', sa.String()),
+        sa.column('body', sa.Text()),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(recipes)).mappings().all()
+    cards = []
+    for row in rows:
+        etag, body = _render_recipe_card(row)
+        cards.append({"recipe_id": row["id"], "etag": etag, "body": body})
+    if cards:
+        connection.execute(recipe_cards.insert(), cards)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_recipes_created_id', table_name='recipes')
+    op.drop_table('recipe_cards')
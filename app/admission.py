@@ -0,0 +1,241 @@
+"""
+Admission control: bounded concurrency and bounded wait queues per endpoint pool.
+
+An /ask holds a threadpool thread for seconds while OpenAI answers. Without a
+limit a spike queues hundreds of them in the threadpool until clients time
+out, and the cheap endpoints wait behind them. Instead each pool admits at
+most `limit` requests at once and lets at most `max_queue` more wait, each
+for up to `queue_timeout` seconds. Anything beyond that gets an immediate
+503 with Retry-After, estimated from the pool's recent service time.
+
+    pool   paths               settings (defaults)
+    ask    /ask                ASK_MAX_CONCURRENCY (32), ASK_MAX_QUEUE (64),
+                               ASK_QUEUE_TIMEOUT_SECONDS (10)
+    api    /api/*, /health     API_MAX_CONCURRENCY (100), API_MAX_QUEUE (200),
+                               API_QUEUE_TIMEOUT_SECONDS (5)
+
+The api pool has its own capacity, so an /ask spike never delays it. /ask
+also runs on its own executor (ask_executor, ASK_MAX_CONCURRENCY threads)
+rather than the shared threadpool, which stays free for the sync /api
+endpoints and run_in_threadpool calls (cache publishes, profile saves...).
+Other paths (/metrics, /docs) are not limited. Limits apply per worker
+process. ADMISSION_ENABLED=false turns the pools off; /ask then queues on
+its executor.
+
+CPU is shared the same way: on Linux, the ask executor's threads run at
+ASK_THREAD_NICE (10, 0 = off), so when the CPU is busy the event loop, the
+shared threadpool and the aiosqlite threads of the async endpoints run first.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app import metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+ASK_MAX_CONCURRENCY = int(os.getenv("ASK_MAX_CONCURRENCY", "32"))
+ASK_MAX_QUEUE = int(os.getenv("ASK_MAX_QUEUE", "64"))
+ASK_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASK_QUEUE_TIMEOUT_SECONDS", "10"))
+
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "100"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "200"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_QUEUE_TIMEOUT_SECONDS", "5"))
+# Niceness of the threads running /ask (Linux only, 0 = same priority as the event loop)
+ASK_THREAD_NICE = int(os.getenv("ASK_THREAD_NICE", "10"))
+
+T = TypeVar("T")
+
+
+class Rejected(Exception):
+    """The request was not admitted"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionPool:
+    """
+    At most limit requests at once, at most max_queue waiting (FIFO).
+    Lives on the event loop: no locks, all bookkeeping happens between awaits.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        # Moving average of how long an admitted request holds its slot
+        self.service_seconds = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _update_gauges(self) -> None:
+        metrics.ADMISSION_IN_FLIGHT.labels(self.name).set(self.active)
+        metrics.ADMISSION_QUEUE_DEPTH.labels(self.name).set(len(self._waiters))
+
+    async def acquire(self) -> None:
+        """
+        Take a slot, waiting in the queue if the pool is full.
+
+        Raises:
+            Rejected: If the queue is full or the wait exceeded queue_timeout
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            metrics.ADMISSION_WAIT.labels(self.name).observe(0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Rejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Unless the slot was handed over just as the wait timed out
+            if not waiter.done() or waiter.cancelled():
+                raise Rejected("queue_timeout") from None
+        except asyncio.CancelledError:
+            # Client gone: give back a slot handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+        metrics.ADMISSION_WAIT.labels(self.name).observe(time.perf_counter() - start)
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one"""
+        if held_seconds is not None:
+            self.service_seconds = held_seconds if not self.service_seconds else (
+                0.8 * self.service_seconds + 0.2 * held_seconds
+            )
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained (at least 1)"""
+        drain = self.service_seconds * (len(self._waiters) + 1) / max(self.limit, 1)
+        return max(1, math.ceil(drain))
+
+
+ask_pool = AdmissionPool("ask", ASK_MAX_CONCURRENCY, ASK_MAX_QUEUE, ASK_QUEUE_TIMEOUT_SECONDS)
+api_pool = AdmissionPool("api", API_MAX_CONCURRENCY, API_MAX_QUEUE, API_QUEUE_TIMEOUT_SECONDS)
+
+
+def pool_for(path: str) -> Optional[AdmissionPool]:
+    if path == "/ask":
+        return ask_pool
+    if path.startswith("/api/") or path == "/health":
+        return api_pool
+    return None
+
+
+def _lower_thread_priority() -> None:
+    """
+    Executor initializer: run the new thread at ASK_THREAD_NICE. Linux
+    schedules threads individually, so this leaves the event loop untouched.
+    """
+    if ASK_THREAD_NICE <= 0 or not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), ASK_THREAD_NICE)
+    except OSError as e:
+        logger.debug(f"Thread priority not lowered: {e}")
+
+
+# Threads are created on demand and only ever run /ask, so their niceness
+# never leaks into the shared threadpool
+ask_executor = ThreadPoolExecutor(
+    max_workers=ASK_MAX_CONCURRENCY, thread_name_prefix="ask", initializer=_lower_thread_priority
+)
+
+
+def _run_profiled(func: Callable[..., T], *args) -> T:
+    with profiling.profile_thread():
+        return func(*args)
+
+
+async def run_ask(func: Callable[..., T], *args) -> T:
+    """
+    Run a blocking /ask handler on ask_executor. The request's context
+    (trace, usage tracking, profile) is copied into the thread, as
+    run_in_threadpool does.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _run_profiled, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(ask_executor, call)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the admission pools"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        pool = pool_for(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await pool.acquire()
+        except Rejected as e:
+            metrics.ADMISSION_REJECTIONS.labels(pool.name, e.reason).inc()
+            await self._reject(send, pool, e.reason)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, pool: AdmissionPool, reason: str) -> None:
+        retry_after = pool.retry_after()
+        body = json.dumps({
+            "detail": "Servidor saturado, reintenta en unos segundos",
+            "reason": reason,
+            "retry_after_seconds": retry_after,
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
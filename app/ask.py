@@ -4,11 +4,13 @@ from dotenv import load_dotenv
 
 # Importaciones de LangChain
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 
+from app import openai_clients
+from app.embedding_batcher import TokenBatchingEmbeddings
+
 # Cargar API Key
 load_dotenv()
 
@@ -27,7 +29,8 @@ def main():
 
     # 2. Conectar a la Base de Datos EXISTENTE (Modo Lectura)
     # IMPORTANTE: Usamos la misma función de embedding que en la ingesta
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    # Clientes compartidos (un solo pool de conexiones para embeddings y chat)
+    embeddings = TokenBatchingEmbeddings(openai_clients.get_embeddings())
     
     vector_store = Chroma(
         persist_directory=DB_PATH,
@@ -40,7 +43,7 @@ def main():
 
     # 4. Configurar el Cerebro (LLM)
     # Usamos gpt-4o-mini porque es rápido, barato y muy listo
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    llm = openai_clients.get_chat_model()
 
     # 5. El Prompt del Sistema (Instrucciones de personalidad)
     system_prompt = (
@@ -1,9 +1,21 @@
 """
 Database configuration and session management.
 AWS-ready: Supports PostgreSQL (RDS) and SQLite for local development.
+
+Two engines share the same database:
+- engine / SessionLocal (sync): scripts, ingestion and Alembic
+- async_engine / AsyncSessionLocal (async): API endpoints, so DB-bound handlers
+  run on the event loop instead of competing with /ask for thread-pool threads
+
+With DATABASE_REPLICA_URL set, read-only endpoints (get_read_db) use a third,
+async engine on the replica; mutations (get_write_db) always use the primary.
 """
+import math
 import os
-from sqlalchemy import create_engine
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -18,6 +30,54 @@ DATABASE_URL = os.getenv(
     "sqlite:///./veganai.db"  # Default to SQLite for local development
 )
 
+# Connection profile: "tuned" (default) applies the settings below,
+# "default" keeps driver/pool defaults (baseline for benchmarks/db_profiles.py)
+DB_PROFILE = os.getenv("DB_PROFILE", "tuned")
+
+# SQLite profile - PRAGMAs applied on every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # Readers don't block the writer
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # Safe with WAL, far fewer fsyncs
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait for locks instead of failing
+
+# PostgreSQL profile - pool sizing and server-side timeouts (per engine, per worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a pooled connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; below RDS/proxy idle timeouts
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the SQLite profile to a new connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _postgres_options(is_async: bool) -> dict:
+    """Engine options of the PostgreSQL profile"""
+    options = {"pool_pre_ping": True}  # Verify connections before using (important for RDS)
+    if DB_PROFILE != "tuned":
+        return options
+    if is_async:
+        # asyncpg takes server settings directly
+        connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    else:
+        connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        connect_args=connect_args,
+    )
+    return options
+
+
 # Create engine
 # For SQLite, we need check_same_thread=False for FastAPI
 # For PostgreSQL, this is not needed
@@ -29,15 +89,80 @@ if DATABASE_URL.startswith("sqlite"):
     )
 else:
     # PostgreSQL (AWS RDS)
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,  # Verify connections before using (important for RDS)
-        echo=False
-    )
+    engine = create_engine(DATABASE_URL, echo=False, **_postgres_options(is_async=False))
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL to its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def _skip_idle_rollbacks(sqlite_engine) -> None:
+    """
+    Only roll back connections that are in a transaction. sqlite3 opens one
+    only for writes, yet every session close and pool check-in rolls back,
+    and on aiosqlite each rollback is a round trip to the connection's
+    thread: two of the six per read-only request.
+    """
+    dialect = sqlite_engine.sync_engine.dialect
+    do_rollback = dialect.do_rollback
+
+    def rollback_if_in_transaction(dbapi_connection):
+        try:
+            in_transaction = dbapi_connection.driver_connection.in_transaction
+        except ValueError:  # Connection already closed
+            return
+        if in_transaction:
+            do_rollback(dbapi_connection)
+
+    dialect.do_rollback = rollback_if_in_transaction
+
+
+def _create_async_engine(url: str):
+    if url.startswith("sqlite"):
+        sqlite_engine = create_async_engine(url, echo=False)
+        _skip_idle_rollbacks(sqlite_engine)
+        return sqlite_engine
+    return create_async_engine(url, echo=False, **_postgres_options(is_async=True))
+
+
+# Async engine - same database, async driver. Override with ASYNC_DATABASE_URL if needed.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+
+# Optional read replica (e.g. an RDS read replica), used by get_read_db.
+# Without it, reads go to the primary.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+ASYNC_DATABASE_REPLICA_URL = os.getenv("ASYNC_DATABASE_REPLICA_URL", to_async_url(DATABASE_REPLICA_URL))
+replica_async_engine = _create_async_engine(ASYNC_DATABASE_REPLICA_URL) if ASYNC_DATABASE_REPLICA_URL else None
+
+# Read-your-writes: after a mutation, the client's reads stay on the primary
+# for this long (keep it above the replica lag)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+LAST_WRITE_COOKIE = "veganai_last_write"
+
+if DB_PROFILE == "tuned":
+    for _engine in (engine, async_engine, replica_async_engine):
+        _sync_engine = getattr(_engine, "sync_engine", _engine)
+        if _sync_engine is not None and _sync_engine.dialect.name == "sqlite":
+            event.listen(_sync_engine, "connect", _apply_sqlite_pragmas)
+
+# expire_on_commit=False: returned objects stay readable after commit without
+# an implicit (and, in async, forbidden) lazy refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+AsyncReplicaSessionLocal = (
+    async_sessionmaker(replica_async_engine, expire_on_commit=False, autoflush=False)
+    if replica_async_engine is not None else AsyncSessionLocal
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -56,6 +181,64 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Async dependency for FastAPI endpoints.
+    Usage in endpoints:
+        async def my_endpoint(db: AsyncSession = Depends(get_async_db)):
+            ...
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_write_db(response: Response):
+    """
+    Async dependency for endpoints that write: always the primary.
+    Marks the client (cookie) so its next reads also go to the primary until
+    the replica has caught up (read-your-writes).
+    """
+    response.set_cookie(
+        LAST_WRITE_COOKIE, f"{time.time():.3f}",
+        max_age=math.ceil(READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax"
+    )
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _wrote_recently(request: Request) -> bool:
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, "0"))
+    except ValueError:
+        return False
+    return time.time() - last_write < READ_YOUR_WRITES_SECONDS
+
+
+async def get_read_db(request: Request):
+    """
+    Async dependency for read-only endpoints: the replica when configured,
+    or the primary if this client wrote in the last READ_YOUR_WRITES_SECONDS.
+    The choice is recorded on the session (see read_source).
+    """
+    if _wrote_recently(request):
+        session_factory, source = AsyncSessionLocal, "pinned"
+    elif replica_async_engine is not None:
+        session_factory, source = AsyncReplicaSessionLocal, "replica"
+    else:
+        session_factory, source = AsyncSessionLocal, "primary"
+    async with session_factory() as db:
+        db.info["read_source"] = source
+        yield db
+
+
+def read_source(db) -> str:
+    """
+    Where a session reads from: "replica", "pinned" (the primary, for a client
+    that must see its own recent writes) or "primary".
+    """
+    return db.info.get("read_source", "primary")
+
+
 def init_db():
     """
     Initialize database - creates all tables.
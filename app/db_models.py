@@ -1,10 +1,14 @@
 """
 SQLAlchemy database models for VeganAI Coach.
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, Float, DateTime, ForeignKey, JSON
+import re
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Column, Integer, String, Text, Boolean, Float, Date, DateTime, ForeignKey, JSON, Index, LargeBinary, delete, event, insert, select
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from app.recipe_cards import render_recipe_card
 
 
 class User(Base):
@@ -14,6 +18,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     preferences_json = Column(JSON, default={})  # Store general preferences as JSON
+    daily_token_budget = Column(Integer)  # OpenAI tokens per UTC day; NULL = USER_DAILY_TOKEN_BUDGET
 
     # Relationships
     goals = relationship("Goal", back_populates="user", cascade="all, delete-orphan")
@@ -36,6 +41,12 @@ class Goal(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Indexes shaped like goal_service.get_user_goals (filter by user[, status], newest first)
+    __table_args__ = (
+        Index("ix_goals_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_goals_user_created", "user_id", "created_at"),
+    )
+
     # Relationships
     user = relationship("User", back_populates="goals")
     paths = relationship("Path", back_populates="goal", cascade="all, delete-orphan")
@@ -47,7 +58,7 @@ class Path(Base):
     __tablename__ = "paths"
 
     id = Column(Integer, primary_key=True, index=True)
-    goal_id = Column(Integer, ForeignKey("goals.id"), nullable=False)
+    goal_id = Column(Integer, ForeignKey("goals.id"), nullable=False, index=True)
     name = Column(String(200), nullable=False)
     description = Column(Text)
     steps = Column(JSON)  # List of steps as JSON array
@@ -71,11 +82,153 @@ class Recipe(Base):
     metadata_json = Column(JSON, default={})  # Additional metadata (difficulty, prep_time, etc.)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Promoted from metadata_json so they can be filtered/sorted through an index.
+    # Kept in sync on every ORM write (see _sync_recipe_columns) and by bulk imports.
+    cuisine = Column(String(50))
+    difficulty = Column(String(20))
+    prep_minutes = Column(Integer)
+    cook_minutes = Column(Integer)
+
+    __table_args__ = (
+        # Keyset pagination of GET /api/recipes (newest first)
+        Index("ix_recipes_created_id", "created_at", "id"),
+        Index("ix_recipes_cuisine_difficulty", "cuisine", "difficulty"),
+        Index("ix_recipes_difficulty", "difficulty"),
+        Index("ix_recipes_prep_minutes", "prep_minutes"),
+        Index("ix_recipes_cook_minutes", "cook_minutes"),
+    )
+
     # Relationships
     recipe_suggestions = relationship("RecipeSuggestion", back_populates="recipe", cascade="all, delete-orphan")
     recipe_feedback = relationship("RecipeFeedback", back_populates="recipe", cascade="all, delete-orphan")
 
 
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)\b", re.IGNORECASE)
+
+
+def parse_minutes(value: Any) -> Optional[int]:
+    """Parse durations like '15 min', '1 hr 30 min' or 45 into minutes (None if unknown)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return int(sum(float(n) * (60 if unit.lower().startswith("h") else 1) for n, unit in parts))
+
+
+def recipe_metadata_columns(metadata: Optional[Dict]) -> Dict:
+    """Values of the promoted Recipe columns for a metadata_json dict"""
+    metadata = metadata or {}
+    return {
+        "cuisine": metadata.get("cuisine"),
+        "difficulty": metadata.get("difficulty"),
+        "prep_minutes": parse_minutes(metadata.get("prep_time")),
+        "cook_minutes": parse_minutes(metadata.get("cook_time")),
+    }
+
+
+@event.listens_for(Recipe, "before_insert")
+@event.listens_for(Recipe, "before_update")
+def _sync_recipe_columns(mapper, connection, target):
+    for key, value in recipe_metadata_columns(target.metadata_json).items():
+        setattr(target, key, value)
+
+
+class RecipeIndexOutbox(Base):
+    """
+    Durable queue of recipe changes waiting to reach the vector index.
+    Rows are written in the same transaction as the recipe change and removed
+    by the index sync consumer once the change has been embedded.
+    """
+    __tablename__ = "recipe_index_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipe_id = Column(Integer, nullable=False)  # No FK: deleted recipes must still be queued
+    operation = Column(String(10), nullable=False)  # upsert, delete
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class CacheInvalidation(Base):
+    """
+    Cross-worker cache invalidation log (optional, see app.services.cache).
+    Each worker appends the keys it invalidated and polls for rows newer than
+    the last one it has seen, re-reading ids that were skipped because they
+    had not committed yet; old rows are pruned by id.
+    """
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(100), nullable=False)  # e.g. "goals:12"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+def _enqueue_recipe_change(connection, recipe_id: int, operation: str) -> None:
+    connection.execute(
+        insert(RecipeIndexOutbox.__table__).values(recipe_id=recipe_id, operation=operation)
+    )
+
+
+@event.listens_for(Recipe, "after_insert")
+def _recipe_inserted(mapper, connection, target):
+    _enqueue_recipe_change(connection, target.id, "upsert")
+
+
+@event.listens_for(Recipe, "after_update")
+def _recipe_updated(mapper, connection, target):
+    _enqueue_recipe_change(connection, target.id, "upsert")
+
+
+@event.listens_for(Recipe, "after_delete")
+def _recipe_deleted(mapper, connection, target):
+    _enqueue_recipe_change(connection, target.id, "delete")
+
+
+class RecipeCard(Base):
+    """
+    Pre-rendered JSON body of a recipe for the read endpoints (app.recipe_cards).
+    Re-rendered in the same transaction as every recipe write, so reads never
+    render and the ETag changes exactly when the content does.
+    """
+    __tablename__ = "recipe_cards"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    etag = Column(String(64), nullable=False)
+    body = Column(Text, nullable=False)
+
+
+def store_recipe_cards(connection, recipe_ids) -> None:
+    """
+    Render and store the cards of the given recipes.
+    Bulk INSERTs skip ORM events, so bulk writers call this themselves.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    # Read back through the connection: server defaults (created_at) are filled in
+    rows = connection.execute(select(Recipe.__table__).where(Recipe.id.in_(recipe_ids))).mappings().all()
+    connection.execute(delete(RecipeCard.__table__).where(RecipeCard.recipe_id.in_(recipe_ids)))
+    if rows:
+        cards = [render_recipe_card(row) for row in rows]
+        connection.execute(
+            insert(RecipeCard.__table__),
+            [{"recipe_id": row["id"], "etag": etag, "body": body} for row, (etag, body) in zip(rows, cards)]
+        )
+
+
+@event.listens_for(Recipe, "after_insert")
+@event.listens_for(Recipe, "after_update")
+def _render_recipe_card(mapper, connection, target):
+    store_recipe_cards(connection, [target.id])
+
+
+@event.listens_for(Recipe, "before_delete")
+def _delete_recipe_card(mapper, connection, target):
+    # Before the recipe row goes, for databases that don't enforce the FK (SQLite)
+    connection.execute(delete(RecipeCard.__table__).where(RecipeCard.recipe_id == target.id))
+
+
 class RecipeSuggestion(Base):
     """Tracks recipe suggestions made to users"""
     __tablename__ = "recipe_suggestions"
@@ -83,11 +236,19 @@ class RecipeSuggestion(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     goal_id = Column(Integer, ForeignKey("goals.id"), nullable=True)  # Can be null if not goal-based
-    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False, index=True)
     suggested_at = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(String(20), default="pending")  # pending, accepted, rejected, completed
     user_comment = Column(Text)  # User's comment when requesting recipe
 
+    # Per-user history, newest first (also serves plain user_id lookups)
+    __table_args__ = (
+        Index("ix_recipe_suggestions_user_suggested", "user_id", "suggested_at"),
+        # A recipe is suggested at most once per goal (see suggestion_service);
+        # also serves goal_id lookups
+        Index("uq_recipe_suggestions_goal_recipe", "goal_id", "recipe_id", unique=True),
+    )
+
     # Relationships
     user = relationship("User", back_populates="recipe_suggestions")
     goal = relationship("Goal", back_populates="recipe_suggestions")
@@ -99,8 +260,8 @@ class RecipeFeedback(Base):
     __tablename__ = "recipe_feedback"
 
     id = Column(Integer, primary_key=True, index=True)
-    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     liked = Column(Boolean)
     rating = Column(Integer)  # 1-5 scale
     changes_suggested = Column(Text)  # What user would change
@@ -114,12 +275,35 @@ class RecipeFeedback(Base):
     user = relationship("User", back_populates="recipe_feedback")
 
 
+class RecipeStats(Base):
+    """
+    Per-recipe feedback rollup, upserted in the same transaction as the feedback
+    rows (see app.services.feedback_service), so popularity rankings are an
+    index scan instead of a GROUP BY over recipe_feedback.
+    """
+    __tablename__ = "recipe_stats"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    avg_rating = Column(Float)  # rating_sum / rating_count, NULL until rated
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+    last_feedback_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_recipe_stats_likes", "likes"),
+        Index("ix_recipe_stats_avg_rating", "avg_rating"),
+    )
+
+
 class UserPreference(Base):
     """Learned preferences from user feedback"""
     __tablename__ = "user_preferences"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     preference_type = Column(String(100), nullable=False)  # e.g., "texture", "spice_level", "salt_level"
     preference_value = Column(Text, nullable=False)  # e.g., "thicker", "less spicy", "more salt"
     learned_from_feedback = Column(Integer, ForeignKey("recipe_feedback.id"), nullable=True)  # Which feedback taught this
@@ -129,3 +313,58 @@ class UserPreference(Base):
     # Relationships
     user = relationship("User", back_populates="user_preferences")
 
+
+class UserTasteVector(Base):
+    """
+    Compact per-user taste profile in recipe-embedding space: an exponential
+    moving average of liked (+) and disliked (-) recipe embeddings, updated
+    with each feedback batch (see app.services.taste_service).
+    """
+    __tablename__ = "user_taste_vectors"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)  # float32 array bytes
+    dimensions = Column(Integer, nullable=False)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LlmUsage(Base):
+    """
+    OpenAI tokens spent by one request (or background job), as reported by the API.
+    Written in batches by app.services.usage_service.
+    """
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True)
+    trace_id = Column(String(32))  # The request's X-Trace-Id, NULL for background jobs
+    # No FKs here or in the rollup: /ask takes any user_id, and a batch must never fail on one
+    user_id = Column(Integer, nullable=True)
+    source = Column(String(100), nullable=False)  # e.g. "/ask", "ingest", "index_sync"
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    embedding_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_llm_usage_user_created", "user_id", "created_at"),
+        Index("ix_llm_usage_trace_id", "trace_id"),
+    )
+
+
+class UserTokenUsage(Base):
+    """
+    Per-user, per-day (UTC) rollup of llm_usage, updated in the same transaction.
+    Token budgets are checked against it.
+    """
+    __tablename__ = "user_token_usage"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    embedding_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,131 @@
+"""
+Token-packed batching for embedding requests.
+
+LangChain batches embedding inputs by item count (chunk_size), regardless of
+their length: many short recipes cost more round trips than needed, and a batch
+of long cookbook pages can exceed the per-request token limit. This wrapper
+packs as many inputs as fit under the token limits into each request.
+"""
+import math
+import os
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.recipe_chunker import get_encoding
+
+# OpenAI limits for text-embedding-3-*: tokens per input, tokens and inputs per request
+MAX_INPUT_TOKENS = 8191
+MAX_REQUEST_TOKENS = int(os.getenv("EMBEDDING_MAX_REQUEST_TOKENS", "300000"))
+MAX_REQUEST_INPUTS = 2048
+
+# Item-count batch LangChain's OpenAIEmbeddings uses by default (for comparison)
+DEFAULT_ITEM_BATCH = 1000
+
+
+class TokenBatchingEmbeddings(Embeddings):
+    """
+    Wrap an Embeddings object so embed_documents sends token-packed requests.
+
+    Inputs longer than MAX_INPUT_TOKENS are split into consecutive token windows
+    (always at the same positions for the same text), embedded, and recombined
+    as a length-weighted average, so every input still gets exactly one vector.
+    embed_query is passed through untouched unless the query could exceed
+    MAX_INPUT_TOKENS, so the wrapped client never needs to check lengths itself.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_request_tokens: int = MAX_REQUEST_TOKENS,
+        max_input_tokens: int = MAX_INPUT_TOKENS
+    ):
+        self.embeddings = embeddings
+        self.max_request_tokens = max_request_tokens
+        self.max_input_tokens = max_input_tokens
+        # Never exceed the wrapped client's own per-request item batching,
+        # so each packed batch maps to exactly one API request
+        self.max_request_inputs = min(MAX_REQUEST_INPUTS, getattr(embeddings, "chunk_size", MAX_REQUEST_INPUTS))
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self._stats = {"inputs": 0, "pieces": 0, "tokens": 0, "requests": 0}
+
+    def _pieces(self, texts: List[str]) -> List[Tuple[int, str, int]]:
+        """(text index, text piece, token count) with oversized inputs split"""
+        encoding = get_encoding()
+        pieces = []
+        for index, text in enumerate(texts):
+            tokens = encoding.encode(text)
+            if len(tokens) <= self.max_input_tokens:
+                pieces.append((index, text, len(tokens)))
+                continue
+            for start in range(0, len(tokens), self.max_input_tokens):
+                window = tokens[start:start + self.max_input_tokens]
+                pieces.append((index, encoding.decode(window), len(window)))
+        return pieces
+
+    def _pack(self, pieces: List[Tuple[int, str, int]]) -> List[List[Tuple[int, str, int]]]:
+        """Greedily fill each request up to the token and input limits"""
+        batches, current, current_tokens = [], [], 0
+        for piece in pieces:
+            if current and (
+                current_tokens + piece[2] > self.max_request_tokens
+                or len(current) >= self.max_request_inputs
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece[2]
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        pieces = self._pieces(texts)
+        vectors: List[List[List[float]]] = [[] for _ in texts]
+        weights: List[List[int]] = [[] for _ in texts]
+
+        for batch in self._pack(pieces):
+            embedded = self.embeddings.embed_documents([text for _, text, _ in batch])
+            self._stats["requests"] += 1
+            for (index, _, n_tokens), vector in zip(batch, embedded):
+                vectors[index].append(vector)
+                weights[index].append(n_tokens)
+
+        self._stats["inputs"] += len(texts)
+        self._stats["pieces"] += len(pieces)
+        self._stats["tokens"] += sum(n_tokens for _, _, n_tokens in pieces)
+        return [_combine(v, w) for v, w in zip(vectors, weights)]
+
+    def embed_query(self, text: str) -> List[float]:
+        # A token is at least one UTF-8 byte: short queries skip tokenization
+        if len(text.encode("utf-8")) <= self.max_input_tokens:
+            return self.embeddings.embed_query(text)
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict:
+        """
+        Requests sent so far, plus requests per 1,000 inputs compared with
+        LangChain's default item-count batching.
+        """
+        stats = dict(self._stats)
+        inputs = stats["inputs"]
+        baseline = math.ceil(inputs / DEFAULT_ITEM_BATCH) if inputs else 0
+        stats["baseline_requests"] = baseline
+        stats["requests_per_1000"] = round(1000 * stats["requests"] / inputs, 2) if inputs else 0.0
+        stats["baseline_requests_per_1000"] = round(1000 * baseline / inputs, 2) if inputs else 0.0
+        return stats
+
+
+def _combine(vectors: List[List[float]], weights: List[int]) -> List[float]:
+    """Length-weighted, re-normalized average of the pieces of one input"""
+    if len(vectors) == 1:
+        return vectors[0]
+    total = sum(weights)
+    averaged = [
+        sum(vector[i] * weight for vector, weight in zip(vectors, weights)) / total
+        for i in range(len(vectors[0]))
+    ]
+    norm = math.sqrt(sum(x * x for x in averaged)) or 1.0
+    return [x / norm for x in averaged]
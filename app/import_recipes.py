@@ -0,0 +1,164 @@
+"""
+Bulk import recipes from JSONL or CSV files (non-interactive).
+Run: python -m app.import_recipes recipes.jsonl [--format csv] [--batch-size 1000]
+
+Rows are streamed from disk in batches. Each batch is deduplicated against the
+existing titles with a single query and written with one bulk INSERT, so large
+catalogues load in a handful of round trips instead of one query per recipe.
+
+JSONL: one object per line with title, ingredients, instructions and optionally
+created_by_ai, source_url and metadata_json.
+CSV: same columns; metadata_json holds a JSON object.
+Rows missing a required field (or with a blank or non-string one), with a
+metadata_json that is not a JSON object, or (JSONL) lines that are not a valid
+JSON object are counted as invalid and skipped.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.db_models import Recipe, RecipeIndexOutbox, recipe_metadata_columns, store_recipe_cards
+
+DEFAULT_BATCH_SIZE = 1000
+
+RECIPE_FIELDS = ("title", "ingredients", "instructions", "created_by_ai", "source_url", "metadata_json")
+REQUIRED_FIELDS = ("title", "ingredients", "instructions")
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def normalize_recipe_row(raw: Dict) -> Optional[Dict]:
+    """Keep only Recipe columns; returns None for rows missing required fields or with invalid metadata"""
+    if not isinstance(raw, dict):
+        return None
+    row = {key: raw[key] for key in RECIPE_FIELDS if raw.get(key) not in (None, "")}
+    for key in REQUIRED_FIELDS:
+        value = row.get(key)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        row[key] = value.strip()
+    row["created_by_ai"] = _parse_bool(row.get("created_by_ai", False))
+    metadata = row.get("metadata_json") or {}
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(metadata, dict):
+        return None
+    row["metadata_json"] = metadata
+    # Bulk INSERTs skip ORM events, so fill the promoted columns here
+    row.update(recipe_metadata_columns(metadata))
+    return row
+
+
+def iter_recipe_file(path: str, file_format: Optional[str] = None) -> Iterator[Dict]:
+    """Stream raw recipe rows from a JSONL or CSV file"""
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        elif file_format in ("jsonl", "json", "ndjson"):
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        yield {}  # Counted as an invalid row
+        else:
+            raise ValueError(f"Unsupported recipe file format: {file_format}")
+
+
+def _insert_batch(db: Session, batch: List[Dict]) -> int:
+    """Insert the recipes of a batch whose titles are not in the database yet"""
+    # Deduplicate inside the batch first (first occurrence wins)
+    unique = {}
+    for row in batch:
+        unique.setdefault(row["title"], row)
+
+    # One set-based lookup for the whole batch
+    existing = set(db.scalars(select(Recipe.title).where(Recipe.title.in_(list(unique)))))
+    new_rows = [row for title, row in unique.items() if title not in existing]
+    if not new_rows:
+        return 0
+
+    # Bulk INSERT (multi-row VALUES on SQLite and PostgreSQL). Bulk inserts skip
+    # ORM events, so the vector index outbox rows and the pre-rendered recipe
+    # cards are written explicitly here.
+    recipe_ids = db.scalars(insert(Recipe).returning(Recipe.id), new_rows).all()
+    db.execute(
+        insert(RecipeIndexOutbox),
+        [{"recipe_id": recipe_id, "operation": "upsert"} for recipe_id in recipe_ids]
+    )
+    store_recipe_cards(db.connection(), recipe_ids)
+    db.commit()
+    return len(recipe_ids)
+
+
+def import_recipes(rows: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Import recipes in batches, skipping titles that already exist.
+
+    Args:
+        rows: Raw recipe dicts (e.g. from iter_recipe_file)
+        batch_size: Rows per dedupe query and bulk INSERT
+
+    Returns:
+        Dict with read, inserted, skipped, invalid, seconds and rows_per_second
+    """
+    stats = {"read": 0, "inserted": 0, "skipped": 0, "invalid": 0}
+    start_time = time.perf_counter()
+    rows = iter(rows)
+
+    db = SessionLocal()
+    try:
+        while True:
+            raw_batch = list(islice(rows, batch_size))
+            if not raw_batch:
+                break
+            stats["read"] += len(raw_batch)
+            batch = [row for row in map(normalize_recipe_row, raw_batch) if row is not None]
+            stats["invalid"] += len(raw_batch) - len(batch)
+            inserted = _insert_batch(db, batch)
+            stats["inserted"] += inserted
+            stats["skipped"] += len(batch) - inserted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start_time
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["read"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import recipes from JSONL or CSV")
+    parser.add_argument("path", help="Path to a .jsonl or .csv recipe file")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="File format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(f"📥 Importing recipes from {args.path}...")
+    stats = import_recipes(iter_recipe_file(args.path, args.format), batch_size=args.batch_size)
+    print(f"✅ Inserted {stats['inserted']} recipes "
+          f"({stats['skipped']} duplicates skipped, {stats['invalid']} invalid rows)")
+    print(f"⏱️  {stats['read']} rows in {stats['seconds']}s ({stats['rows_per_second']} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
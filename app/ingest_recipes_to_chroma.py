@@ -2,21 +2,18 @@
 Ingest recipes from SQL database into ChromaDB for RAG search.
 Run: python -m app.ingest_recipes_to_chroma
 """
-import os
+from typing import List
 from dotenv import load_dotenv
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 
 from app.database import SessionLocal
 from app.db_models import Recipe
+from app.recipe_chunker import chunk_recipes, chunking_report
+from app.vector_index import generation_path
 
 load_dotenv()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CHROMA_DB_PATH = os.path.join(BASE_DIR, "../chroma_db")
-
 
 def create_recipe_document(recipe: Recipe) -> Document:
     """Convert a Recipe from SQL DB to a LangChain Document"""
@@ -49,8 +46,32 @@ INSTRUCTIONS:
     )
 
 
+def load_recipe_chunks() -> List[Document]:
+    """Read every recipe from the SQL database and chunk it along its structure"""
+    db = SessionLocal()
+    try:
+        return chunk_recipes(db.query(Recipe).all())
+    finally:
+        db.close()
+
+
+def split_recipe_documents(documents: List[Document]) -> List[Document]:
+    """
+    Character-count split used before the structure-aware chunker.
+    Kept only to report the chunk/token savings of chunk_recipes().
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,      # Larger chunks for recipes (they're self-contained)
+        chunk_overlap=100,    # Overlap to maintain context
+        separators=["\n\n", "\n", ".", " "]
+    )
+    return text_splitter.split_documents(documents)
+
+
 def ingest_recipes_to_chroma():
-    """Load recipes from SQL DB and ingest them into ChromaDB"""
+    """Load recipes from SQL DB and rebuild the ChromaDB index with them"""
+    from app.services.ingest_service import rebuild_index
+
     print("🚀 Iniciando ingesta de recetas a ChromaDB...")
     
     # 1. Load recipes from SQL database
@@ -63,59 +84,31 @@ def ingest_recipes_to_chroma():
             print("❌ No hay recetas para ingerir. Ejecuta seed_recipes.py primero.")
             return
         
-        # 2. Convert recipes to LangChain Documents
-        documents = []
-        for recipe in recipes:
-            doc = create_recipe_document(recipe)
-            documents.append(doc)
-            print(f"  ✅ Preparada: {recipe.title}")
-        
-        print(f"\n📄 Total documentos preparados: {len(documents)}")
-        
+        # Compare the structure-aware chunker against the old character splitter
+        report = chunking_report(
+            split_recipe_documents([create_recipe_document(r) for r in recipes]),
+            chunk_recipes(recipes)
+        )
     finally:
         db.close()
     
-    # 3. Split documents into chunks (for better RAG retrieval)
-    print("\n✂️  Dividiendo documentos en chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,      # Larger chunks for recipes (they're self-contained)
-        chunk_overlap=100,    # Overlap to maintain context
-        separators=["\n\n", "\n", ".", " "]
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"📦 Generados {len(chunks)} chunks")
-    
-    # 4. Create embeddings and store in ChromaDB
-    print("\n🧠 Generando embeddings y guardando en ChromaDB...")
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    print(f"✂️  Chunks: {report['old_chunks']} → {report['new_chunks']} | "
+          f"Tokens de embedding: {report['old_tokens']} → {report['new_tokens']} "
+          f"(-{report['token_savings_pct']}%)")
     
-    # If ChromaDB exists, we'll add to it. If not, create new.
-    if os.path.exists(CHROMA_DB_PATH):
-        # Load existing ChromaDB
-        vector_store = Chroma(
-            persist_directory=CHROMA_DB_PATH,
-            embedding_function=embeddings
-        )
-        # Add new documents
-        vector_store.add_documents(chunks)
-        print(f"➕ Agregados {len(chunks)} chunks a ChromaDB existente")
-    else:
-        # Create new ChromaDB
-        vector_store = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            persist_directory=CHROMA_DB_PATH
-        )
-        print(f"✨ Creada nueva ChromaDB con {len(chunks)} chunks")
-    
-    # ChromaDB persists automatically, no need to call persist()
+    # 2. Chunk, embed and store in a new index generation, then switch to it
+    # atomically. The API keeps answering from the previous generation until then.
+    print("\n🧠 Generando embeddings en una nueva generación del índice...")
+    stats = rebuild_index()
     
     print("\n✅ ¡Éxito! Recetas ingeridas en ChromaDB")
-    print(f"   ChromaDB ubicada en: {CHROMA_DB_PATH}")
-    print(f"   Total chunks indexados: {len(chunks)}")
+    print(f"   Generación activa: {generation_path(stats['generation'])}")
+    print(f"   Total chunks indexados: {stats['chunks']}")
+    print(f"   Peticiones de embedding: {stats['embedding']['requests']} "
+          f"({stats['embedding']['baseline_requests_per_1000']} → "
+          f"{stats['embedding']['requests_per_1000']} por 1.000 chunks)")
     print("\n💡 Ahora el sistema RAG puede buscar recetas por similitud semántica")
 
 
 if __name__ == "__main__":
     ingest_recipes_to_chroma()
-
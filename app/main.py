@@ -1,82 +1,110 @@
 import os
 import time
 import logging
-from typing import List
-from fastapi import FastAPI, HTTPException, Depends
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-
-# Configurar logging para que se vea en Docker (sin buffering)
-import sys
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Forzar stdout sin buffering
-    ],
-    force=True  # Forzar reconfiguración
-)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Structured logs written by a background thread (see app/logging_config.py)
+from app.logging_config import setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-# También configurar uvicorn para que muestre nuestros logs
-logging.getLogger("uvicorn").setLevel(logging.INFO)
-
-# Función helper para forzar flush
-def log_and_flush(message, level="info"):
-    if level == "info":
-        logger.info(message)
-    elif level == "error":
-        logger.error(message)
-    sys.stdout.flush()  # Forzar flush inmediato
-
-# LangChain imports
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+
 
 # Database and models
-from app.database import get_db
+from app import admission, metrics, openai_clients, profiling, tracing
+from app.database import SessionLocal, async_engine, engine, get_read_db, get_write_db, replica_async_engine
 from app.models import (
-    UserResponse, GoalCreate, GoalUpdate, GoalResponse,
-    RecipeSuggestionRequest
+    UserResponse, GoalCreate, GoalUpdate, GoalResponse, Page,
+    GoalBulkRequest, GoalBulkResponse,
+    RecipeCardResponse, RecipeSuggestionRequest, RecipeSuggestionResponse,
+    RecipeFeedbackCreate, RecipeFeedbackResponse, RecipeStatsResponse,
+    IngestJobCreate, IngestJobResponse, TokenBudgetUpdate, UserTokenUsageResponse
+)
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services import (
+    cache, user_service, goal_service, recipe_service, suggestion_service, feedback_service,
+    taste_service, ingest_service, usage_service
 )
-from app.services import user_service, goal_service
+from app.services.index_sync_service import OutboxConsumer
+from app.embedding_batcher import TokenBatchingEmbeddings
+from app.vector_index import VectorIndex
 
 load_dotenv()
 
+# Load the OpenAI SDK and open the vector store in the background after startup,
+# so the first /ask doesn't pay for it (the app itself starts without them)
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+
+def warm_up():
+    try:
+        openai_clients.warm_up()
+        get_prompt_template()
+        vector_index.reader()
+    except Exception as e:
+        logger.warning(f"Warm-up failed, clients will load on first use: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background workers with the app"""
+    # Keep the vector index in sync with Recipe table changes
+    outbox_consumer = OutboxConsumer(vector_index)
+    outbox_consumer.start()
+    # Apply cache invalidations from other workers (no-op without a channel)
+    cache.check_worker_setup()
+    invalidation_poller = cache.InvalidationPoller()
+    invalidation_poller.start()
+    feedback_batcher.start()
+    # Store token usage in batches instead of one write per OpenAI call
+    usage_service.recorder.start()
+    if WARM_UP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    await feedback_batcher.stop()
+    usage_service.recorder.stop()
+    invalidation_poller.stop()
+    outbox_consumer.stop()
+
+
 app = FastAPI(
     title="VeganAI Coach API",
     description="AI-powered vegan recipe learning coach",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
-
-# Rutas
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "../chroma_db")
+# Routes declared below run their endpoint inside a "handler" span
+app.router.route_class = tracing.TracedRoute
+app.add_middleware(tracing.TracingMiddleware)
+# Inside metrics: queue waits count in request latency, 503s in request counts
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# Outermost: a profiled request includes the tracing/metrics overhead too
+app.add_middleware(profiling.ProfilingMiddleware)
+for _engine in (engine, async_engine, replica_async_engine):
+    if _engine is not None:
+        metrics.instrument_engine(getattr(_engine, "sync_engine", _engine))
+        tracing.instrument_engine(getattr(_engine, "sync_engine", _engine))
 
 # Modelo de datos para la petición (Request)
 class QueryRequest(BaseModel):
     question: str
-
-# Configuración Global (se carga al arrancar)
-# Agregar timeouts para evitar que se cuelgue
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    timeout=30,  # 30 segundos timeout para embeddings
-    max_retries=2
-)
-vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-retriever = vector_store.as_retriever(search_kwargs={"k": 2})
-llm = ChatOpenAI(
-    model="gpt-4o-mini", 
-    temperature=0,
-    timeout=60,  # 60 segundos timeout para LLM
-    max_retries=2
-)
-
+    user_id: Optional[int] = None  # Personalizes retrieval with the user's taste vector
+
+# Configuración Global: the OpenAI client is created on the first embed call
+embeddings = openai_clients.LazyEmbeddings()
+# Handle to the active index generation; swaps atomically after each ingestion.
+# Outbox syncs embed through it, so their requests are token-packed too.
+vector_index = VectorIndex(TokenBatchingEmbeddings(embeddings))
+# Group-commits recipe feedback and folds it into users' taste vectors
+feedback_batcher = feedback_service.FeedbackBatcher(vector_index)
 # Prompt Sarcástico
 system_prompt = (
     "Eres un asistente de cocina experto y sarcástico llamado 'VeganAI'. "
@@ -84,55 +112,136 @@ system_prompt = (
     "Si no sabes, dilo, pero con estilo. "
     "\n\nContexto: {context}"
 )
-prompt_template = ChatPromptTemplate.from_messages([
-    ("system", system_prompt),
-    ("human", "{input}"),
-])
-
-# Crear la cadena
-chain = create_retrieval_chain(
-    retriever,
-    create_stuff_documents_chain(llm, prompt_template)
-)
+
+
+@lru_cache(maxsize=1)
+def get_prompt_template():
+    """Chat prompt, built on the first /ask (langchain_core.prompts is slow to import)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "{input}"),
+    ])
 
 # Modelo de datos para la petición (Request) - kept for backward compatibility
 class QueryRequest(BaseModel):
     question: str
+    user_id: Optional[int] = None  # Personalizes retrieval with the user's taste vector
 
 # ============================================================================
 # Health & Info Endpoints
 # ============================================================================
 
 @app.get("/")
-def read_root():
+async def read_root():
     """Root endpoint - API status"""
     return {"status": "VeganAI is online and hungry 🥕", "version": "1.0.0"}
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
+@app.get("/metrics", tags=["health"])
+def prometheus_metrics():
+    """Prometheus metrics: request counters and per-stage latency histograms"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/api/cache/stats", tags=["health"])
+async def cache_stats():
+    """Hit rate, size and eviction counters of the read-through caches"""
+    return cache.stats()
+
+
+def require_profile_token(x_profile: Optional[str] = Header(None)):
+    """Traces and profiles are only served with the profiling token (X-Profile header)"""
+    if not profiling.PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiling.is_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@app.get("/api/traces", tags=["health"], dependencies=[Depends(require_profile_token)])
+async def list_traces(
+    min_duration_ms: float = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Recent request traces of this worker, newest first (optionally only slow ones)"""
+    return [trace.summary() for trace in tracing.collector.recent(min_duration_ms, limit)]
+
+
+@app.get("/api/traces/{trace_id}", tags=["health"], dependencies=[Depends(require_profile_token)])
+async def get_trace(trace_id: str):
+    """All spans of one trace (X-Trace-Id response header)"""
+    trace = tracing.collector.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
+
+
+@app.get("/api/profiles", tags=["health"], dependencies=[Depends(require_profile_token)])
+def list_profiles():
+    """Stored request profiles of this worker, newest first"""
+    return profiling.list_profiles()
+
+
+@app.get("/api/profiles/{profile_id}", tags=["health"], dependencies=[Depends(require_profile_token)])
+def download_profile(profile_id: str):
+    """Download one profile (.pstats, open with pstats or snakeviz)"""
+    path = profiling.profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id)
+
+
 # ============================================================================
 # User Endpoints
 # ============================================================================
 
 @app.post("/api/users", response_model=UserResponse, tags=["users"])
-def create_or_get_user(db: Session = Depends(get_db)):
+async def create_or_get_user(db: AsyncSession = Depends(get_write_db)):
     """
     Create or get user.
     For MVP, returns the first user or creates one.
     """
-    user = user_service.get_or_create_user(db)
+    user = await user_service.get_or_create_user(db)
     return user
 
 
 @app.get("/api/users/{user_id}", response_model=UserResponse, tags=["users"])
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get user by ID"""
-    user = user_service.get_user(db, user_id)
+    user = await user_service.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@app.get("/api/users/{user_id}/usage", response_model=UserTokenUsageResponse, tags=["users"])
+async def get_user_usage(
+    user_id: int,
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """OpenAI tokens and estimated cost per day, and what is left of today's budget"""
+    usage = await usage_service.get_user_usage(db, user_id, days)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return usage
+
+
+@app.put("/api/users/{user_id}/budget", response_model=UserResponse, tags=["users"])
+async def set_user_budget(
+    user_id: int,
+    budget: TokenBudgetUpdate,
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Set the user's daily token budget (null: back to USER_DAILY_TOKEN_BUDGET, 0: unlimited)"""
+    user = await usage_service.set_user_budget(db, user_id, budget.daily_token_budget)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -143,10 +252,10 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
 # ============================================================================
 
 @app.post("/api/goals", response_model=GoalResponse, status_code=201, tags=["goals"])
-def create_goal(
+async def create_goal(
     goal_data: GoalCreate,
     user_id: int = 1,  # For MVP, default to user 1. In production, get from auth
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Create a new learning goal.
@@ -159,121 +268,307 @@ def create_goal(
         "target_skill": "dough types"
     }
     """
-    goal = goal_service.create_goal(db, user_id, goal_data)
+    goal = await goal_service.create_goal(db, user_id, goal_data)
     return goal
 
 
-@app.get("/api/goals", response_model=List[GoalResponse], tags=["goals"])
-def list_goals(
+@app.post("/api/goals/bulk", response_model=GoalBulkResponse, tags=["goals"])
+async def bulk_upsert_goals(
+    bulk_data: GoalBulkRequest,
+    user_id: int = 1,  # For MVP, default to user 1
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Create and update many goals in one transaction (all or nothing).
+    
+    Example:
+    {
+        "create": [{"title": "Learn curries", "target_skill": "curries"}],
+        "update": [{"id": 3, "status": "completed"}]
+    }
+    """
+    created, updated = await goal_service.bulk_upsert_goals(db, user_id, bulk_data)
+    return GoalBulkResponse(created=created, updated=updated)
+
+
+@app.get("/api/goals", response_model=Page[GoalResponse], tags=["goals"])
+async def list_goals(
     user_id: int = 1,  # For MVP, default to user 1
     status: str = None,  # Optional filter: active, completed, paused
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """List all goals for a user, optionally filtered by status"""
-    goals = goal_service.get_user_goals(db, user_id, status)
-    return goals
+    """List a user's goals newest first, one page at a time, optionally filtered by status"""
+    goals, next_cursor = await goal_service.get_user_goals(db, user_id, status, limit, cursor)
+    return Page[GoalResponse](items=goals, next_cursor=next_cursor)
 
 
 @app.get("/api/goals/{goal_id}", response_model=GoalResponse, tags=["goals"])
-def get_goal(
+async def get_goal(
     goal_id: int,
     user_id: int = 1,  # For MVP, default to user 1
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a specific goal by ID"""
-    goal = goal_service.get_goal(db, goal_id, user_id)
+    goal = await goal_service.get_goal(db, goal_id, user_id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     return goal
 
 
 @app.put("/api/goals/{goal_id}", response_model=GoalResponse, tags=["goals"])
-def update_goal(
+async def update_goal(
     goal_id: int,
     goal_data: GoalUpdate,
     user_id: int = 1,  # For MVP, default to user 1
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """Update an existing goal"""
-    goal = goal_service.update_goal(db, goal_id, user_id, goal_data)
+    goal = await goal_service.update_goal(db, goal_id, user_id, goal_data)
     return goal
 
 
 @app.delete("/api/goals/{goal_id}", status_code=204, tags=["goals"])
-def delete_goal(
+async def delete_goal(
     goal_id: int,
     user_id: int = 1,  # For MVP, default to user 1
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """Delete a goal"""
-    goal_service.delete_goal(db, goal_id, user_id)
+    await goal_service.delete_goal(db, goal_id, user_id)
     return None
 
 
+# ============================================================================
+# Recipe Endpoints
+# ============================================================================
+
+@app.post("/api/recipes/suggest", response_model=List[RecipeSuggestionResponse], tags=["recipes"])
+async def suggest_recipes(
+    request: RecipeSuggestionRequest,
+    user_id: int = 1,  # For MVP, default to user 1
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Suggest recipes for a goal, closest to its target skill first.
+    Never repeats a recipe for the user and stops at the goal's weekly target
+    (an empty list means this week's quota is already used).
+    
+    Example:
+    {
+        "goal_id": 1,
+        "count": 2
+    }
+    """
+    await usage_service.acheck_budget(db, user_id)
+    with usage_service.track("/api/recipes/suggest", user_id):
+        return await suggestion_service.suggest_recipes(db, vector_index, user_id, request)
+
+
+# Recipe cards are public and only change when the recipe is edited; after
+# max-age clients and CDNs revalidate with If-None-Match and usually get a 304
+RECIPE_CACHE_MAX_AGE_SECONDS = int(os.getenv("RECIPE_CACHE_MAX_AGE_SECONDS", "300"))
+# Lists also change when recipes are added
+RECIPE_LIST_CACHE_MAX_AGE_SECONDS = int(os.getenv("RECIPE_LIST_CACHE_MAX_AGE_SECONDS", "30"))
+
+
+def etag_response(etag: str, body: str, if_none_match: Optional[str], max_age: int) -> Response:
+    """A pre-rendered JSON body with a strong ETag, or 304 when the client's copy is current"""
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={max_age}"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or headers["ETag"] in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/recipes", response_model=Page[RecipeCardResponse], tags=["recipes"])
+async def list_recipes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    cuisine: Optional[str] = None,  # Exact match, e.g. Indian
+    difficulty: Optional[str] = None,  # Exact match, e.g. Easy
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List recipe cards newest first, one page at a time (ETag / If-None-Match aware)"""
+    etag, body = await recipe_service.list_recipe_cards(db, limit, cursor, cuisine, difficulty)
+    return etag_response(etag, body, if_none_match, RECIPE_LIST_CACHE_MAX_AGE_SECONDS)
+
+
+@app.get("/api/recipes/popular", response_model=List[RecipeStatsResponse], tags=["recipes"])
+async def popular_recipes(
+    sort: Literal["likes", "rating"] = "likes",
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Most liked or best rated recipes (from the recipe_stats rollup)"""
+    rows = await feedback_service.get_popular_recipes(db, sort, limit)
+    return [
+        RecipeStatsResponse(title=title, **{
+            key: getattr(stats, key) for key in RecipeStatsResponse.model_fields if key != "title"
+        })
+        for stats, title in rows
+    ]
+
+
+@app.post("/api/recipes/{recipe_id}/feedback", response_model=RecipeFeedbackResponse, status_code=201, tags=["recipes"])
+async def create_recipe_feedback(
+    recipe_id: int,
+    feedback_data: RecipeFeedbackCreate,
+    user_id: int = 1,  # For MVP, default to user 1
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Submit feedback after cooking a recipe.
+    
+    Example:
+    {
+        "liked": true,
+        "rating": 4,
+        "changes_suggested": "Less salt"
+    }
+    """
+    if not await recipe_service.get_recipe(db, recipe_id):
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    if not await user_service.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    # Hand the connection back to the pool while waiting for the batched write
+    await db.close()
+    return await feedback_service.submit_feedback(feedback_batcher, recipe_id, user_id, feedback_data)
+
+
+@app.get("/api/recipes/{recipe_id}", response_model=RecipeCardResponse, tags=["recipes"])
+async def get_recipe(
+    recipe_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get a recipe card by ID (ETag / If-None-Match aware)"""
+    card = await recipe_service.get_recipe_card(db, recipe_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return etag_response(*card, if_none_match, RECIPE_CACHE_MAX_AGE_SECONDS)
+
+
+# ============================================================================
+# Ingestion Endpoints
+# ============================================================================
+
+@app.post("/api/ingest", response_model=IngestJobResponse, status_code=202, tags=["ingest"])
+def start_ingest_job(job_data: IngestJobCreate = IngestJobCreate()):
+    """
+    Rebuild the vector index in the background.
+    The new generation is built off to the side and swapped in atomically,
+    so /ask keeps answering from the current index while the job runs.
+    """
+    job = ingest_service.submit_ingest_job(
+        job_data.sources,
+        embeddings=embeddings,
+        # Map the new generation's snapshot now rather than on the next query
+        on_activate=vector_index.snapshot
+    )
+    return job
+
+
+@app.get("/api/ingest/{job_id}", response_model=IngestJobResponse, tags=["ingest"])
+def get_ingest_job(job_id: str):
+    """Get the status of an ingestion job"""
+    job = ingest_service.get_ingest_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
+
+
 # ============================================================================
 # Recipe Q&A Endpoint (Existing)
 # ============================================================================
 
+# Candidates fetched per result when reranking /ask by taste
+RERANK_CANDIDATES_PER_RESULT = 4
+
+
+def retrieve_documents(question_embedding, user_id: Optional[int], k: int = 2):
+    """Top k chunks for a question, reranked by the user's taste vector if any"""
+    # Resolve the active generation once: an ingestion swap mid-request
+    # never mixes two indexes within the same answer
+    store = vector_index.reader()
+    taste = None
+    if user_id:
+        with SessionLocal() as db:
+            taste = taste_service.load_taste_vector(db, user_id)
+    if taste is None:
+        return store.similarity_search_by_vector(question_embedding, k=k)
+
+    results = store.similarity_search_by_vector_with_relevance_scores(
+        question_embedding, k=k * RERANK_CANDIDATES_PER_RESULT
+    )
+    docs = [doc for doc, _ in results]
+    # Chroma returns squared L2 distances; for unit vectors 1 - d/2 is the cosine
+    relevance = [1 - distance / 2 for _, distance in results]
+    recipe_ids = [doc.metadata.get("recipe_id") for doc in docs]
+    matrix = suggestion_service.get_recipe_matrix(vector_index)
+    return taste_service.rerank(docs, relevance, recipe_ids, taste, matrix, k)
+
+
 @app.post("/ask", tags=["recipes"])
-def ask_chef(request: QueryRequest):
+async def ask_chef(request: QueryRequest):
     """Endpoint para preguntar al chef (existing RAG functionality)"""
-    start_time = time.time()
-    
-    # Usar print con flush para asegurar que se vea en Docker
-    print("=" * 60, flush=True)
-    print(f"[ASK] INICIANDO - Pregunta: {request.question[:100]}", flush=True)
-    print("=" * 60, flush=True)
-    
+    # Own (lower priority) threads, so the shared threadpool stays free
+    return await admission.run_ask(answer_question, request)
+
+
+def answer_question(request: QueryRequest):
+    start_time = time.perf_counter()
+    logger.info("ask started", extra={"question": request.question[:100], "user_id": request.user_id})
+    # 429 once the user's daily token budget is spent
+    usage_service.check_budget(request.user_id)
+
     try:
-        # Medir embedding por separado
-        embedding_start = time.time()
-        print(f"[ASK] Paso 1: Generando embedding...", flush=True)
-        question_embedding = embeddings.embed_query(request.question)
-        embedding_time = time.time() - embedding_start
-        print(f"[ASK] ✓ Embedding completado en {embedding_time:.2f}s", flush=True)
-        
-        # Medir búsqueda en ChromaDB
-        search_start = time.time()
-        print(f"[ASK] Paso 2: Buscando en ChromaDB...", flush=True)
-        docs = retriever.invoke(request.question)
-        search_time = time.time() - search_start
-        print(f"[ASK] ✓ Búsqueda completada en {search_time:.2f}s - {len(docs)} documentos", flush=True)
-        
-        # Medir generación LLM
-        llm_start = time.time()
-        print(f"[ASK] Paso 3: Generando respuesta con LLM...", flush=True)
-        # Crear prompt con contexto
-        context = "\n\n".join([doc.page_content for doc in docs])
-        prompt = prompt_template.format_messages(context=context, input=request.question)
-        llm_response = llm.invoke(prompt)
-        llm_time = time.time() - llm_start
-        print(f"[ASK] ✓ LLM completado en {llm_time:.2f}s", flush=True)
-        
-        total_time = time.time() - start_time
-        
-        # Log timing information
-        print("=" * 60, flush=True)
-        print(f"[ASK] COMPLETADO en {total_time:.2f}s total:", flush=True)
-        print(f"  - Embedding: {embedding_time:.2f}s", flush=True)
-        print(f"  - Búsqueda: {search_time:.2f}s", flush=True)
-        print(f"  - LLM: {llm_time:.2f}s", flush=True)
-        print("=" * 60, flush=True)
-        
-        return {
-            "answer": llm_response.content if hasattr(llm_response, 'content') else str(llm_response),
-            "source_used": [doc.page_content[:50] for doc in docs],
-            "timing_seconds": round(total_time, 2),
-            "timing_breakdown": {
-                "embedding": round(embedding_time, 2),
-                "search": round(search_time, 2),
-                "llm": round(llm_time, 2)
+        with usage_service.track("/ask", request.user_id) as usage:
+            with metrics.observe_stage("embedding") as embedding:
+                question_embedding = vector_index.embedding_function.embed_query(request.question)
+
+            # Reuse the question embedding (no second embedding call) and rerank
+            # by the user's taste when there is one
+            with metrics.observe_stage("search") as search:
+                docs = retrieve_documents(question_embedding, request.user_id, k=2)
+
+            with metrics.observe_stage("llm") as llm_stage:
+                with tracing.span("prompt"):
+                    # Crear prompt con contexto
+                    context = "\n\n".join([doc.page_content for doc in docs])
+                    prompt = get_prompt_template().format_messages(context=context, input=request.question)
+                llm_response = openai_clients.get_chat_model().invoke(prompt)
+
+            total_time = time.perf_counter() - start_time
+            logger.info("ask completed", extra={
+                "trace_id": tracing.current_trace_id(),
+                "total_seconds": round(total_time, 3),
+                "embedding_seconds": round(embedding.seconds, 3),
+                "search_seconds": round(search.seconds, 3),
+                "llm_seconds": round(llm_stage.seconds, 3),
+                "documents": len(docs),
+                "total_tokens": usage.total_tokens,
+                "cost_usd": round(usage.cost_usd, 6),
+            })
+
+            return {
+                "answer": llm_response.content if hasattr(llm_response, 'content') else str(llm_response),
+                "source_used": [doc.page_content[:50] for doc in docs],
+                "timing_seconds": round(total_time, 2),
+                "timing_breakdown": {
+                    "embedding": round(embedding.seconds, 2),
+                    "search": round(search.seconds, 2),
+                    "llm": round(llm_stage.seconds, 2)
+                },
+                "usage": usage.as_dict()
             }
-        }
     except Exception as e:
-        elapsed = time.time() - start_time
-        print(f"[ASK] ❌ ERROR después de {elapsed:.2f}s:", flush=True)
-        print(f"  Error: {str(e)}", flush=True)
-        print(f"  Tipo: {type(e).__name__}", flush=True)
-        import traceback
-        print(f"  Traceback: {traceback.format_exc()}", flush=True)
-        raise HTTPException(status_code=500, detail=f"Error procesando pregunta: {str(e)}")
\ No newline at end of file
+        logger.exception("ask failed", extra={
+            "trace_id": tracing.current_trace_id(),
+            "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+            "error_type": type(e).__name__,
+        })
+        raise HTTPException(status_code=500, detail=f"Error procesando pregunta: {str(e)}")
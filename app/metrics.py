@@ -0,0 +1,144 @@
+"""
+Prometheus metrics for the API, served at GET /metrics.
+
+    veganai_http_requests_total{method, route, status}    requests served
+    veganai_http_request_errors_total{method, route}      5xx responses and unhandled errors
+    veganai_http_request_duration_seconds{method, route}  end-to-end latency histogram
+    veganai_stage_duration_seconds{stage}                 per-stage latency histogram:
+                                                          embedding, search, llm and db
+                                                          (one observation per SQL statement)
+    veganai_admission_in_flight{pool}                     requests admitted and running
+    veganai_admission_queue_depth{pool}                   requests waiting for a slot
+    veganai_admission_wait_seconds{pool}                  time admitted requests waited
+    veganai_admission_rejections_total{pool, reason}      503s: queue_full or queue_timeout
+    veganai_llm_tokens_total{model, type}                 OpenAI tokens: prompt, completion, embedding
+    veganai_llm_cost_usd_total{model}                     estimated OpenAI spend
+
+Routes are labelled with their path template (/api/goals/{goal_id}), never
+the raw URL, so label cardinality stays bounded. p95/p99 come from the
+histograms, e.g.
+
+    histogram_quantile(0.95, sum by (le) (rate(veganai_stage_duration_seconds_bucket{stage="llm"}[5m])))
+
+With several worker processes, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory so /metrics aggregates all of them.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+from app import tracing
+
+# From a fast SQL statement up to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUESTS = Counter(
+    "veganai_http_requests_total", "HTTP requests served", ["method", "route", "status"]
+)
+REQUEST_ERRORS = Counter(
+    "veganai_http_request_errors_total", "HTTP requests that failed with a 5xx or an unhandled error", ["method", "route"]
+)
+REQUEST_LATENCY = Histogram(
+    "veganai_http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "veganai_stage_duration_seconds", "Latency of one processing stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+# Admission control (app.admission); gauges are summed over live worker processes
+ADMISSION_IN_FLIGHT = Gauge(
+    "veganai_admission_in_flight", "Requests admitted and running", ["pool"], multiprocess_mode="livesum"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "veganai_admission_queue_depth", "Requests waiting for an admission slot", ["pool"], multiprocess_mode="livesum"
+)
+ADMISSION_WAIT = Histogram(
+    "veganai_admission_wait_seconds", "Time admitted requests waited for a slot", ["pool"], buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTIONS = Counter(
+    "veganai_admission_rejections_total", "Requests turned away by admission control", ["pool", "reason"]
+)
+# OpenAI usage as reported by the API (app.services.usage_service)
+LLM_TOKENS = Counter("veganai_llm_tokens_total", "OpenAI tokens used", ["model", "type"])
+LLM_COST = Counter("veganai_llm_cost_usd_total", "Estimated OpenAI spend in USD", ["model"])
+
+
+class StageTimer:
+    """Elapsed seconds of an observe_stage block (set when the block exits)"""
+    seconds: float = 0.0
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Time a block and record it in the stage histogram (also on errors) and as a trace span"""
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield timer
+    finally:
+        timer.seconds = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(timer.seconds)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    STAGE_LATENCY.labels("db").observe(time.perf_counter() - context._metrics_start)
+
+
+def instrument_engine(engine) -> None:
+    """Record every SQL statement of a (sync) engine under stage="db" """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def render() -> tuple:
+    """(body, content type) for the /metrics response"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(method, route, str(status)).inc()
+            if status >= 500:
+                REQUEST_ERRORS.labels(method, route).inc()
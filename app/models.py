@@ -2,8 +2,17 @@
 Pydantic models for API request/response validation.
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from typing import Optional, List, Dict, Any, Literal, Generic, TypeVar
+from datetime import date, datetime
+
+T = TypeVar("T")
+
+
+# ========== Pagination ==========
+class Page(BaseModel, Generic[T]):
+    """One page of a list endpoint; pass next_cursor back to get the next page"""
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 
 # ========== User Models ==========
@@ -17,11 +26,39 @@ class UserResponse(BaseModel):
     id: int
     created_at: datetime
     preferences_json: Dict[str, Any]
+    daily_token_budget: Optional[int] = None  # None: the default budget applies
+
+    class Config:
+        from_attributes = True
+
+
+class TokenBudgetUpdate(BaseModel):
+    """Set a user's daily token budget (null: back to the default)"""
+    daily_token_budget: Optional[int] = Field(None, ge=0)
+
+
+class TokenUsageDay(BaseModel):
+    """OpenAI usage of one user on one UTC day"""
+    day: date
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    embedding_tokens: int
+    cost_usd: float
 
     class Config:
         from_attributes = True
 
 
+class UserTokenUsageResponse(BaseModel):
+    """A user's recent OpenAI usage and today's budget"""
+    user_id: int
+    daily_token_budget: Optional[int]  # Effective budget; None = unlimited
+    used_today: int
+    remaining_today: Optional[int]
+    days: List[TokenUsageDay]  # Newest first
+
+
 # ========== Goal Models ==========
 class GoalCreate(BaseModel):
     """Create a new learning goal"""
@@ -40,6 +77,17 @@ class GoalUpdate(BaseModel):
     status: Optional[str] = Field(None, pattern="^(active|completed|paused)$")
 
 
+class GoalBulkUpdate(GoalUpdate):
+    """Update of one goal in a bulk request"""
+    id: int
+
+
+class GoalBulkRequest(BaseModel):
+    """Create and update many goals in one transaction"""
+    create: List[GoalCreate] = Field(default=[], max_length=100)
+    update: List[GoalBulkUpdate] = Field(default=[], max_length=100)
+
+
 class GoalResponse(BaseModel):
     """Goal response model"""
     id: int
@@ -56,6 +104,12 @@ class GoalResponse(BaseModel):
         from_attributes = True
 
 
+class GoalBulkResponse(BaseModel):
+    """Goals written by a bulk request, in request order"""
+    created: List[GoalResponse]
+    updated: List[GoalResponse]
+
+
 # ========== Path Models ==========
 class PathCreate(BaseModel):
     """Create a learning path"""
@@ -106,11 +160,24 @@ class RecipeResponse(BaseModel):
         from_attributes = True
 
 
+class RecipeCardResponse(RecipeResponse):
+    """Pre-rendered recipe card (see app/recipe_cards.py)"""
+    cuisine: Optional[str] = None
+    difficulty: Optional[str] = None
+    prep_minutes: Optional[int] = None
+    cook_minutes: Optional[int] = None
+    total_minutes: Optional[int] = None
+    ingredient_list: List[str] = []
+    steps: List[str] = []
+    summary: str = ""
+
+
 # ========== Recipe Suggestion Models ==========
 class RecipeSuggestionRequest(BaseModel):
     """Request a recipe suggestion"""
-    goal_id: Optional[int] = None
+    goal_id: Optional[int] = None  # Defaults to the user's latest active goal
     user_comment: Optional[str] = None  # User's comment about what they want
+    count: int = Field(default=1, ge=1, le=10)  # Capped by the goal's weekly target
 
 
 class RecipeSuggestionResponse(BaseModel):
@@ -155,6 +222,21 @@ class RecipeFeedbackResponse(BaseModel):
         from_attributes = True
 
 
+class RecipeStatsResponse(BaseModel):
+    """Feedback rollup of one recipe"""
+    recipe_id: int
+    title: str
+    feedback_count: int
+    rating_count: int
+    avg_rating: Optional[float]
+    likes: int
+    dislikes: int
+    last_feedback_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
 # ========== User Preference Models ==========
 class UserPreferenceResponse(BaseModel):
     """User preference response model"""
@@ -169,3 +251,27 @@ class UserPreferenceResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+
+# ========== Ingestion Job Models ==========
+class IngestJobCreate(BaseModel):
+    """Start a background ingestion job"""
+    sources: List[Literal["recipes", "text"]] = Field(default=["recipes", "text"], min_length=1)
+
+
+class IngestJobResponse(BaseModel):
+    """Ingestion job status"""
+    id: str
+    sources: List[str]
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    generation: Optional[str]
+    chunks: Optional[int]
+    embedding_requests: Optional[int]
+    error: Optional[str]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,145 @@
+"""
+OpenAI clients for the API and the scripts, created on first use.
+
+Importing langchain_openai (and the openai SDK behind it) takes over a second,
+so app.main only builds these when a request actually needs them. Workers that
+serve the goal/user endpoints, Alembic and the scripts never pay for it.
+
+Embedding and chat clients share one keep-alive connection pool, so a /ask
+reuses the TCP+TLS connection the previous call left open instead of setting
+up one pool per client (and per script run, per ingestion job...):
+
+    OPENAI_POOL_SIZE            max connections in the pool (default 20)
+    OPENAI_KEEPALIVE_SECONDS    how long an idle connection is kept (default 60)
+    OPENAI_HTTP2                "true" to multiplex requests over HTTP/2 (needs h2)
+
+The pool also reads the token usage of every response for cost accounting
+(see app.services.usage_service).
+"""
+import importlib.util
+import logging
+import os
+import threading
+from typing import List
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from app.embedding_batcher import MAX_REQUEST_INPUTS
+
+load_dotenv()
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4o-mini"
+# Any OpenAI-compatible server, e.g. benchmarks/fake_openai.py for load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_http_client = None
+_embeddings = None
+_chat_model = None
+
+
+def _record_usage(response) -> None:
+    """httpx response hook: hand OpenAI's reported token usage to the usage service"""
+    if response.status_code != 200 or not response.headers.get("content-type", "").startswith("application/json"):
+        return  # Errors, and streams (reading them here would buffer the whole stream)
+    try:
+        response.read()
+        from app.services import usage_service
+        usage_service.record_response(response.request.url.path, response.content)
+    except Exception as e:
+        logger.debug(f"Token usage not recorded: {e}")
+
+
+def get_http_client():
+    """The shared keep-alive pool (httpx.Client) behind every OpenAI client of this process"""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                import httpx
+                http2 = OPENAI_HTTP2
+                if http2 and importlib.util.find_spec("h2") is None:
+                    logger.warning("OPENAI_HTTP2=true but h2 is not installed (pip install 'httpx[http2]'); using HTTP/1.1")
+                    http2 = False
+                _http_client = httpx.Client(
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_POOL_SIZE,
+                        max_keepalive_connections=OPENAI_POOL_SIZE,
+                        keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                    ),
+                    # Per-request timeouts come from the OpenAI clients (timeout=...)
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                    follow_redirects=True,
+                    event_hooks={"response": [_record_usage]},
+                )
+    return _http_client
+
+
+def get_embeddings():
+    """Shared OpenAIEmbeddings client"""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                _embeddings = OpenAIEmbeddings(
+                    http_client=get_http_client(),
+                    model=EMBEDDING_MODEL,
+                    chunk_size=MAX_REQUEST_INPUTS,  # Batches are packed by tokens (TokenBatchingEmbeddings)
+                    # TokenBatchingEmbeddings already keeps every input under the
+                    # token limit; skip LangChain's second tokenization pass
+                    check_embedding_ctx_length=False,
+                    base_url=OPENAI_BASE_URL,
+                    timeout=30,  # 30 segundos timeout para embeddings
+                    max_retries=2
+                )
+    return _embeddings
+
+
+def get_chat_model():
+    """Shared ChatOpenAI client"""
+    global _chat_model
+    if _chat_model is None:
+        with _lock:
+            if _chat_model is None:
+                from langchain_openai import ChatOpenAI
+                _chat_model = ChatOpenAI(
+                    http_client=get_http_client(),
+                    model=CHAT_MODEL,
+                    temperature=0,
+                    base_url=OPENAI_BASE_URL,
+                    timeout=60,  # 60 segundos timeout para LLM
+                    max_retries=2
+                )
+    return _chat_model
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings that create the OpenAI client on the first embed call, so a
+    VectorIndex can be set up at import time without importing the SDK.
+    Wrap it in TokenBatchingEmbeddings: inputs are not length-checked here.
+    """
+
+    chunk_size = MAX_REQUEST_INPUTS
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return get_embeddings().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_embeddings().embed_query(text)
+
+
+def warm_up() -> None:
+    """Create both clients ahead of the first /ask (run off the startup path)"""
+    get_embeddings()
+    get_chat_model()
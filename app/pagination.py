@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are ordered newest first on (created_at, id) and the next page starts
+strictly after the last row returned, so fetching page N costs the same index
+range scan as page 1 instead of skipping N * limit rows with OFFSET. Cursors
+are opaque URL-safe strings; clients pass back the next_cursor they received.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from sqlalchemy.types import TypeDecorator
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+
+class _CursorTimestamp(TypeDecorator):
+    """
+    Bind type for the cursor timestamp.
+
+    SQLite stores server_default timestamps as "YYYY-MM-DD HH:MM:SS" text,
+    while SQLAlchemy binds datetimes with a ".000000" suffix, which breaks the
+    equality half of the keyset comparison. On SQLite the value is bound in the
+    stored text format instead.
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime(timezone=True))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        return f"{text}.{value.microsecond:06d}" if value.microsecond else text
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just after the given row"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(model: Any, cursor: str, created_column: str = "created_at"):
+    """WHERE clause selecting the rows that come after a cursor (newest first)"""
+    after_created_at, after_id = decode_cursor(cursor)
+    return tuple_(getattr(model, created_column), model.id) < tuple_(
+        literal(after_created_at, _CursorTimestamp()), after_id
+    )
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    model: Any,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    created_column: str = "created_at"
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of a query, newest first.
+
+    Args:
+        db: Database session
+        query: Filtered select() of the model (without ORDER BY or LIMIT)
+        model: Mapped class with an id primary key
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: next_cursor from the previous page, or None for the first page
+        created_column: Timestamp column to order by (e.g. "suggested_at")
+
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    created_at = getattr(model, created_column)
+
+    if cursor:
+        query = query.where(after_cursor(model, cursor, created_column))
+
+    # One extra row tells whether another page exists
+    result = await db.scalars(query.order_by(created_at.desc(), model.id.desc()).limit(limit + 1))
+    rows = list(result.all())
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_column), last.id)
@@ -0,0 +1,198 @@
+"""
+On-demand profiling of single requests.
+
+With PROFILE_TOKEN set, a request carrying `X-Profile: <token>` (or
+`?profile=<token>`) runs under cProfile: the event loop thread for the whole
+request, plus the worker thread that runs a sync endpoint or /ask.
+The merged profile is written to PROFILE_DIR as a .pstats file named after the
+request's trace ID and returned in the `X-Profile-Id` header. Only the newest
+PROFILE_RETENTION files are kept.
+
+    curl -X POST localhost:8080/ask -H "X-Profile: $PROFILE_TOKEN" -d '{"question": "..."}' -i
+    python -m pstats profiles/<X-Profile-Id>      # or: snakeviz profiles/<X-Profile-Id>
+
+Without PROFILE_TOKEN profiling is off. Requests without the flag only pay
+for one header lookup. One request is profiled at a time (cProfile can't
+nest on a thread); a concurrent flagged request is served unprofiled with
+`X-Profile: busy`. The event loop profile also holds whatever other requests
+the loop ran meanwhile, so profile on a quiet worker when possible.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "50"))
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.pstats$")
+
+
+class RequestProfile:
+    """Profilers of one request: the event loop's and any worker thread's"""
+
+    def __init__(self):
+        self.loop_profiler = cProfile.Profile()
+        self.thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_thread_profiler(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self.thread_profilers.append(profiler)
+
+    def dump(self, path: str) -> pstats.Stats:
+        stats = pstats.Stats(self.loop_profiler)
+        for profiler in self.thread_profilers:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return stats
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+_busy = threading.Lock()
+
+
+@contextmanager
+def profile_thread():
+    """Profile a block running in a worker thread if its request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile.add_thread_profiler(profiler)
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    """True if profiling is enabled and the token matches PROFILE_TOKEN"""
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _requested_token(scope) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == b"x-profile":
+            return value.decode("latin-1")
+    if b"profile=" in scope.get("query_string", b""):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("profile")
+        return values[0] if values else None
+    return None
+
+
+def prune_profiles(keep: int = PROFILE_RETENTION) -> None:
+    """Delete all but the newest keep profiles"""
+    names = sorted(
+        (n for n in os.listdir(PROFILE_DIR) if PROFILE_NAME.match(n)),
+        key=lambda n: os.path.getmtime(os.path.join(PROFILE_DIR, n)),
+        reverse=True
+    )
+    for name in names[keep:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles() -> List[dict]:
+    """Stored profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if PROFILE_NAME.match(name):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            profiles.append({"id": name, "size_bytes": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a stored profile, or None if the ID is invalid or unknown"""
+    if not PROFILE_NAME.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id)
+    return path if os.path.isfile(path) else None
+
+
+def _save(profile: RequestProfile, path: str, label: str, elapsed: float) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats = profile.dump(path)
+    prune_profiles()
+    logger.info("request profiled", extra={
+        "profile_id": os.path.basename(path), "request": label,
+        "elapsed_seconds": round(elapsed, 3), "calls": stats.total_calls,
+    })
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running flagged requests under cProfile"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        # X-Profile also authorizes the profile download endpoints; don't profile those
+        token = None if scope["path"].startswith("/api/profiles") else _requested_token(scope)
+        if token is None or not is_authorized(token):
+            # No flag or a wrong token: serve normally, revealing nothing
+            await self.app(scope, receive, send)
+            return
+        if not _busy.acquire(blocking=False):
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile", b"busy")]))
+            return
+
+        profile = RequestProfile()
+        profile_id = None
+
+        async def send_with_profile_id(message):
+            nonlocal profile_id
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                trace_id = headers.get(b"x-trace-id", b"").decode() or f"{os.getpid()}-{id(profile)}"
+                profile_id = f"{time.strftime('%Y%m%d%H%M%S')}-{trace_id}.pstats"
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        token_reset = _current_profile.set(profile)
+        start = time.perf_counter()
+        profile.loop_profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.loop_profiler.disable()
+            _current_profile.reset(token_reset)
+            _busy.release()
+            elapsed = time.perf_counter() - start
+            if profile_id is not None:
+                label = f"{scope['method']} {scope['path']}"
+                try:
+                    await run_in_threadpool(_save, profile, os.path.join(PROFILE_DIR, profile_id), label, elapsed)
+                except OSError as e:
+                    logger.error(f"Could not store profile {profile_id}: {e}")
+
+    @staticmethod
+    def _with_headers(send, extra_headers):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + extra_headers
+            await send(message)
+        return wrapped
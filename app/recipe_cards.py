@@ -0,0 +1,90 @@
+"""
+Pre-rendered recipe cards for the recipe read endpoints.
+
+A card is the complete JSON body of GET /api/recipes/{id}: the recipe columns
+(a superset of RecipeResponse) plus display fields parsed once from the free
+text, i.e. the ingredient list, the numbered steps and a one-line summary.
+Cards are rendered when a recipe is written (see db_models) and stored with a
+strong ETag, so a read is one primary-key lookup and a byte copy, and an
+unchanged recipe always gets the same ETag on every worker.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Commas outside parentheses: "Mixed vegetables (carrots, peas), 1 onion"
+_INGREDIENT_SEPARATOR = re.compile(r",\s*(?![^()]*\))|\n+")
+_STEP_SEPARATOR = re.compile(r"(?<=[.!?])\s+(?=[A-Z¿¡])|\n+")
+_STEP_NUMBER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+
+
+def ingredient_list(ingredients: str) -> List[str]:
+    """Ingredients as a list, from a JSON array or comma/line separated text"""
+    text = (ingredients or "").strip()
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+            if isinstance(items, list):
+                return [str(item).strip() for item in items if str(item).strip()]
+        except ValueError:
+            pass
+    return [_STEP_NUMBER.sub("", item).strip() for item in _INGREDIENT_SEPARATOR.split(text) if item.strip()]
+
+
+def instruction_steps(instructions: str) -> List[str]:
+    """Instructions split into steps (one per line, or one per sentence)"""
+    text = (instructions or "").strip()
+    separator = re.compile(r"\n+") if "\n" in text else _STEP_SEPARATOR
+    return [_STEP_NUMBER.sub("", step).strip() for step in separator.split(text) if step.strip()]
+
+
+def _summary(card: Dict[str, Any]) -> str:
+    """e.g. "Indian · Easy · 35 min" """
+    parts = [card["cuisine"], card["difficulty"]]
+    if card["total_minutes"]:
+        parts.append(f"{card['total_minutes']} min")
+    return " · ".join(str(part) for part in parts if part)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def render_recipe_card(recipe: Mapping[str, Any]) -> Tuple[str, str]:
+    """
+    Render one recipe row (a Recipe or a row mapping with its columns).
+
+    Returns:
+        Tuple of (etag, body): the JSON body and the hex digest of its bytes
+    """
+    def get(key):
+        return recipe[key] if isinstance(recipe, Mapping) else getattr(recipe, key)
+
+    prep_minutes, cook_minutes = get("prep_minutes"), get("cook_minutes")
+    card = {
+        "id": get("id"),
+        "title": get("title"),
+        "ingredients": get("ingredients"),
+        "instructions": get("instructions"),
+        "created_by_ai": bool(get("created_by_ai")),
+        "source_url": get("source_url"),
+        "metadata_json": get("metadata_json") or {},
+        "created_at": _iso(get("created_at")),
+        "cuisine": get("cuisine"),
+        "difficulty": get("difficulty"),
+        "prep_minutes": prep_minutes,
+        "cook_minutes": cook_minutes,
+        "total_minutes": (prep_minutes or 0) + (cook_minutes or 0) or None,
+        "ingredient_list": ingredient_list(get("ingredients")),
+        "steps": instruction_steps(get("instructions")),
+    }
+    card["summary"] = _summary(card)
+    body = json.dumps(card, ensure_ascii=False, separators=(",", ":"), default=str)
+    return card_etag(body.encode()), body
+
+
+def card_etag(data: bytes) -> str:
+    """Content hash used as the strong ETag (without the quotes)"""
+    return hashlib.sha256(data).hexdigest()[:32]
@@ -0,0 +1,173 @@
+"""
+Recipe-structure-aware chunking for the vector index.
+
+A recipe is small and self-contained, so it is indexed as ONE compact chunk
+whenever it fits the token budget. Longer recipes are split only at section
+boundaries (ingredients / instructions), and a section that is still too long is
+split between sentences. Every chunk repeats the title and key metadata, so a
+retrieved chunk is always understandable on its own and no overlap is needed.
+"""
+import os
+import re
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, List, Tuple
+
+import tiktoken
+from langchain_core.documents import Document
+
+# Token budget per chunk (text-embedding-3-small tokenizer)
+MAX_CHUNK_TOKENS = int(os.getenv("RECIPE_CHUNK_MAX_TOKENS", "512"))
+ENCODING_NAME = "cl100k_base"
+
+# Sentence/item boundaries used when a single section is over budget
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+|\n+")
+_ITEM_BOUNDARY = re.compile(r",\s*|\n+")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def count_tokens(text: str) -> int:
+    """Number of embedding tokens in a text"""
+    return len(get_encoding().encode(text))
+
+
+def recipe_header(recipe) -> str:
+    """Title plus key metadata, repeated at the top of every chunk"""
+    metadata = recipe.metadata_json or {}
+    details = " | ".join(
+        f"{label}{metadata[key]}"
+        for label, key in (
+            ("", "cuisine"), ("", "difficulty"),
+            ("prep ", "prep_time"), ("cook ", "cook_time")
+        )
+        if metadata.get(key)
+    )
+    return f"RECIPE: {recipe.title}\n{details}" if details else f"RECIPE: {recipe.title}"
+
+
+def _token_windows(text: str, budget: int) -> List[str]:
+    """
+    Split text into windows of at most budget tokens, for a piece with no
+    word boundary (a long URL or ingredient blob). A window never ends inside
+    a multi-byte character.
+    """
+    encoding = get_encoding()
+    tokens = encoding.encode(text)
+
+    def decoded(start: int, end: int):
+        try:
+            return encoding.decode_bytes(tokens[start:end]).decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    windows, start = [], 0
+    while start < len(tokens):
+        # Largest window within the budget that ends on a character boundary,
+        # else the smallest longer one
+        ends = chain(range(min(start + budget, len(tokens)), start, -1), range(start + budget + 1, len(tokens) + 1))
+        end, window = next((end, window) for end in ends if (window := decoded(start, end)) is not None)
+        windows.append(window)
+        start = end
+    return windows
+
+
+def _pack(pieces: List[str], budget: int, joiner: str) -> List[str]:
+    """
+    Greedily pack consecutive pieces into groups that fit the token budget.
+    Each piece is encoded once and the group size is kept as a running sum
+    of piece and joiner tokens. A piece over the budget on its own is split
+    between words, and a word still over it into token windows.
+    """
+    joiner_tokens = count_tokens(joiner)
+    groups, current, used = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if tokens <= budget:
+            subpieces = [piece]
+        elif " " in piece.strip():
+            subpieces = _pack(piece.split(), budget, " ")
+        else:
+            subpieces = _token_windows(piece, budget)
+        for subpiece in subpieces:
+            if len(subpieces) > 1:
+                tokens = count_tokens(subpiece)
+            added = tokens + (joiner_tokens if current else 0)
+            if current and used + added > budget:
+                groups.append(joiner.join(current))
+                current, used = [subpiece], tokens
+            else:
+                current.append(subpiece)
+                used += added
+    if current:
+        groups.append(joiner.join(current))
+    return groups
+
+
+def _split_section(name: str, body: str, budget: int) -> List[Tuple[str, str]]:
+    """Split one section at sentence (or list item) boundaries"""
+    if count_tokens(f"{name}: {body}") <= budget:
+        return [(name, body)]
+    boundary, joiner = (_ITEM_BOUNDARY, ", ") if name == "INGREDIENTS" else (_SENTENCE_BOUNDARY, " ")
+    pieces = [p.strip() for p in boundary.split(body) if p.strip()]
+    # The "NAME (i/n): " label is part of the chunk; (n/n) is the longest one
+    label_tokens = count_tokens(f"{name} (1/1): ")
+    while True:
+        parts = _pack(pieces, max(budget - label_tokens, 1), joiner)
+        longest_label = count_tokens(f"{name} ({len(parts)}/{len(parts)}): ")
+        if longest_label <= label_tokens:
+            break
+        label_tokens = longest_label
+    return [(f"{name} ({i}/{len(parts)})", part) for i, part in enumerate(parts, start=1)]
+
+
+def chunk_recipe(recipe, max_tokens: int = MAX_CHUNK_TOKENS) -> List[Document]:
+    """Chunk a Recipe row along its structure"""
+    header = recipe_header(recipe)
+    sections = [("INGREDIENTS", recipe.ingredients.strip()), ("INSTRUCTIONS", recipe.instructions.strip())]
+    metadata = recipe.metadata_json or {}
+    base_metadata = {
+        "recipe_id": recipe.id,
+        "title": recipe.title,
+        "cuisine": metadata.get("cuisine", "Unknown"),
+        "difficulty": metadata.get("difficulty", "Unknown"),
+        "created_by_ai": recipe.created_by_ai,
+    }
+
+    whole = "\n".join([header] + [f"{name}: {body}" for name, body in sections])
+    if count_tokens(whole) <= max_tokens:
+        return [Document(page_content=whole, metadata={**base_metadata, "section": "all"})]
+
+    budget = max(max_tokens - count_tokens(header) - 1, 32)
+    chunks = []
+    for name, body in sections:
+        for label, text in _split_section(name, body, budget):
+            chunks.append(Document(
+                page_content=f"{header}\n{label}: {text}",
+                metadata={**base_metadata, "section": name.lower()}
+            ))
+    return chunks
+
+
+def chunk_recipes(recipes: Iterable, max_tokens: int = MAX_CHUNK_TOKENS) -> List[Document]:
+    """Chunk many recipes"""
+    chunks = []
+    for recipe in recipes:
+        chunks.extend(chunk_recipe(recipe, max_tokens))
+    return chunks
+
+
+def chunking_report(old_chunks: List[Document], new_chunks: List[Document]) -> Dict:
+    """Compare chunk counts and embedding token totals of two chunkings"""
+    old_tokens = sum(count_tokens(c.page_content) for c in old_chunks)
+    new_tokens = sum(count_tokens(c.page_content) for c in new_chunks)
+    return {
+        "old_chunks": len(old_chunks),
+        "new_chunks": len(new_chunks),
+        "old_tokens": old_tokens,
+        "new_tokens": new_tokens,
+        "token_savings_pct": round(100 * (old_tokens - new_tokens) / old_tokens, 1) if old_tokens else 0.0,
+    }
@@ -4,6 +4,7 @@ Run: python -m app.seed_recipes
 """
 from app.database import SessionLocal
 from app.db_models import Recipe
+from app.import_recipes import import_recipes
 
 # Sample vegan recipes
 RECIPES = [
@@ -156,46 +157,21 @@ RECIPES = [
 
 
 def seed_recipes():
-    """Add recipes to the database"""
-    db = SessionLocal()
+    """Add the sample recipes to the database (skips titles that already exist)"""
+    print("🌱 Seeding recipes into database...")
+    
+    stats = import_recipes(RECIPES)
+    
+    print(f"⏭️  Skipped {stats['skipped']} recipes (already exist)")
+    print(f"\n🎉 Successfully added {stats['inserted']} new recipes!")
+    print(f"⏱️  {stats['read']} rows in {stats['seconds']}s ({stats['rows_per_second']} rows/s)")
     
+    db = SessionLocal()
     try:
-        print("🌱 Seeding recipes into database...")
-        
-        # Check if recipes already exist
-        existing_count = db.query(Recipe).count()
-        if existing_count > 0:
-            print(f"⚠️  Database already has {existing_count} recipes.")
-            response = input("Do you want to add more recipes? (y/n): ")
-            if response.lower() != 'y':
-                print("❌ Seeding cancelled.")
-                return
-        
-        added = 0
-        for recipe_data in RECIPES:
-            # Check if recipe with same title exists
-            existing = db.query(Recipe).filter(Recipe.title == recipe_data["title"]).first()
-            if existing:
-                print(f"⏭️  Skipping '{recipe_data['title']}' (already exists)")
-                continue
-            
-            recipe = Recipe(**recipe_data)
-            db.add(recipe)
-            added += 1
-            print(f"✅ Added: {recipe_data['title']}")
-        
-        db.commit()
-        print(f"\n🎉 Successfully added {added} new recipes!")
         print(f"📊 Total recipes in database: {db.query(Recipe).count()}")
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ Error seeding recipes: {e}")
-        raise
     finally:
         db.close()
 
 
 if __name__ == "__main__":
     seed_recipes()
-
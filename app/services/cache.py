@@ -0,0 +1,290 @@
+"""
+Cache service - per-process read-through cache for users, goals and recipes.
+
+Entries are Pydantic snapshots or pre-rendered recipe cards (never live ORM
+objects), bounded by a TTL and an LRU size limit. Services evict keys after
+every committed write. With several workers, set CACHE_INVALIDATION_CHANNEL so
+each worker also tells the others:
+
+    table  - rows in cache_invalidations, polled by every worker
+    file   - lines appended to CACHE_INVALIDATION_FILE, tailed by every worker
+
+Without a channel, other workers serve a stale entry for at most the TTL.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select
+
+from app.database import engine, read_source
+from app.db_models import CacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "")  # "", "table" or "file"
+INVALIDATION_FILE = os.getenv("CACHE_INVALIDATION_FILE", "cache_invalidations.log")
+POLL_INTERVAL_SECONDS = float(os.getenv("CACHE_POLL_INTERVAL_SECONDS", "1"))
+# How long a skipped id is re-read for, in case its row commits late
+LOOKBACK_SECONDS = float(os.getenv("CACHE_INVALIDATION_LOOKBACK_SECONDS", "10"))
+KEEP_INVALIDATION_ROWS = 10000
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value, or None on a miss or an expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not CACHE_ENABLED:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+users = TTLCache("users")
+goals = TTLCache("goals")
+recipes = TTLCache("recipes")
+recipe_cards = TTLCache("recipe_cards")  # recipe_id -> (etag, JSON body)
+CACHES = {cache.name: cache for cache in (users, goals, recipes, recipe_cards)}
+
+
+def _apply(cache_keys: Iterable[str]) -> None:
+    """Evict "<cache>:<id>" keys from the local caches"""
+    for cache_key in cache_keys:
+        name, _, key = cache_key.partition(":")
+        if name in CACHES:
+            CACHES[name].invalidate(int(key))
+
+
+class TableChannel:
+    """
+    Invalidations shared through the cache_invalidations table.
+
+    On PostgreSQL ids are taken at INSERT but rows show up at COMMIT, so a
+    poll can see id 11 before id 10 commits. Ids skipped below the newest one
+    seen are gaps: they are read again (ids already applied are skipped) until
+    they show up or LOOKBACK_SECONDS pass, e.g. after a rollback.
+    """
+
+    def __init__(self):
+        with engine.connect() as connection:
+            self.last_id = connection.scalar(select(func.max(CacheInvalidation.id))) or 0
+        self._gaps: Dict[int, float] = {}  # Skipped id -> when it was first missing
+        self._applied: set = set()  # Ids above the lookback floor already returned
+
+    def _floor(self) -> int:
+        return min(self._gaps) - 1 if self._gaps else self.last_id
+
+    def publish(self, cache_keys: List[str]) -> None:
+        with engine.begin() as connection:
+            connection.execute(insert(CacheInvalidation), [{"cache_key": key} for key in cache_keys])
+
+    def poll(self) -> List[str]:
+        now = time.monotonic()
+        self._gaps = {row_id: since for row_id, since in self._gaps.items() if now - since < LOOKBACK_SECONDS}
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(CacheInvalidation.id, CacheInvalidation.cache_key)
+                .where(CacheInvalidation.id > self._floor())
+                .order_by(CacheInvalidation.id)
+            ).all()
+            new_rows = [row for row in rows if row.id not in self._applied]
+            if new_rows:
+                visible = {row.id for row in rows}
+                for row in new_rows:
+                    self._gaps.pop(row.id, None)
+                newest = new_rows[-1].id
+                for row_id in range(self.last_id + 1, newest):
+                    if row_id not in visible:
+                        self._gaps[row_id] = now
+                self.last_id = max(self.last_id, newest)
+                connection.execute(
+                    delete(CacheInvalidation).where(CacheInvalidation.id <= self.last_id - KEEP_INVALIDATION_ROWS)
+                )
+        floor = self._floor()
+        self._applied = {row.id for row in rows if row.id > floor}
+        return [row.cache_key for row in new_rows]
+
+
+class FileChannel:
+    """Invalidations shared through an append-only file"""
+
+    def __init__(self, path: str = INVALIDATION_FILE):
+        self.path = path
+        self.offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def publish(self, cache_keys: List[str]) -> None:
+        # One O_APPEND write per call, so lines from different workers never interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, "".join(f"{key}\n" for key in cache_keys).encode())
+        finally:
+            os.close(fd)
+
+    def poll(self) -> List[str]:
+        if not os.path.exists(self.path):
+            return []
+        if os.path.getsize(self.path) < self.offset:
+            self.offset = 0  # File was truncated or rotated
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # Leave a partially written last line for the next poll
+        complete = data[:data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+        return complete.decode().split()
+
+
+_channel = None
+
+
+def get_channel():
+    """The configured invalidation channel, or None if disabled"""
+    global _channel
+    if _channel is None and INVALIDATION_CHANNEL:
+        _channel = TableChannel() if INVALIDATION_CHANNEL == "table" else FileChannel()
+    return _channel
+
+
+def invalidate(name: str, keys: Iterable[int]) -> None:
+    """
+    Evict keys from a cache in this process and tell the other workers.
+    Call after the write has been committed.
+    """
+    cache_keys = [f"{name}:{key}" for key in keys]
+    _apply(cache_keys)
+    channel = get_channel()
+    if channel is not None and cache_keys:
+        channel.publish(cache_keys)
+
+
+async def ainvalidate(name: str, keys: Iterable[int]) -> None:
+    """invalidate() for async code: the channel write runs in the threadpool"""
+    cache_keys = [f"{name}:{key}" for key in keys]
+    _apply(cache_keys)
+    channel = get_channel()
+    if channel is not None and cache_keys:
+        await run_in_threadpool(channel.publish, cache_keys)
+
+
+def stats() -> Dict:
+    """Per-cache counters plus totals"""
+    per_cache = {name: cache.stats() for name, cache in CACHES.items()}
+    hits = sum(s["hits"] for s in per_cache.values())
+    lookups = hits + sum(s["misses"] for s in per_cache.values())
+    return {
+        "enabled": CACHE_ENABLED,
+        "invalidation_channel": INVALIDATION_CHANNEL or None,
+        "caches": per_cache,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def can_read(db) -> bool:
+    """Whether a request on this session may be answered from the cache"""
+    # A client that just wrote reads the primary: an entry may predate its write
+    return read_source(db) != "pinned"
+
+
+def can_fill(db) -> bool:
+    """Whether rows read through this session may be cached"""
+    # A lagging replica would put a pre-write copy back for the whole TTL
+    return read_source(db) != "replica"
+
+
+def check_worker_setup() -> None:
+    """
+    Refuse to run several worker processes (WEB_CONCURRENCY > 1) with caching
+    on and no invalidation channel: a write served by one worker would leave
+    the others serving the old entry for the whole TTL.
+
+    Raises:
+        RuntimeError: If the configuration would serve stale reads
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+    if workers > 1 and CACHE_ENABLED and not INVALIDATION_CHANNEL:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers} needs CACHE_INVALIDATION_CHANNEL=table (or file), "
+            "or CACHE_ENABLED=false"
+        )
+
+
+class InvalidationPoller:
+    """Background thread applying invalidations published by other workers"""
+
+    def __init__(self, interval: float = POLL_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if get_channel() is None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                _apply(get_channel().poll())
+            except Exception as e:
+                logger.error(f"Cache invalidation poll failed, will retry: {e}")
@@ -0,0 +1,262 @@
+"""
+Feedback service - records recipe feedback and keeps the recipe_stats rollup.
+
+Feedback requests are group-committed: each request queues its row and waits,
+and a single writer task flushes whatever has queued up (up to
+FEEDBACK_BATCH_SIZE rows, or after FEEDBACK_BATCH_DELAY_MS) as one transaction:
+one multi-row INSERT into recipe_feedback, one upsert per touched recipe into
+recipe_stats and one upsert per user into user_taste_vectors. A request only
+returns once its row is committed. If the batch transaction fails, its rows
+are retried one per transaction so a bad row only fails its own request.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.db_models import Recipe, RecipeFeedback, RecipeStats
+from app.models import RecipeFeedbackCreate
+from app.services import taste_service
+from app.services.suggestion_service import aget_recipe_matrix
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "100"))
+FEEDBACK_BATCH_DELAY_MS = float(os.getenv("FEEDBACK_BATCH_DELAY_MS", "10"))
+
+
+def _stats_deltas(rows: List[Dict]) -> List[Dict]:
+    """Aggregate a batch of feedback rows into one recipe_stats delta per recipe"""
+    deltas: Dict[int, Dict] = {}
+    for row in rows:
+        delta = deltas.setdefault(row["recipe_id"], {
+            "recipe_id": row["recipe_id"], "feedback_count": 0, "rating_count": 0,
+            "rating_sum": 0, "likes": 0, "dislikes": 0,
+        })
+        delta["feedback_count"] += 1
+        if row.get("rating") is not None:
+            delta["rating_count"] += 1
+            delta["rating_sum"] += row["rating"]
+        if row.get("liked") is True:
+            delta["likes"] += 1
+        elif row.get("liked") is False:
+            delta["dislikes"] += 1
+    return list(deltas.values())
+
+
+def _upsert_stats(dialect_name: str, deltas: List[Dict]):
+    """INSERT ... ON CONFLICT (recipe_id) DO UPDATE adding the deltas"""
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(RecipeStats).values([
+        {
+            **delta,
+            "avg_rating": delta["rating_sum"] / delta["rating_count"] if delta["rating_count"] else None,
+            "last_feedback_at": func.now(),
+        }
+        for delta in deltas
+    ])
+    new = statement.excluded
+    rating_count = RecipeStats.rating_count + new.rating_count
+    rating_sum = RecipeStats.rating_sum + new.rating_sum
+    return statement.on_conflict_do_update(
+        index_elements=[RecipeStats.recipe_id],
+        set_={
+            "feedback_count": RecipeStats.feedback_count + new.feedback_count,
+            "rating_count": rating_count,
+            "rating_sum": rating_sum,
+            "avg_rating": case((rating_count > 0, rating_sum * 1.0 / rating_count), else_=None),
+            "likes": RecipeStats.likes + new.likes,
+            "dislikes": RecipeStats.dislikes + new.dislikes,
+            "last_feedback_at": new.last_feedback_at,
+        }
+    )
+
+
+async def write_feedback_batch(db: AsyncSession, rows: List[Dict], matrix=None) -> List[RecipeFeedback]:
+    """
+    Insert feedback rows and update their recipes' stats (and, given the
+    recipe embeddings, their users' taste vectors) in one transaction.
+
+    Args:
+        db: Database session
+        rows: recipe_feedback column dicts
+        matrix: Optional RecipeMatrix with the recipe embeddings
+
+    Returns:
+        Created RecipeFeedback objects, in the order of rows
+    """
+    # One multi-row INSERT; ids are assigned in VALUES order
+    result = await db.scalars(insert(RecipeFeedback).returning(RecipeFeedback), rows)
+    created = sorted(result.all(), key=lambda feedback: feedback.id)
+    await db.execute(_upsert_stats(db.get_bind().dialect.name, _stats_deltas(rows)))
+    if matrix is not None:
+        await taste_service.update_taste_vectors(db, rows, matrix)
+    await db.commit()
+    return created
+
+
+def _row_error(error: Exception) -> Exception:
+    """The error a request gets when its own row cannot be written"""
+    if isinstance(error, IntegrityError):
+        # The only constraints on recipe_feedback are the recipe and user FKs
+        return HTTPException(status_code=404, detail="Recipe or user not found")
+    if isinstance(error, DataError):
+        return HTTPException(status_code=422, detail="Invalid feedback")
+    return error
+
+
+class FeedbackBatcher:
+    """Group-commits feedback from concurrent requests"""
+
+    def __init__(
+        self,
+        vector_index=None,
+        max_batch: int = FEEDBACK_BATCH_SIZE,
+        max_delay_ms: float = FEEDBACK_BATCH_DELAY_MS
+    ):
+        self.vector_index = vector_index  # Source of recipe embeddings for taste vectors
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop the writer"""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def submit(self, row: Dict) -> RecipeFeedback:
+        """Queue one feedback row and wait until its batch is committed"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _next_batch(self) -> Tuple[List, bool]:
+        """Items for one transaction, and whether stop() was requested"""
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if not batch:
+                continue
+            matrix = await self._recipe_matrix()
+            try:
+                async with AsyncSessionLocal() as db:
+                    created = await write_feedback_batch(db, [row for row, _ in batch], matrix)
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.warning(f"Feedback row failed: {e}")
+                    self._resolve(batch[0][1], error=_row_error(e))
+                else:
+                    logger.warning(f"Feedback batch of {len(batch)} failed, retrying rows one by one: {e}")
+                    await self._write_rows(batch, matrix)
+                continue
+            for (_, future), feedback in zip(batch, created):
+                self._resolve(future, feedback)
+
+    async def _write_rows(self, batch: List, matrix) -> None:
+        """Write each row of a failed batch in its own transaction"""
+        for row, future in batch:
+            try:
+                async with AsyncSessionLocal() as db:
+                    created = await write_feedback_batch(db, [row], matrix)
+            except Exception as e:
+                logger.warning(f"Feedback row failed: {e}")
+                self._resolve(future, error=_row_error(e))
+                continue
+            self._resolve(future, created[0])
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, error: Optional[Exception] = None) -> None:
+        if future.done():  # The request was cancelled
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _recipe_matrix(self):
+        """Recipe embeddings, or None when there is no usable index"""
+        if self.vector_index is None:
+            return None
+        try:
+            return await aget_recipe_matrix(self.vector_index)
+        except Exception as e:
+            logger.warning(f"Taste vectors not updated, recipe embeddings unavailable: {e}")
+            return None
+
+
+async def submit_feedback(
+    batcher: FeedbackBatcher,
+    recipe_id: int,
+    user_id: int,
+    feedback_data: RecipeFeedbackCreate
+) -> RecipeFeedback:
+    """
+    Record feedback for a recipe (batched with concurrent submissions).
+
+    Args:
+        batcher: The app's FeedbackBatcher
+        recipe_id: Recipe ID (must exist)
+        user_id: User ID
+        feedback_data: Feedback fields
+
+    Returns:
+        Created RecipeFeedback object
+    """
+    row = {"recipe_id": recipe_id, "user_id": user_id, **feedback_data.model_dump()}
+    return await batcher.submit(row)
+
+
+async def get_popular_recipes(db: AsyncSession, sort: str = "likes", limit: int = 20) -> List:
+    """
+    Top recipes by likes or average rating, read from recipe_stats.
+
+    Args:
+        db: Database session
+        sort: "likes" or "rating"
+        limit: Number of recipes
+
+    Returns:
+        List of (RecipeStats, title) rows, best first
+    """
+    order = RecipeStats.likes if sort == "likes" else RecipeStats.avg_rating
+    query = (
+        select(RecipeStats, Recipe.title)
+        .join(Recipe, Recipe.id == RecipeStats.recipe_id)
+        .where(order.is_not(None))
+        .order_by(order.desc(), RecipeStats.recipe_id)
+        .limit(limit)
+    )
+    return list((await db.execute(query)).all())
@@ -1,18 +1,23 @@
 """
 Goal service - handles goal creation, retrieval, and management.
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.db_models import Goal, User
-from app.models import GoalCreate, GoalUpdate
-from typing import List, Optional
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db_models import Goal, Path, RecipeSuggestion, User
+from app.models import GoalBulkRequest, GoalCreate, GoalResponse, GoalUpdate
+from app.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.services import cache
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 
 
-def create_goal(db: Session, user_id: int, goal_data: GoalCreate) -> Goal:
+async def create_goal(db: AsyncSession, user_id: int, goal_data: GoalCreate) -> Goal:
     """
     Create a new learning goal for a user.
     
+    The user check and the insert are one INSERT ... SELECT ... RETURNING
+    statement: no row comes back if the user doesn't exist.
+    
     Args:
         db: Database session
         user_id: User ID
@@ -24,31 +29,29 @@ def create_goal(db: Session, user_id: int, goal_data: GoalCreate) -> Goal:
     Raises:
         HTTPException: If user doesn't exist
     """
-    # Verify user exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    if not _supports_returning(db, "insert"):
+        return await _create_goal_fallback(db, user_id, goal_data)
     
-    # Create goal
-    goal = Goal(
-        user_id=user_id,
-        title=goal_data.title,
-        description=goal_data.description,
-        target_recipes_per_week=goal_data.target_recipes_per_week,
-        target_skill=goal_data.target_skill,
-        status="active"
+    values = {**goal_data.model_dump(), "user_id": user_id, "status": "active"}
+    source = select(*(literal(value, type_=getattr(Goal, key).type) for key, value in values.items()))
+    statement = (
+        insert(Goal)
+        .from_select(list(values), source.where(User.id == user_id))
+        .returning(Goal)
     )
+    goal = await db.scalar(statement)
+    if not goal:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
     
-    db.add(goal)
-    db.commit()
-    db.refresh(goal)
-    
+    await db.commit()
     return goal
 
 
-def get_goal(db: Session, goal_id: int, user_id: Optional[int] = None) -> Optional[Goal]:
+async def get_goal(db: AsyncSession, goal_id: int, user_id: Optional[int] = None) -> Optional[GoalResponse]:
     """
     Get a goal by ID, optionally verifying it belongs to a user.
+    Served from the read-through cache; writes below evict the entry.
     
     Args:
         db: Database session
@@ -56,39 +59,63 @@ def get_goal(db: Session, goal_id: int, user_id: Optional[int] = None) -> Option
         user_id: Optional user ID to verify ownership
     
     Returns:
-        Goal object or None
+        GoalResponse snapshot or None
     """
-    query = db.query(Goal).filter(Goal.id == goal_id)
+    goal = cache.goals.get(goal_id) if cache.can_read(db) else None
+    if goal is None:
+        row = await _load_goal(db, goal_id)
+        if row is None:
+            return None
+        goal = GoalResponse.model_validate(row)
+        if cache.can_fill(db):
+            cache.goals.set(goal_id, goal)
+    
+    if user_id and goal.user_id != user_id:
+        return None
+    return goal
+
+
+async def _load_goal(db: AsyncSession, goal_id: int, user_id: Optional[int] = None) -> Optional[Goal]:
+    """Goal row straight from the database"""
+    query = select(Goal).where(Goal.id == goal_id)
     
     if user_id:
-        query = query.filter(Goal.user_id == user_id)
+        query = query.where(Goal.user_id == user_id)
     
-    return query.first()
+    return await db.scalar(query)
 
 
-def get_user_goals(db: Session, user_id: int, status: Optional[str] = None) -> List[Goal]:
+async def get_user_goals(
+    db: AsyncSession,
+    user_id: int,
+    status: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Tuple[List[Goal], Optional[str]]:
     """
-    Get all goals for a user, optionally filtered by status.
+    Get one page of a user's goals, newest first, optionally filtered by status.
     
     Args:
         db: Database session
         user_id: User ID
         status: Optional status filter (active, completed, paused)
+        limit: Page size
+        cursor: Cursor returned with the previous page
     
     Returns:
-        List of Goal objects
+        Tuple of (list of Goal objects, next page cursor or None)
     """
-    query = db.query(Goal).filter(Goal.user_id == user_id)
+    query = select(Goal).where(Goal.user_id == user_id)
     
     if status:
-        query = query.filter(Goal.status == status)
+        query = query.where(Goal.status == status)
     
-    return query.order_by(desc(Goal.created_at)).all()
+    return await paginate(db, query, Goal, limit, cursor)
 
 
-def update_goal(db: Session, goal_id: int, user_id: int, goal_data: GoalUpdate) -> Goal:
+async def update_goal(db: AsyncSession, goal_id: int, user_id: int, goal_data: GoalUpdate) -> Goal:
     """
-    Update an existing goal.
+    Update an existing goal with a single UPDATE ... RETURNING statement.
     
     Args:
         db: Database session
@@ -102,31 +129,44 @@ def update_goal(db: Session, goal_id: int, user_id: int, goal_data: GoalUpdate)
     Raises:
         HTTPException: If goal not found or doesn't belong to user
     """
-    goal = get_goal(db, goal_id, user_id)
+    # Only fields that were provided (and not null) are updated
+    changes = goal_data.model_dump(exclude_none=True)
+    if not changes:
+        goal = await get_goal(db, goal_id, user_id)
+    elif _supports_returning(db, "update"):
+        statement = (
+            update(Goal)
+            .where(Goal.id == goal_id, Goal.user_id == user_id)
+            .values(**changes)
+            .returning(Goal)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        goal = await db.scalar(statement)
+    else:
+        goal = await _load_goal(db, goal_id, user_id)
+        if goal:
+            for key, value in changes.items():
+                setattr(goal, key, value)
+            await db.flush()
+            await db.refresh(goal)
+    
     if not goal:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    # Update fields if provided
-    if goal_data.title is not None:
-        goal.title = goal_data.title
-    if goal_data.description is not None:
-        goal.description = goal_data.description
-    if goal_data.target_recipes_per_week is not None:
-        goal.target_recipes_per_week = goal_data.target_recipes_per_week
-    if goal_data.target_skill is not None:
-        goal.target_skill = goal_data.target_skill
-    if goal_data.status is not None:
-        goal.status = goal_data.status
-    
-    db.commit()
-    db.refresh(goal)
-    
+    await db.commit()
+    if changes:
+        await cache.ainvalidate("goals", [goal_id])
     return goal
 
 
-def delete_goal(db: Session, goal_id: int, user_id: int) -> bool:
+async def delete_goal(db: AsyncSession, goal_id: int, user_id: int) -> bool:
     """
-    Delete a goal (soft delete by setting status to 'deleted' or hard delete).
+    Delete a goal and its paths and recipe suggestions.
+    
+    Children are removed with set-based DELETEs scoped to the owned goal (the
+    ORM cascade would load them first), then the goal itself with
+    DELETE ... RETURNING, all in one transaction.
     
     Args:
         db: Database session
@@ -134,17 +174,105 @@ def delete_goal(db: Session, goal_id: int, user_id: int) -> bool:
         user_id: User ID (to verify ownership)
     
     Returns:
-        True if deleted, False if not found
+        True if deleted
     
     Raises:
-        HTTPException: If goal doesn't belong to user
+        HTTPException: If goal not found or doesn't belong to user
     """
-    goal = get_goal(db, goal_id, user_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
+    owned = select(Goal.id).where(Goal.id == goal_id, Goal.user_id == user_id).scalar_subquery()
+    for child in (Path, RecipeSuggestion):
+        await db.execute(
+            delete(child).where(child.goal_id == owned).execution_options(synchronize_session=False)
+        )
     
-    db.delete(goal)
-    db.commit()
+    statement = delete(Goal).where(Goal.id == goal_id, Goal.user_id == user_id)
+    if _supports_returning(db, "delete"):
+        deleted = await db.scalar(statement.returning(Goal.id).execution_options(synchronize_session=False))
+    else:
+        deleted = (await db.execute(statement.execution_options(synchronize_session=False))).rowcount
     
+    if not deleted:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Goal not found")
+    
+    await db.commit()
+    await cache.ainvalidate("goals", [goal_id])
     return True
 
+
+async def bulk_upsert_goals(db: AsyncSession, user_id: int, bulk_data: GoalBulkRequest) -> Tuple[List[Goal], List[Goal]]:
+    """
+    Create and update many goals in one transaction.
+    
+    Creates are one multi-row INSERT ... RETURNING; updates are one ownership
+    check, one executemany UPDATE by primary key and one SELECT to read the
+    results back. Either every goal is written or none is.
+    
+    Args:
+        db: Database session
+        user_id: User ID (owner of every goal)
+        bulk_data: Goals to create and goal updates (each with its id)
+    
+    Returns:
+        Tuple of (created goals, updated goals), each in request order
+    
+    Raises:
+        HTTPException: If the user doesn't exist or an updated goal isn't found
+    """
+    if not await db.scalar(select(User.id).where(User.id == user_id)):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    created: List[Goal] = []
+    if bulk_data.create:
+        rows = [
+            {**goal.model_dump(), "user_id": user_id, "status": "active"}
+            for goal in bulk_data.create
+        ]
+        # One multi-row INSERT; ids are assigned in VALUES order, so sorting
+        # by id restores request order (sort_by_parameter_order would make
+        # SQLite fall back to one INSERT per row)
+        result = await db.scalars(insert(Goal).returning(Goal), rows)
+        created = sorted(result.all(), key=lambda goal: goal.id)
+    
+    updated: List[Goal] = []
+    if bulk_data.update:
+        goal_ids = [goal.id for goal in bulk_data.update]
+        owned = set(await db.scalars(
+            select(Goal.id).where(Goal.id.in_(goal_ids), Goal.user_id == user_id)
+        ))
+        missing = [goal_id for goal_id in goal_ids if goal_id not in owned]
+        if missing:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail=f"Goals not found: {missing}")
+    
+        rows = [goal.model_dump(exclude_none=True) for goal in bulk_data.update]
+        rows = [row for row in rows if len(row) > 1]
+        if rows:
+            await db.execute(update(Goal), rows)
+        result = await db.scalars(
+            select(Goal).where(Goal.id.in_(goal_ids)).execution_options(populate_existing=True)
+        )
+        by_id = {goal.id: goal for goal in result}
+        updated = [by_id[goal_id] for goal_id in goal_ids]
+    
+    await db.commit()
+    await cache.ainvalidate("goals", [goal.id for goal in updated])
+    return created, updated
+
+
+async def _create_goal_fallback(db: AsyncSession, user_id: int, goal_data: GoalCreate) -> Goal:
+    """create_goal for backends without INSERT ... RETURNING (e.g. SQLite < 3.35)"""
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    goal = Goal(user_id=user_id, status="active", **goal_data.model_dump())
+    db.add(goal)
+    await db.commit()
+    await db.refresh(goal)
+    return goal
+
+
+def _supports_returning(db: AsyncSession, statement: str) -> bool:
+    """Whether the backend supports <statement> ... RETURNING (insert, update or delete)"""
+    return getattr(db.get_bind().dialect, f"{statement}_returning", False)
@@ -0,0 +1,143 @@
+"""
+Index sync service - drains the recipe outbox into the vector index.
+
+Recipe writes enqueue their IDs in recipe_index_outbox (see app.db_models).
+A background consumer picks them up in batches, re-embeds the affected recipes
+with one embedding call per batch and upserts them into the active index
+generation, giving near-real-time freshness without full rebuilds.
+
+With several worker processes every worker starts a consumer, but only the
+one holding the sync leader lock drains the outbox (another takes over if
+its process dies), and each drain holds the index writer lock.
+"""
+import logging
+import os
+import threading
+from typing import Dict
+
+from app.database import SessionLocal
+from app.db_models import Recipe, RecipeIndexOutbox
+from app.recipe_chunker import chunk_recipes
+from app.services import ingest_service, usage_service
+from app.vector_index import (
+    CHROMA_ROOT, FileLock, IndexWriterBusy, current_generation, export_delta, export_snapshot, writer_lock
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("INDEX_SYNC_BATCH_SIZE", "100"))
+POLL_INTERVAL_SECONDS = float(os.getenv("INDEX_SYNC_INTERVAL_SECONDS", "5"))
+SYNC_LEADER_LOCK = os.path.join(CHROMA_ROOT, "sync-leader.lock")
+
+
+def process_outbox_batch(vector_index, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Apply one batch of queued recipe changes to the active index.
+    Outbox rows are removed only after the index write (and its snapshot)
+    succeeded, so a crash simply replays the batch (upserts are idempotent).
+    Call it while holding the writer lock.
+
+    Returns:
+        Dict with counts of upserted and deleted recipes
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(RecipeIndexOutbox)
+            .order_by(RecipeIndexOutbox.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return {"upserted": 0, "deleted": 0}
+
+        # Last operation per recipe wins
+        operations = {}
+        for row in rows:
+            operations[row.recipe_id] = row.operation
+        upsert_ids = [rid for rid, op in operations.items() if op == "upsert"]
+
+        recipes = db.query(Recipe).filter(Recipe.id.in_(upsert_ids)).all() if upsert_ids else []
+        chunks = chunk_recipes(recipes)
+        chunk_ids = []
+        counters: Dict[int, int] = {}
+        for chunk in chunks:
+            recipe_id = chunk.metadata["recipe_id"]
+            counters[recipe_id] = counters.get(recipe_id, 0) + 1
+            chunk_ids.append(f"recipe-{recipe_id}-{counters[recipe_id]}")
+
+        # Replace every existing chunk of the touched recipes
+        store = vector_index.store()
+        stale = store.get(where={"recipe_id": {"$in": list(operations)}}, include=[])["ids"]
+        if stale:
+            store.delete(ids=stale)
+        if chunks:
+            with usage_service.track("index_sync"):
+                store.add_documents(chunks, ids=chunk_ids)
+        # Publish only what changed; the full snapshot is re-exported only on compaction
+        export_delta(vector_index.generation, store, list(operations), chunk_ids if chunks else [])
+        vector_index.mark_changed()
+
+        db.query(RecipeIndexOutbox).filter(
+            RecipeIndexOutbox.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        return {"upserted": len(recipes), "deleted": len(operations) - len(recipes)}
+    finally:
+        db.close()
+
+
+def ensure_snapshot(vector_index) -> None:
+    """Export a snapshot for an active generation built before snapshots existed"""
+    if current_generation() is not None and vector_index.snapshot() is None:
+        store = vector_index.store()
+        export_snapshot(vector_index.generation, store)
+        logger.info(f"Exported snapshot for generation {vector_index.generation}")
+
+
+class OutboxConsumer:
+    """Background thread that keeps the vector index in sync with the Recipe table"""
+
+    def __init__(self, vector_index, interval: float = POLL_INTERVAL_SECONDS):
+        self.vector_index = vector_index
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader = FileLock(SYNC_LEADER_LOCK)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="index-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._leader.release()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # A full rebuild is already reading the latest recipes; leave the
+            # outbox alone so nothing lands in the generation being replaced
+            if ingest_service.is_ingest_running():
+                continue
+            # Another worker process is the leader
+            if not self._leader.acquire(timeout=0):
+                continue
+            try:
+                # Don't wait on a rebuild elsewhere; its rows are picked up next round
+                with writer_lock(timeout=0):
+                    ensure_snapshot(self.vector_index)
+                    while True:
+                        stats = process_outbox_batch(self.vector_index)
+                        if stats["upserted"] or stats["deleted"]:
+                            logger.info(
+                                f"Index sync: {stats['upserted']} upserted, {stats['deleted']} deleted"
+                            )
+                        if stats["upserted"] + stats["deleted"] == 0 or self._stop.is_set():
+                            break
+            except IndexWriterBusy:
+                continue
+            except Exception as e:
+                logger.error(f"Index sync failed, will retry: {e}")
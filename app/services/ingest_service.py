@@ -0,0 +1,219 @@
+"""
+Ingest service - rebuilds the vector index and runs ingestion jobs in the background.
+
+Jobs run one at a time on a dedicated worker thread, and one at a time across
+worker processes (they queue on the index writer lock). Job state is stored as
+JSON files under the index directory, so every worker can report on any job.
+Each job builds a new index generation off to the side (see app.vector_index)
+and only switches to it once it is complete, so /ask keeps answering from the
+previous generation meanwhile.
+A rebuild holds the index writer lock from reading the sources to activating
+the new generation, so it never races another worker's job, an ingestion
+script or an outbox sync.
+"""
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app import openai_clients
+from app.embedding_batcher import TokenBatchingEmbeddings
+from app.services import usage_service
+from app.vector_index import CHROMA_ROOT, WRITER_LOCK_TIMEOUT_SECONDS, build_generation, writer_busy, writer_lock
+
+# Sources that make up the index
+SOURCES = ("recipes", "text")
+
+# Job state lives in files next to the index, so GET /api/ingest/{job_id}
+# works on every worker process; the most recent MAX_TRACKED_JOBS are kept
+JOBS_DIR = os.path.join(CHROMA_ROOT, "jobs")
+MAX_TRACKED_JOBS = 50
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def collect_chunks(sources: Sequence[str] = SOURCES) -> List:
+    """Load and chunk every requested source"""
+    # Loaders and text splitters are only imported when a job actually runs
+    from app import ingest, ingest_recipes_to_chroma
+
+    chunks = []
+    if "recipes" in sources:
+        chunks.extend(ingest_recipes_to_chroma.load_recipe_chunks())
+    if "text" in sources:
+        chunks.extend(ingest.load_text_chunks())
+    return chunks
+
+
+def rebuild_index(
+    sources: Sequence[str] = SOURCES,
+    embeddings=None,
+    lock_timeout: Optional[float] = WRITER_LOCK_TIMEOUT_SECONDS
+) -> Dict:
+    """
+    Build a new index generation from the given sources and activate it.
+    Waits up to lock_timeout seconds (None: as long as it takes) for another
+    process's index write to finish.
+
+    Returns:
+        Dict with the generation name, chunk count, embedding request stats
+        and the tokens the embeddings used
+
+    Raises:
+        ValueError: If the sources produced no chunks
+        IndexWriterBusy: If another process kept the index locked too long
+    """
+    with writer_lock(lock_timeout), usage_service.track("ingest") as usage:
+        chunks = collect_chunks(sources)
+        if not chunks:
+            raise ValueError("No documents to ingest for sources: " + ", ".join(sources))
+
+        if embeddings is None:
+            embeddings = openai_clients.get_embeddings()
+        # Pack embedding requests by tokens rather than by item count
+        batcher = TokenBatchingEmbeddings(embeddings)
+        generation = build_generation(chunks, batcher)
+    return {"generation": generation, "chunks": len(chunks), "embedding": batcher.stats(), "usage": usage.as_dict()}
+
+
+class IngestJob:
+    """State of one background ingestion job"""
+
+    def __init__(self, sources: Sequence[str]):
+        self.id = uuid.uuid4().hex
+        self.sources = list(sources)
+        self.status = "pending"  # pending, running, completed, failed
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.generation: Optional[str] = None
+        self.chunks: Optional[int] = None
+        self.embedding_requests: Optional[int] = None
+        self.error: Optional[str] = None
+        self.pid = os.getpid()  # Worker process running the job
+
+    def to_dict(self) -> Dict:
+        data = dict(vars(self))
+        for key in _TIMESTAMPS:
+            if data[key] is not None:
+                data[key] = data[key].isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IngestJob":
+        job = cls.__new__(cls)
+        vars(job).update(data)
+        for key in _TIMESTAMPS:
+            if data.get(key) is not None:
+                setattr(job, key, datetime.fromisoformat(data[key]))
+        return job
+
+
+_TIMESTAMPS = ("created_at", "started_at", "finished_at")
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _save_job(job: IngestJob) -> None:
+    """Write the job's state where every worker process can read it (atomic replace)"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    tmp_path = f"{_job_path(job.id)}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job.to_dict(), f)
+    os.replace(tmp_path, _job_path(job.id))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _prune_jobs() -> None:
+    """Keep the MAX_TRACKED_JOBS most recent job files"""
+    try:
+        names = [name for name in os.listdir(JOBS_DIR) if name.endswith(".json")]
+    except FileNotFoundError:
+        return
+    paths = sorted((os.path.join(JOBS_DIR, name) for name in names), key=os.path.getmtime, reverse=True)
+    for path in paths[MAX_TRACKED_JOBS:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# One job at a time per process; across processes rebuilds queue on the writer lock
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+
+
+def _run_job(job: IngestJob, embeddings, on_activate: Optional[Callable[[], None]]) -> None:
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc)
+    _save_job(job)
+    try:
+        # Wait for a rebuild running in another worker instead of failing
+        stats = rebuild_index(job.sources, embeddings, lock_timeout=None)
+        job.generation = stats["generation"]
+        job.chunks = stats["chunks"]
+        job.embedding_requests = stats["embedding"]["requests"]
+        if on_activate is not None:
+            on_activate()
+        job.status = "completed"
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = "failed"
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+        _save_job(job)
+
+
+def submit_ingest_job(
+    sources: Sequence[str] = SOURCES,
+    embeddings=None,
+    on_activate: Optional[Callable[[], None]] = None
+) -> IngestJob:
+    """
+    Queue a rebuild of the index on the background worker.
+
+    Args:
+        sources: Which sources to index (recipes, text)
+        embeddings: Embedding function to use (defaults to the shared OpenAI client)
+        on_activate: Called after the new generation has been activated
+
+    Returns:
+        The queued IngestJob
+    """
+    job = IngestJob(sources)
+    _save_job(job)
+    _prune_jobs()
+    _executor.submit(_run_job, job, embeddings, on_activate)
+    return job
+
+
+def get_ingest_job(job_id: str) -> Optional[IngestJob]:
+    """Get a job by ID, whichever worker process runs it"""
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    try:
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            job = IngestJob.from_dict(json.load(f))
+    except (FileNotFoundError, ValueError):
+        return None
+    if job.status in ("pending", "running") and not _pid_alive(job.pid):
+        job.status = "failed"
+        job.error = "Worker process exited before the job finished"
+    return job
+
+
+def is_ingest_running() -> bool:
+    """True while a rebuild (or any other index write) holds the writer lock, in any process"""
+    return writer_busy()
@@ -0,0 +1,133 @@
+"""
+Recipe service - recipe retrieval.
+
+The read endpoints serve pre-rendered recipe cards (app.recipe_cards): stored
+JSON bodies with a strong ETag, so a response is a cache or primary-key lookup
+and never re-serializes a recipe.
+"""
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, object_session
+
+from app.db_models import Recipe, RecipeCard
+from app.models import RecipeResponse
+from app.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.recipe_cards import card_etag, render_recipe_card
+from app.services import cache
+
+
+async def get_recipe(db: AsyncSession, recipe_id: int) -> Optional[RecipeResponse]:
+    """
+    Get a recipe by ID (read-through cached snapshot).
+    
+    Args:
+        db: Database session
+        recipe_id: Recipe ID
+    
+    Returns:
+        RecipeResponse snapshot or None
+    """
+    recipe = cache.recipes.get(recipe_id) if cache.can_read(db) else None
+    if recipe is None:
+        row = await db.scalar(select(Recipe).where(Recipe.id == recipe_id))
+        if row is None:
+            return None
+        recipe = RecipeResponse.model_validate(row)
+        if cache.can_fill(db):
+            cache.recipes.set(recipe_id, recipe)
+    return recipe
+
+
+async def _load_cards(db: AsyncSession, recipe_ids: Sequence[int]) -> Dict[int, Tuple[str, str]]:
+    """(etag, body) per recipe ID, from the cache or one query for the misses"""
+    cards = {}
+    for recipe_id in recipe_ids if cache.can_read(db) else ():
+        card = cache.recipe_cards.get(recipe_id)
+        if card is not None:
+            cards[recipe_id] = card
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in cards]
+    if missing:
+        rows = await db.execute(
+            select(RecipeCard.recipe_id, RecipeCard.etag, RecipeCard.body).where(RecipeCard.recipe_id.in_(missing))
+        )
+        for recipe_id, etag, body in rows:
+            cards[recipe_id] = (etag, body)
+            if cache.can_fill(db):
+                cache.recipe_cards.set(recipe_id, (etag, body))
+    # Recipes written behind the ORM's back (raw SQL) have no card: render on the fly
+    unrendered = [recipe_id for recipe_id in missing if recipe_id not in cards]
+    if unrendered:
+        for recipe in await db.scalars(select(Recipe).where(Recipe.id.in_(unrendered))):
+            cards[recipe.id] = render_recipe_card(recipe)
+    return cards
+
+
+async def get_recipe_card(db: AsyncSession, recipe_id: int) -> Optional[Tuple[str, str]]:
+    """
+    The pre-rendered card of a recipe.
+
+    Returns:
+        Tuple of (etag, JSON body), or None if the recipe doesn't exist
+    """
+    return (await _load_cards(db, [recipe_id])).get(recipe_id)
+
+
+async def list_recipe_cards(
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    difficulty: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    One page of recipe cards, newest first (keyset pagination).
+
+    Args:
+        db: Database session
+        limit: Page size
+        cursor: next_cursor from the previous page
+        cuisine: Optional exact-match filter
+        difficulty: Optional exact-match filter
+
+    Returns:
+        Tuple of (etag, JSON body of a Page of cards); the page is assembled
+        from the stored card bodies, and its ETag from theirs
+    """
+    query = select(Recipe).options(load_only(Recipe.id, Recipe.created_at))
+    if cuisine:
+        query = query.where(Recipe.cuisine == cuisine)
+    if difficulty:
+        query = query.where(Recipe.difficulty == difficulty)
+    rows, next_cursor = await paginate(db, query, Recipe, limit, cursor)
+
+    cards = await _load_cards(db, [row.id for row in rows])
+    page: List[Tuple[str, str]] = [cards[row.id] for row in rows if row.id in cards]
+    body = '{"items":[' + ",".join(card_body for _, card_body in page) + '],"next_cursor":' + json.dumps(next_cursor) + "}"
+    etag = card_etag(" ".join([etag for etag, _ in page] + [next_cursor or ""]).encode())
+    return etag, body
+
+
+# Recipes are edited through the ORM from several places (seeding, scripts),
+# so cached copies are evicted from mapper events once the session commits.
+@event.listens_for(Recipe, "after_update")
+@event.listens_for(Recipe, "after_delete")
+def _mark_recipe_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_recipe_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_recipes(session):
+    recipe_ids = session.info.pop("changed_recipe_ids", None)
+    if recipe_ids:
+        cache.invalidate("recipes", recipe_ids)
+        cache.invalidate("recipe_cards", recipe_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_recipes(session):
+    session.info.pop("changed_recipe_ids", None)
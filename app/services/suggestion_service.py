@@ -0,0 +1,261 @@
+"""
+Suggestion service - goal-aware recipe suggestions without an LLM call.
+
+A goal's target skill is embedded once and cached. Every recipe in the active
+vector index is kept as one row of an in-memory, L2-normalized matrix, so
+scoring all candidates is a single matrix-vector product. The matrix comes
+memory-mapped from the generation's snapshot (see app.vector_index), so
+worker processes share it. Recipes already
+suggested to the user are excluded through an in-memory set, and a goal never
+gets more than target_recipes_per_week suggestions in a rolling week. Scores
+are personalized with the user's taste vector (see taste_service).
+
+The in-memory set is per worker and only pre-filters candidates. The write is
+serialized per user (a row lock on the user, or SQLite's write lock), and the
+weekly quota and already-suggested recipes are re-checked inside that
+transaction, so concurrent requests can't repeat a recipe or overshoot the
+quota. A unique (goal_id, recipe_id) index backs this up in the database.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import desc, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_models import Goal, RecipeSuggestion, User
+from app.models import GoalResponse, RecipeSuggestionRequest, RecipeSuggestionResponse
+from app.services import goal_service, recipe_service, taste_service
+from app.services.cache import TTLCache
+from app.vector_index import average_recipe_vectors
+
+# Skill text -> normalized embedding; skills rarely change, so keep them a day
+skill_vectors = TTLCache("skill_vectors", maxsize=10000, ttl=24 * 3600)
+# User ID -> set of recipe IDs already suggested
+suggested_recipes = TTLCache("suggested_recipes", maxsize=10000, ttl=3600)
+
+
+class RecipeMatrix:
+    """One normalized embedding per recipe of the active index generation"""
+
+    def __init__(self, version: int, recipe_ids: np.ndarray, vectors: np.ndarray):
+        self.version = version
+        self.recipe_ids = recipe_ids
+        self.vectors = vectors
+        self.rows = {int(recipe_id): row for row, recipe_id in enumerate(recipe_ids)}
+
+    def vector(self, recipe_id: int) -> Optional[np.ndarray]:
+        """Normalized embedding of one recipe, or None if it isn't indexed"""
+        row = self.rows.get(recipe_id)
+        return None if row is None else self.vectors[row]
+
+    @classmethod
+    def build(cls, vector_index) -> "RecipeMatrix":
+        """Each recipe's averaged chunk embeddings (non-recipe chunks are skipped)"""
+        version = vector_index.version
+        snapshot = vector_index.snapshot()
+        if snapshot is not None:
+            return cls(version, snapshot.recipe_ids, snapshot.recipe_vectors)
+        # Generation without a snapshot: average from Chroma in this process
+        data = vector_index.store().get(where={"recipe_id": {"$gte": 0}}, include=["embeddings", "metadatas"])
+        return cls(version, *average_recipe_vectors(data["embeddings"], data["metadatas"]))
+
+    def top(self, query: np.ndarray, k: int, exclude: set) -> List[Tuple[int, float]]:
+        """The k best (recipe_id, cosine score) pairs not in exclude"""
+        if k <= 0 or not len(self.recipe_ids):
+            return []
+        scores = self.vectors @ query
+        if exclude:
+            scores[np.isin(self.recipe_ids, list(exclude))] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.recipe_ids[i]), float(scores[i])) for i in best]
+
+
+_matrix: Optional[RecipeMatrix] = None
+_matrix_lock = threading.Lock()
+
+
+def get_recipe_matrix(vector_index) -> RecipeMatrix:
+    """Recipe matrix for the active generation, rebuilt after any index change"""
+    global _matrix
+    vector_index.reader()  # Picks up a new generation or snapshot
+    with _matrix_lock:
+        if _matrix is None or _matrix.version != vector_index.version:
+            _matrix = RecipeMatrix.build(vector_index)
+        return _matrix
+
+
+async def aget_recipe_matrix(vector_index) -> RecipeMatrix:
+    """get_recipe_matrix for async code: only a rebuild leaves the event loop"""
+    matrix = _matrix
+    if matrix is None or matrix.version != vector_index.version:
+        matrix = await run_in_threadpool(get_recipe_matrix, vector_index)
+    return matrix
+
+
+def get_skill_vector(vector_index, skill: str) -> np.ndarray:
+    """Normalized embedding of a skill text, embedded at most once per TTL"""
+    key = skill.strip().lower()
+    vector = skill_vectors.get(key)
+    if vector is None:
+        vector = np.asarray(vector_index.embedding_function.embed_query(key), dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        skill_vectors.set(key, vector)
+    return vector
+
+
+async def _resolve_goal(db: AsyncSession, user_id: int, goal_id: Optional[int]) -> GoalResponse:
+    """The requested goal, or the user's most recent active goal"""
+    if goal_id is None:
+        goal_id = await db.scalar(
+            select(Goal.id)
+            .where(Goal.user_id == user_id, Goal.status == "active")
+            .order_by(desc(Goal.created_at), desc(Goal.id))
+            .limit(1)
+        )
+    goal = await goal_service.get_goal(db, goal_id, user_id) if goal_id else None
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return goal
+
+
+async def _suggested_recipe_ids(db: AsyncSession, user_id: int) -> set:
+    """Recipes already suggested to a user (loaded once, then kept in memory)"""
+    recipe_ids = suggested_recipes.get(user_id)
+    if recipe_ids is None:
+        recipe_ids = set(await db.scalars(
+            select(RecipeSuggestion.recipe_id).where(RecipeSuggestion.user_id == user_id)
+        ))
+        suggested_recipes.set(user_id, recipe_ids)
+    return recipe_ids
+
+
+async def _lock_user_suggestions(db: AsyncSession, user_id: int) -> None:
+    """
+    Serialize suggestion writes for a user until the transaction ends: a row
+    lock on the user, or on SQLite (no row locks) the database write lock,
+    taken with a no-op UPDATE.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        await db.execute(update(User).where(User.id == user_id).values(id=User.id))
+    else:
+        await db.execute(select(User.id).where(User.id == user_id).with_for_update())
+
+
+async def _count_this_week(db: AsyncSession, goal_id: int) -> int:
+    """Suggestions for a goal in the last 7 days, served by uq_recipe_suggestions_goal_recipe"""
+    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    return await db.scalar(
+        select(func.count(RecipeSuggestion.id))
+        .where(RecipeSuggestion.goal_id == goal_id, RecipeSuggestion.suggested_at >= week_ago)
+    )
+
+
+async def suggest_recipes(
+    db: AsyncSession,
+    vector_index,
+    user_id: int,
+    request: RecipeSuggestionRequest
+) -> List[RecipeSuggestionResponse]:
+    """
+    Suggest the recipes closest to a goal's target skill.
+
+    Args:
+        db: Database session
+        vector_index: Active VectorIndex (recipe embeddings and embedding function)
+        user_id: User ID
+        request: Goal (defaults to the latest active goal), count and comment
+
+    Returns:
+        New RecipeSuggestionResponse objects, best match first. Empty when the
+        goal's weekly quota is used up or no unseen recipe is left.
+
+    Raises:
+        HTTPException: If the goal doesn't exist or doesn't belong to the user
+    """
+    goal = await _resolve_goal(db, user_id, request.goal_id)
+
+    # Weekly quota (rolling 7 days); checked again once the write is serialized
+    count = min(request.count, goal.target_recipes_per_week - await _count_this_week(db, goal.id))
+    if count <= 0:
+        return []
+
+    # Both are cached; the blocking embed/Chroma read only happens on a miss
+    skill = goal.target_skill or goal.title
+    query = skill_vectors.get(skill.strip().lower())
+    if query is None:
+        query = await run_in_threadpool(get_skill_vector, vector_index, skill)
+    matrix = await aget_recipe_matrix(vector_index)
+
+    # Personalize: scoring against skill + weighted taste is still one matvec
+    taste = await taste_service.aload_taste_vector(db, user_id)
+    if taste is not None and taste.shape == query.shape:
+        query = query + taste_service.TASTE_WEIGHT * taste
+
+    excluded = await _suggested_recipe_ids(db, user_id)
+    # A few spare candidates in case a recipe was deleted since the index was
+    # built, or was suggested by another worker
+    candidates = [recipe_id for recipe_id, _score in matrix.top(query, count + 5, excluded)]
+    if not candidates:
+        return []
+
+    await _lock_user_suggestions(db, user_id)
+    count = min(request.count, goal.target_recipes_per_week - await _count_this_week(db, goal.id))
+    taken = set(await db.scalars(
+        select(RecipeSuggestion.recipe_id)
+        .where(RecipeSuggestion.user_id == user_id, RecipeSuggestion.recipe_id.in_(candidates))
+    ))
+    excluded.update(taken)
+
+    suggestions = []
+    for recipe_id in candidates:
+        if len(suggestions) >= count:
+            break
+        if recipe_id in taken:
+            continue
+        recipe = await recipe_service.get_recipe(db, recipe_id)
+        if recipe is not None:
+            suggestions.append(recipe)
+    if not suggestions:
+        await db.rollback()
+        return []
+
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    rows = await db.execute(
+        dialect_insert(RecipeSuggestion)
+        .on_conflict_do_nothing(index_elements=[RecipeSuggestion.goal_id, RecipeSuggestion.recipe_id])
+        .returning(
+            RecipeSuggestion.id, RecipeSuggestion.recipe_id, RecipeSuggestion.suggested_at, RecipeSuggestion.status
+        ),
+        [
+            {"user_id": user_id, "goal_id": goal.id, "recipe_id": recipe.id,
+             "status": "pending", "user_comment": request.user_comment}
+            for recipe in suggestions
+        ]
+    )
+    created = {row.recipe_id: row for row in rows}
+    await db.commit()
+    excluded.update(created)
+
+    return [
+        RecipeSuggestionResponse(
+            id=created[recipe.id].id,
+            user_id=user_id,
+            goal_id=goal.id,
+            recipe_id=recipe.id,
+            suggested_at=created[recipe.id].suggested_at,
+            status=created[recipe.id].status,
+            user_comment=request.user_comment,
+            recipe=recipe
+        )
+        for recipe in suggestions
+        if recipe.id in created
+    ]
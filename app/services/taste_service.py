@@ -0,0 +1,140 @@
+"""
+Taste service - per-user taste vectors for personalized reranking.
+
+Each user has one vector in recipe-embedding space: an exponential moving
+average of the embeddings of recipes they liked (+) or disliked (-). It is
+updated in O(1) per feedback row, in the same transaction as the feedback, from
+embeddings already held in memory (no API call). Ranking adds TASTE_WEIGHT
+times the dot product of a candidate's embedding with the normalized taste
+vector to its relevance score.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db_models import User, UserTasteVector
+
+# EMA factor: weight of the newest feedback in the taste vector
+TASTE_ALPHA = float(os.getenv("TASTE_ALPHA", "0.2"))
+# Weight of the taste score relative to query relevance when reranking
+TASTE_WEIGHT = float(os.getenv("TASTE_WEIGHT", "0.1"))
+
+
+def feedback_signal(row: Dict) -> float:
+    """+1 for a like, -1 for a dislike, else the rating mapped to [-1, 1] (0 = no signal)"""
+    if row.get("liked") is not None:
+        return 1.0 if row["liked"] else -1.0
+    if row.get("rating") is not None:
+        return (row["rating"] - 3) / 2
+    return 0.0
+
+
+def _normalized(vector: np.ndarray) -> Optional[np.ndarray]:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 1e-12 else None
+
+
+def _decode(row: UserTasteVector) -> np.ndarray:
+    return np.frombuffer(row.vector, dtype=np.float32).copy()
+
+
+async def update_taste_vectors(db: AsyncSession, rows: List[Dict], matrix) -> int:
+    """
+    Fold a batch of feedback rows into their users' taste vectors (no commit).
+
+    Args:
+        db: Database session (the feedback batch transaction)
+        rows: recipe_feedback column dicts, oldest first
+        matrix: RecipeMatrix with the recipe embeddings
+
+    Returns:
+        Number of users whose taste vector changed
+    """
+    updates = [
+        (row["user_id"], vector, signal)
+        for row in rows
+        if (signal := feedback_signal(row)) != 0 and (vector := matrix.vector(row["recipe_id"])) is not None
+    ]
+    if not updates:
+        return 0
+
+    user_ids = sorted({user_id for user_id, _, _ in updates})
+    if db.get_bind().dialect.name != "sqlite":
+        # Another worker's batch must not fold into the same old vector (its
+        # step would be overwritten). Locking the users, in id order, also
+        # covers a first vector that doesn't exist yet; FOR NO KEY UPDATE
+        # still lets feedback rows referencing them be inserted. SQLite
+        # already holds the write lock from the feedback INSERT.
+        await db.execute(select(User.id).where(User.id.in_(user_ids)).order_by(User.id).with_for_update(key_share=True))
+    existing = await db.scalars(select(UserTasteVector).where(UserTasteVector.user_id.in_(user_ids)))
+    tastes = {row.user_id: (_decode(row), row.feedback_count) for row in existing}
+    for user_id, vector, signal in updates:
+        taste, count = tastes.get(user_id, (None, 0))
+        if taste is None or taste.shape != vector.shape:
+            # First feedback, or the embedding model changed: start over
+            taste, count = np.zeros_like(vector), 0
+        tastes[user_id] = ((1 - TASTE_ALPHA) * taste + TASTE_ALPHA * signal * vector, count + 1)
+
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = dialect_insert(UserTasteVector).values([
+        {
+            "user_id": user_id,
+            "vector": taste.astype(np.float32).tobytes(),
+            "dimensions": taste.shape[0],
+            "feedback_count": count,
+        }
+        for user_id, (taste, count) in tastes.items()
+    ])
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[UserTasteVector.user_id],
+        set_={
+            "vector": statement.excluded.vector,
+            "dimensions": statement.excluded.dimensions,
+            "feedback_count": statement.excluded.feedback_count,
+            "updated_at": func.now(),
+        }
+    ))
+    return len(tastes)
+
+
+async def aload_taste_vector(db: AsyncSession, user_id: int) -> Optional[np.ndarray]:
+    """Normalized taste vector of a user, or None without usable feedback"""
+    row = await db.scalar(select(UserTasteVector).where(UserTasteVector.user_id == user_id))
+    return _normalized(_decode(row)) if row else None
+
+
+def load_taste_vector(db: Session, user_id: int) -> Optional[np.ndarray]:
+    """Sync variant of aload_taste_vector"""
+    row = db.scalar(select(UserTasteVector).where(UserTasteVector.user_id == user_id))
+    return _normalized(_decode(row)) if row else None
+
+
+def rerank(candidates: List, relevance: List[float], recipe_ids: List[Optional[int]], taste: Optional[np.ndarray], matrix, k: int) -> List:
+    """
+    Top k candidates by relevance + TASTE_WEIGHT * taste score.
+
+    Args:
+        candidates: Retrieved items (e.g. Documents), best first
+        relevance: Relevance score of each candidate (higher is better)
+        recipe_ids: Recipe of each candidate (None for non-recipe chunks)
+        taste: Normalized taste vector, or None (order is kept)
+        matrix: RecipeMatrix with the recipe embeddings
+        k: Number of results
+
+    Returns:
+        The k best candidates
+    """
+    if taste is None or matrix is None:
+        return candidates[:k]
+    scores = []
+    for score, recipe_id in zip(relevance, recipe_ids):
+        vector = matrix.vector(recipe_id) if recipe_id is not None else None
+        bonus = float(vector @ taste) if vector is not None and vector.shape == taste.shape else 0.0
+        scores.append(score + TASTE_WEIGHT * bonus)
+    order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+    return [candidates[i] for i in order[:k]]
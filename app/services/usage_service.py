@@ -0,0 +1,432 @@
+"""
+Usage service - OpenAI token and cost accounting per request and per user.
+
+Every OpenAI call goes through the shared HTTP client in app.openai_clients,
+which passes each response body here. The `usage` block the API reports
+(prompt, completion and embedding tokens) is added to the current usage
+scope, opened with track() by /ask, suggestions, ingestion jobs and index
+syncs. When a scope closes, its totals are queued and a background writer
+stores them in batches: one llm_usage row per scope plus an upsert of the
+user's daily rollup in user_token_usage.
+
+Budgets: a user may spend users.daily_token_budget tokens per UTC day, or
+USER_DAILY_TOKEN_BUDGET when that is NULL (0 = unlimited). check_budget()
+(acheck_budget() in async handlers) rejects new work with a 429 once today's rollup plus this worker's
+unflushed usage reaches the budget. Requests already running still finish,
+so a user can overshoot by what they have in flight.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics, tracing
+from app.database import SessionLocal
+from app.db_models import LlmUsage, User, UserTokenUsage
+from app.models import TokenUsageDay, UserTokenUsageResponse
+from app.services import cache
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+USER_DAILY_TOKEN_BUDGET = int(os.getenv("USER_DAILY_TOKEN_BUDGET", "0"))
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "2"))
+# Scopes kept for retry while the database is unavailable
+MAX_QUEUED_USAGE = 10000
+
+# USD per 1M tokens (input, output); update when OpenAI's prices change
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+# Today's (tokens used, budget) per user, as stored in the database
+budgets = TTLCache("token_budgets", maxsize=10000, ttl=5)
+
+_MODEL = re.compile(rb'"model"\s*:\s*"([^"]+)"')
+
+
+def price(model: str) -> Tuple[float, float]:
+    """(input, output) USD per 1M tokens; dated variants match their base model"""
+    for name in sorted(PRICES_PER_MILLION, key=len, reverse=True):
+        if model.startswith(name):
+            return PRICES_PER_MILLION[name]
+    return 0.0, 0.0
+
+
+class RequestUsage:
+    """Token totals of one request or background job"""
+
+    def __init__(self, source: str, user_id: Optional[int] = None, trace_id: Optional[str] = None):
+        self.source = source
+        self.user_id = user_id
+        self.trace_id = trace_id
+        self.day = datetime.now(timezone.utc).date()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.embedding_tokens = 0
+        self.cost_usd = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens + self.embedding_tokens
+
+    def add(self, kind: str, model: str, prompt_tokens: int, completion_tokens: int = 0) -> None:
+        input_price, output_price = price(model)
+        with self._lock:
+            self.calls += 1
+            if kind == "embedding":
+                self.embedding_tokens += prompt_tokens
+            else:
+                self.prompt_tokens += prompt_tokens
+                self.completion_tokens += completion_tokens
+            self.cost_usd += (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "embedding_tokens": self.embedding_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+_current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("current_usage", default=None)
+
+
+def parse_usage(body: bytes) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    (model, usage) of an OpenAI JSON response. Only the ends of the body are
+    scanned: `usage` comes last, and embedding responses can be megabytes.
+    """
+    start = body.rfind(b'"usage"')
+    if start < 0:
+        return None, None
+    brace = body.find(b"{", start)
+    if brace < 0:
+        return None, None
+    usage, _ = json.JSONDecoder().raw_decode(body[brace:].decode("utf-8", "replace"))
+    match = _MODEL.search(body[:2048]) or _MODEL.search(body[-2048:])
+    return (match.group(1).decode() if match else "unknown"), usage
+
+
+def record_response(path: str, body: bytes) -> None:
+    """Count the tokens of one OpenAI response"""
+    try:
+        model, usage = parse_usage(body)
+    except ValueError as e:
+        logger.debug(f"Unreadable usage in OpenAI response: {e}")
+        return
+    if not usage:
+        return
+    kind = "embedding" if path.endswith("/embeddings") else "chat"
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+
+    input_price, output_price = price(model)
+    metrics.LLM_TOKENS.labels(model, "embedding" if kind == "embedding" else "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        metrics.LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+    metrics.LLM_COST.labels(model).inc((prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000)
+
+    usage_scope = _current_usage.get()
+    if usage_scope is not None:
+        usage_scope.add(kind, model, prompt_tokens, completion_tokens)
+
+
+@contextmanager
+def track(source: str, user_id: Optional[int] = None):
+    """
+    Attribute the OpenAI calls made inside the block (in this context, or
+    threadpool calls made from it) to one request or job, and store the
+    totals when the block ends.
+    """
+    usage = RequestUsage(source, user_id, tracing.current_trace_id())
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        if usage.calls:
+            recorder.record(usage)
+
+
+def _upsert_rollups(dialect_name: str, batch: List[RequestUsage]):
+    """INSERT ... ON CONFLICT (user_id, day) DO UPDATE adding the batch's totals"""
+    rollups: Dict[Tuple[int, date], Dict] = {}
+    for usage in batch:
+        if usage.user_id is None:
+            continue
+        row = rollups.setdefault((usage.user_id, usage.day), {
+            "user_id": usage.user_id, "day": usage.day, "requests": 0, "prompt_tokens": 0,
+            "completion_tokens": 0, "embedding_tokens": 0, "cost_usd": 0.0,
+        })
+        row["requests"] += 1
+        row["prompt_tokens"] += usage.prompt_tokens
+        row["completion_tokens"] += usage.completion_tokens
+        row["embedding_tokens"] += usage.embedding_tokens
+        row["cost_usd"] += usage.cost_usd
+    if not rollups:
+        return None
+
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(UserTokenUsage).values(list(rollups.values()))
+    new = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[UserTokenUsage.user_id, UserTokenUsage.day],
+        set_={
+            "requests": UserTokenUsage.requests + new.requests,
+            "prompt_tokens": UserTokenUsage.prompt_tokens + new.prompt_tokens,
+            "completion_tokens": UserTokenUsage.completion_tokens + new.completion_tokens,
+            "embedding_tokens": UserTokenUsage.embedding_tokens + new.embedding_tokens,
+            "cost_usd": UserTokenUsage.cost_usd + new.cost_usd,
+        }
+    )
+
+
+def write_usage_batch(batch: List[RequestUsage]) -> None:
+    """Insert one llm_usage row per scope and update the daily rollups, in one transaction"""
+    with SessionLocal() as db:
+        db.execute(insert(LlmUsage), [
+            {
+                "trace_id": usage.trace_id, "user_id": usage.user_id, "source": usage.source,
+                "calls": usage.calls, "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens, "embedding_tokens": usage.embedding_tokens,
+                "cost_usd": usage.cost_usd,
+            }
+            for usage in batch
+        ])
+        statement = _upsert_rollups(db.get_bind().dialect.name, batch)
+        if statement is not None:
+            db.execute(statement)
+        db.commit()
+
+
+class UsageRecorder:
+    """
+    Stores finished usage scopes in batches from a background thread.
+    Until start() (scripts, tests) each scope is written right away.
+    """
+
+    def __init__(self, interval: float = USAGE_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._queue: List[RequestUsage] = []
+        self._pending_tokens: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer and store what is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        self.flush()
+
+    def record(self, usage: RequestUsage) -> None:
+        if self._thread is None:
+            try:
+                write_usage_batch([usage])
+            except Exception as e:
+                logger.error(f"Could not store token usage of {usage.source}: {e}")
+            return
+        with self._lock:
+            self._queue.append(usage)
+            del self._queue[:-MAX_QUEUED_USAGE]
+            if usage.user_id is not None:
+                self._pending_tokens[usage.user_id] = self._pending_tokens.get(usage.user_id, 0) + usage.total_tokens
+
+    def pending_tokens(self, user_id: int) -> int:
+        """Tokens of this user recorded here but not stored yet"""
+        return self._pending_tokens.get(user_id, 0)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._queue = self._queue, []
+        if not batch:
+            return
+        try:
+            write_usage_batch(batch)
+        except Exception as e:
+            logger.error(f"Token usage batch of {len(batch)} failed, will retry: {e}")
+            with self._lock:
+                self._queue[:0] = batch
+            return
+        user_ids = {usage.user_id for usage in batch if usage.user_id is not None}
+        # Drop cached totals first, so a budget check never misses both copies
+        for user_id in user_ids:
+            budgets.invalidate(user_id)
+        with self._lock:
+            for usage in batch:
+                if usage.user_id is not None:
+                    left = self._pending_tokens.get(usage.user_id, 0) - usage.total_tokens
+                    if left > 0:
+                        self._pending_tokens[usage.user_id] = left
+                    else:
+                        self._pending_tokens.pop(usage.user_id, None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+recorder = UsageRecorder()
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _usage_queries(user_id: int, today: date):
+    """Queries for a user's budget column and tokens stored for today"""
+    budget = select(User.daily_token_budget).where(User.id == user_id)
+    used = select(
+        UserTokenUsage.prompt_tokens + UserTokenUsage.completion_tokens + UserTokenUsage.embedding_tokens
+    ).where(UserTokenUsage.user_id == user_id, UserTokenUsage.day == today)
+    return budget, used
+
+
+def _store_usage_state(user_id: int, used: Optional[int], budget: Optional[int], today: date) -> Tuple[int, int]:
+    state = (used or 0, budget if budget is not None else USER_DAILY_TOKEN_BUDGET, today)
+    budgets.set(user_id, state)
+    return state[0], state[1]
+
+
+def _cached_usage_today(user_id: int, today: date) -> Optional[Tuple[int, int]]:
+    state = budgets.get(user_id)
+    if state is None or state[2] != today:
+        return None
+    return state[0], state[1]
+
+
+def _stored_usage_today(user_id: int) -> Tuple[int, int]:
+    """(tokens stored for today, effective budget), cached for a few seconds"""
+    today = _today()
+    state = _cached_usage_today(user_id, today)
+    if state is None:
+        budget_query, used_query = _usage_queries(user_id, today)
+        with SessionLocal() as db:
+            state = _store_usage_state(user_id, db.scalar(used_query), db.scalar(budget_query), today)
+    return state
+
+
+async def _astored_usage_today(db: AsyncSession, user_id: int) -> Tuple[int, int]:
+    """Async version of _stored_usage_today, on the request's session"""
+    today = _today()
+    state = _cached_usage_today(user_id, today)
+    if state is None:
+        budget_query, used_query = _usage_queries(user_id, today)
+        state = _store_usage_state(user_id, await db.scalar(used_query), await db.scalar(budget_query), today)
+    return state
+
+
+def _enforce_budget(user_id: int, used: int, budget: int) -> None:
+    used += recorder.pending_tokens(user_id)
+    if budget and used >= budget:
+        now = datetime.now(timezone.utc)
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Daily token budget used up ({used}/{budget} tokens)",
+            headers={"Retry-After": str(max(1, int((tomorrow - now).total_seconds())))}
+        )
+
+
+def check_budget(user_id: Optional[int]) -> None:
+    """
+    Reject work for a user whose token budget for today is spent.
+    Blocking (sync session): call it from sync handlers or the threadpool.
+
+    Args:
+        user_id: The user the work is for (None: not attributed, never limited)
+
+    Raises:
+        HTTPException: 429 with Retry-After (seconds until the UTC day ends)
+    """
+    if not user_id:
+        return
+    _enforce_budget(user_id, *_stored_usage_today(user_id))
+
+
+async def acheck_budget(db: AsyncSession, user_id: Optional[int]) -> None:
+    """Async version of check_budget for async handlers, on their session"""
+    if not user_id:
+        return
+    _enforce_budget(user_id, *await _astored_usage_today(db, user_id))
+
+
+async def get_user_usage(db: AsyncSession, user_id: int, days: int = 7) -> Optional[UserTokenUsageResponse]:
+    """
+    A user's daily usage over the last days (newest first) and today's budget.
+
+    Returns:
+        UserTokenUsageResponse, or None if the user doesn't exist
+    """
+    user_budget = await db.execute(select(User.daily_token_budget).where(User.id == user_id))
+    row = user_budget.first()
+    if row is None:
+        return None
+    budget = row[0] if row[0] is not None else USER_DAILY_TOKEN_BUDGET
+
+    today = _today()
+    rows = (await db.scalars(
+        select(UserTokenUsage)
+        .where(UserTokenUsage.user_id == user_id, UserTokenUsage.day > today - timedelta(days=days))
+        .order_by(UserTokenUsage.day.desc())
+    )).all()
+    used_today = recorder.pending_tokens(user_id) + sum(
+        r.prompt_tokens + r.completion_tokens + r.embedding_tokens for r in rows if r.day == today
+    )
+    return UserTokenUsageResponse(
+        user_id=user_id,
+        daily_token_budget=budget or None,
+        used_today=used_today,
+        remaining_today=max(budget - used_today, 0) if budget else None,
+        days=[TokenUsageDay.model_validate(r) for r in rows],
+    )
+
+
+async def set_user_budget(db: AsyncSession, user_id: int, daily_token_budget: Optional[int]) -> Optional[User]:
+    """
+    Set (or, with None, reset to the default) a user's daily token budget.
+
+    Returns:
+        Updated User, or None if the user doesn't exist
+    """
+    if getattr(db.get_bind().dialect, "update_returning", False):
+        user = await db.scalar(
+            update(User).where(User.id == user_id).values(daily_token_budget=daily_token_budget).returning(User)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+    else:
+        user = await db.get(User, user_id)
+        if user is not None:
+            user.daily_token_budget = daily_token_budget
+            await db.flush()
+    if user is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    budgets.invalidate(user_id)
+    await cache.ainvalidate("users", [user_id])
+    return user
@@ -2,12 +2,15 @@
 User service - handles user creation and retrieval.
 For MVP, we'll use a simple single-user approach or create users on-demand.
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_models import User
+from app.models import UserResponse
+from app.services import cache
 from typing import Optional
 
 
-def get_or_create_user(db: Session, user_id: Optional[int] = None) -> User:
+async def get_or_create_user(db: AsyncSession, user_id: Optional[int] = None) -> User:
     """
     Get existing user or create a new one.
     For MVP, we'll use a simple approach: get first user or create one.
@@ -21,22 +24,29 @@ def get_or_create_user(db: Session, user_id: Optional[int] = None) -> User:
         User object
     """
     if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if user:
             return user
     
     # For MVP: get first user or create one
-    user = db.query(User).first()
+    user = await db.scalar(select(User).limit(1))
     if not user:
         user = User(preferences_json={})
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
     return user
 
 
-def get_user(db: Session, user_id: int) -> Optional[User]:
-    """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
-
+async def get_user(db: AsyncSession, user_id: int) -> Optional[UserResponse]:
+    """Get user by ID (read-through cached snapshot)"""
+    user = cache.users.get(user_id) if cache.can_read(db) else None
+    if user is None:
+        row = await db.scalar(select(User).where(User.id == user_id))
+        if row is None:
+            return None
+        user = UserResponse.model_validate(row)
+        if cache.can_fill(db):
+            cache.users.set(user_id, user)
+    return user
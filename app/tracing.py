@@ -0,0 +1,309 @@
+"""
+Lightweight request tracing.
+
+Every HTTP request gets a trace (the root, timing the whole request) holding
+one span per processing stage (embedding, search, prompt, llm, the endpoint
+handler...) and one span per SQL statement, hooked in through SQLAlchemy
+engine events. The current trace lives in a contextvar, so it follows the
+request into the threadpool and into async SQLAlchemy calls without being
+passed around.
+
+Each response carries:
+
+    X-Trace-Id      trace ID (taken from an incoming traceparent / X-Trace-Id header if present)
+    traceparent     W3C trace context, for callers that propagate it
+    Server-Timing   time per span name, e.g. db;dur=3.1;desc="4 statements", handler;dur=5.2
+
+Finished traces are kept in an in-process collector (the last
+TRACE_BUFFER_SIZE, served by GET /api/traces with the profiling token) and, with TRACE_FILE set, also
+appended to that file as JSON lines by a background thread.
+"""
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from app import profiling
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+MAX_SPANS_PER_TRACE = 1000
+MAX_STATEMENT_LENGTH = 200
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float  # Unix time, seconds
+    duration_ms: float = 0.0
+    attributes: Dict = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    name: str
+    start: float
+    duration_ms: float = 0.0
+    status: Optional[int] = None
+    spans: List[Span] = field(default_factory=list)
+    dropped_spans: int = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    def summary(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "spans": len(self.spans),
+        }
+
+    def to_dict(self) -> Dict:
+        return {**self.summary(), "dropped_spans": self.dropped_spans, "spans": [asdict(s) for s in self.spans]}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("current_span_id", default=None)
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID of the request being handled, or None outside a request"""
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current span (no-op outside a traced request)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, trace.trace_id, _new_span_id(), _current_span_id.get(), time.time(), attributes=attributes)
+    token = _current_span_id.set(current.span_id)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        _current_span_id.reset(token)
+        trace.add(current)
+
+
+# ----------------------------------------------------------------------------
+# SQL statement spans
+# ----------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is not None:
+        context._trace_span = (trace, time.time(), time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_trace_span", None)
+    if started is None:
+        return
+    trace, start, perf_start = started
+    trace.add(Span(
+        "db", trace.trace_id, _new_span_id(), _current_span_id.get(), start,
+        duration_ms=(time.perf_counter() - perf_start) * 1000,
+        attributes={"statement": " ".join(statement.split())[:MAX_STATEMENT_LENGTH], "executemany": executemany},
+    ))
+
+
+def instrument_engine(engine) -> None:
+    """Record a "db" span for every SQL statement of a (sync) engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ----------------------------------------------------------------------------
+# Endpoint spans
+# ----------------------------------------------------------------------------
+
+def _traced_endpoint(endpoint):
+    """Wrap an endpoint in a "handler" span, keeping its signature for FastAPI"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def traced(*args, **kwargs):
+            with span("handler"):
+                return await endpoint(*args, **kwargs)
+    else:
+        # Sync endpoints run in a threadpool thread, which the request's
+        # profiler (if any) doesn't see from the event loop
+        @functools.wraps(endpoint)
+        def traced(*args, **kwargs):
+            with span("handler"), profiling.profile_thread():
+                return endpoint(*args, **kwargs)
+    return traced
+
+
+class TracedRoute(APIRoute):
+    """
+    APIRoute whose endpoint runs inside a "handler" span. The rest of the
+    request time (validation, dependencies, response serialization) is the
+    difference between "total" and "handler" in Server-Timing.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _traced_endpoint(endpoint), **kwargs)
+
+
+# ----------------------------------------------------------------------------
+# Exporters
+# ----------------------------------------------------------------------------
+
+class MemoryCollector:
+    """The most recent finished traces, kept in process"""
+
+    def __init__(self, maxlen: int = TRACE_BUFFER_SIZE):
+        self._traces: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.append(trace)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return next((t for t in self._traces if t.trace_id == trace_id), None)
+
+    def recent(self, min_duration_ms: float = 0, limit: int = 50) -> List[Trace]:
+        """Newest first, optionally only traces slower than min_duration_ms"""
+        with self._lock:
+            traces = [t for t in reversed(self._traces) if t.duration_ms >= min_duration_ms]
+        return traces[:limit]
+
+
+class FileExporter:
+    """Appends finished traces to a JSON lines file from a background thread"""
+
+    def __init__(self, path: str):
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.SimpleQueue()
+        self._logger = logging.getLogger("veganai.traces")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def export(self, trace: Trace) -> None:
+        self._logger.info(json.dumps(trace.to_dict(), default=str))
+
+
+collector = MemoryCollector()
+_exporters = [collector] + ([FileExporter(TRACE_FILE)] if TRACING_ENABLED and TRACE_FILE else [])
+
+
+# ----------------------------------------------------------------------------
+# Middleware
+# ----------------------------------------------------------------------------
+
+def _incoming_trace_id(headers: Dict[str, str]) -> str:
+    """Trace ID of the caller as 32 hex digits, so it fits the traceparent header"""
+    match = _TRACEPARENT.match(headers.get("traceparent", ""))
+    if match and int(match.group(1), 16):
+        return match.group(1)
+    trace_id = headers.get("x-trace-id", "")
+    if re.fullmatch(r"[0-9a-fA-F]{16,32}", trace_id) and int(trace_id, 16):
+        # 64-bit IDs (e.g. Jaeger) are left-padded, as W3C trace context does
+        return trace_id.lower().rjust(32, "0")
+    return uuid.uuid4().hex
+
+
+def server_timing(trace: Trace, total_ms: float) -> str:
+    """Server-Timing header value: total time per span name, then the request total"""
+    totals: Dict[str, List[float]] = {}
+    for s in trace.spans:
+        totals.setdefault(s.name, []).append(s.duration_ms)
+    entries = []
+    for name, durations in totals.items():
+        entry = f"{name};dur={sum(durations):.1f}"
+        if len(durations) > 1:
+            entry += f';desc="{len(durations)} {"statements" if name == "db" else "spans"}"'
+        entries.append(entry)
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a trace per HTTP request and adding trace headers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        trace = Trace(_incoming_trace_id(headers), f"{scope['method']} {scope['path']}", time.time())
+        root_span_id = _new_span_id()
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span_id.set(root_span_id)
+        start = time.perf_counter()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-trace-id", trace.trace_id.encode()),
+                    (b"traceparent", f"00-{trace.trace_id}-{root_span_id}-01".encode()),
+                    (b"server-timing", server_timing(trace, total_ms).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            trace.duration_ms = (time.perf_counter() - start) * 1000
+            # Name the trace after the route template once routing is done
+            route = scope.get("route")
+            if route is not None:
+                trace.name = f"{scope['method']} {route.path}"
+            _current_span_id.reset(span_token)
+            _current_trace.reset(trace_token)
+            for exporter in _exporters:
+                exporter.export(trace)
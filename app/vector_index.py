@@ -0,0 +1,602 @@
+"""
+Vector index generations and the live handle used by the API.
+
+Every ingestion builds a brand-new Chroma directory under
+``chroma_db/generations/<name>`` and only then flips ``chroma_db/CURRENT`` to
+point at it. Readers keep using the previous generation until the flip, so a
+query never sees a half-built index and never waits on an ingestion write.
+
+Readers don't need Chroma at all: every write also exports a read-only
+snapshot of the generation (``snapshots/<id>/``: normalized chunk and recipe
+vectors as .npy files plus the chunk texts), published through the
+generation's ``SNAPSHOT`` pointer. API workers memory-map it, so with several
+worker processes the vectors are held once in the OS page cache instead of
+once per worker. Incremental writes don't re-export it: they publish a small
+cumulative delta next to it (``snapshots/<id>/delta-<n>/``) until the delta is
+large enough to compact into a new full snapshot. Writes (full rebuilds, outbox syncs) hold an exclusive file
+lock, so only one process on the host writes at a time.
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHROMA_ROOT = os.getenv("CHROMA_DIR", os.path.normpath(os.path.join(BASE_DIR, "../chroma_db")))
+GENERATIONS_DIR = os.path.join(CHROMA_ROOT, "generations")
+CURRENT_POINTER = os.path.join(CHROMA_ROOT, "CURRENT")
+
+# How many generations to keep on disk (the active one included)
+KEEP_GENERATIONS = int(os.getenv("CHROMA_KEEP_GENERATIONS", "2"))
+# Snapshots kept per generation; a worker may still have the previous one mapped
+KEEP_SNAPSHOTS = 2
+
+WRITER_LOCK = os.path.join(CHROMA_ROOT, "writer.lock")
+# How long a rebuild waits for another process's write to finish
+WRITER_LOCK_TIMEOUT_SECONDS = float(os.getenv("INDEX_WRITER_LOCK_TIMEOUT_SECONDS", "30"))
+
+
+class IndexWriterBusy(RuntimeError):
+    """Another process is writing the index"""
+
+
+class FileLock:
+    """
+    Exclusive lock shared by every process on the host (fcntl.flock).
+    The OS drops it when the holder exits, even on a crash.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take the lock, waiting up to timeout seconds (None: forever). False if not taken."""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lock_file = open(self.path, "a")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._file = lock_file
+                return True
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(0.1)
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+@contextmanager
+def writer_lock(timeout: Optional[float] = WRITER_LOCK_TIMEOUT_SECONDS):
+    """
+    Hold the index writer lock for a block of writes.
+
+    Raises:
+        IndexWriterBusy: If another process holds it for longer than timeout seconds
+    """
+    lock = FileLock(WRITER_LOCK)
+    if not lock.acquire(timeout):
+        raise IndexWriterBusy("Another process is writing the vector index")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def writer_busy() -> bool:
+    """True while any process (this one included) holds the writer lock"""
+    lock = FileLock(WRITER_LOCK)
+    if not lock.acquire(timeout=0):
+        return True
+    lock.release()
+    return False
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _read_pointer(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(path: str, value: str) -> None:
+    """os.replace is atomic on POSIX, so readers see either the old or the new value"""
+    tmp_pointer = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, path)
+
+
+def current_generation() -> Optional[str]:
+    """Name of the active generation, or None for the legacy flat layout"""
+    return _read_pointer(CURRENT_POINTER)
+
+
+def generation_path(name: Optional[str]) -> str:
+    """Directory of a generation (the legacy ``chroma_db/`` when name is None)"""
+    if name is None:
+        return CHROMA_ROOT
+    return os.path.join(GENERATIONS_DIR, name)
+
+
+def new_generation() -> str:
+    """Reserve a fresh, empty generation directory and return its name"""
+    name = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    os.makedirs(generation_path(name))
+    return name
+
+
+def activate_generation(name: str) -> None:
+    """Atomically point CURRENT at a fully built generation"""
+    _write_pointer(CURRENT_POINTER, name)
+
+
+def prune_generations(keep: int = KEEP_GENERATIONS) -> None:
+    """Delete old generations, never touching the active one"""
+    if not os.path.isdir(GENERATIONS_DIR):
+        return
+    active = current_generation()
+    # Names start with a timestamp, so reverse order is newest first
+    others = [n for n in sorted(os.listdir(GENERATIONS_DIR), reverse=True) if n != active]
+    for name in others[max(keep - 1, 0):]:
+        shutil.rmtree(generation_path(name), ignore_errors=True)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place and return the array"""
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    return vectors
+
+
+def average_recipe_vectors(embeddings, metadatas) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One normalized vector per recipe: the mean of its chunk embeddings.
+    Chunks without a recipe_id (plain text sources) are skipped.
+
+    Returns:
+        (recipe IDs, vectors), row-aligned
+    """
+    sums: Dict[int, np.ndarray] = {}
+    counts: Dict[int, int] = {}
+    for embedding, metadata in zip(embeddings, metadatas):
+        recipe_id = (metadata or {}).get("recipe_id")
+        if recipe_id is None or recipe_id < 0:
+            continue
+        sums[recipe_id] = sums.get(recipe_id, 0) + np.asarray(embedding, dtype=np.float32)
+        counts[recipe_id] = counts.get(recipe_id, 0) + 1
+    if not sums:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    recipe_ids = np.fromiter(sums, dtype=np.int64)
+    vectors = np.stack([sums[rid] / counts[rid] for rid in sums])
+    return recipe_ids, normalize_rows(vectors)
+
+
+# ----------------------------------------------------------------------------
+# Read-only snapshots
+# ----------------------------------------------------------------------------
+
+def snapshot_pointer(generation: Optional[str]) -> str:
+    return os.path.join(generation_path(generation), "SNAPSHOT")
+
+
+def snapshots_dir(generation: Optional[str]) -> str:
+    return os.path.join(generation_path(generation), "snapshots")
+
+
+def _new_dir_atomically(target: str, write) -> None:
+    """Fill target through a temporary directory and rename it into place"""
+    tmp = f"{target}.tmp"
+    os.makedirs(tmp)
+    try:
+        write(tmp)
+        os.rename(tmp, target)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _save_documents(path: str, documents, metadatas) -> None:
+    with open(os.path.join(path, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump([
+            {"page_content": text, "metadata": metadata or {}}
+            for text, metadata in zip(documents, metadatas)
+        ], f, ensure_ascii=False)
+
+
+def _chunk_recipe_ids(metadatas) -> np.ndarray:
+    """recipe_id of each chunk (-1 for chunks of plain text sources)"""
+    return np.fromiter(
+        ((metadata or {}).get("recipe_id", -1) for metadata in metadatas), dtype=np.int64, count=len(metadatas)
+    )
+
+
+def export_snapshot(generation: Optional[str], store: "Chroma") -> str:
+    """
+    Write a full read-only snapshot of a generation's store and publish it.
+    Reads the whole store: use it after a rebuild, and let incremental writes
+    publish a delta instead (export_delta).
+    Call it while holding the writer lock.
+
+    Returns:
+        The snapshot ID
+    """
+    data = store.get(include=["embeddings", "documents", "metadatas"])
+    count = len(data["ids"])
+    if count:
+        raw = np.asarray(data["embeddings"], dtype=np.float32).reshape(count, -1)
+        recipe_ids, recipe_vectors = average_recipe_vectors(raw, data["metadatas"])
+        chunk_vectors = normalize_rows(raw.copy())
+    else:
+        recipe_ids, recipe_vectors = np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        chunk_vectors = np.empty((0, 0), dtype=np.float32)
+
+    def write(path):
+        np.save(os.path.join(path, "chunk_vectors.npy"), chunk_vectors)
+        np.save(os.path.join(path, "chunk_recipe_ids.npy"), _chunk_recipe_ids(data["metadatas"]))
+        np.save(os.path.join(path, "recipe_ids.npy"), recipe_ids)
+        np.save(os.path.join(path, "recipe_vectors.npy"), recipe_vectors)
+        _save_documents(path, data["documents"], data["metadatas"])
+
+    snapshot_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    _new_dir_atomically(os.path.join(snapshots_dir(generation), snapshot_id), write)
+    _write_pointer(snapshot_pointer(generation), snapshot_id)
+
+    # Newest first by name (timestamped); keep the one just published
+    for name in sorted(os.listdir(snapshots_dir(generation)), reverse=True)[KEEP_SNAPSHOTS:]:
+        shutil.rmtree(os.path.join(snapshots_dir(generation), name), ignore_errors=True)
+    return snapshot_id
+
+
+def export_delta(generation: Optional[str], store: "Chroma", recipe_ids, chunk_ids: List[str]) -> str:
+    """
+    Publish an incremental write (outbox sync) without re-reading the store.
+
+    The published snapshot keeps its base files and gets a cumulative delta
+    (``delta-<n>/``): every recipe changed since the base is tombstoned there
+    and its current chunks are stored next to it, so each write costs the
+    size of the delta, not of the index. Once the delta outgrows
+    SNAPSHOT_DELTA_RATIO of the base, a full snapshot is exported instead.
+    Call it while holding the writer lock.
+
+    Args:
+        generation: Generation the store belongs to
+        store: Its Chroma store, already updated
+        recipe_ids: Every recipe the write touched (upserted or deleted)
+        chunk_ids: IDs of the chunks the write added
+
+    Returns:
+        The published pointer value ("<snapshot>/<delta>")
+    """
+    base_id, _, delta_name = (_read_pointer(snapshot_pointer(generation)) or "").partition("/")
+    base_path = os.path.join(snapshots_dir(generation), base_id) if base_id else None
+    if base_path is None or not os.path.exists(os.path.join(base_path, "chunk_recipe_ids.npy")):
+        return export_snapshot(generation, store)  # No snapshot yet, or one without tombstone support
+
+    touched = np.asarray(sorted(set(int(r) for r in recipe_ids)), dtype=np.int64)
+    previous = SnapshotDelta.load(os.path.join(base_path, delta_name)) if delta_name else SnapshotDelta.empty()
+    delta = previous.without_recipes(touched)
+    if chunk_ids:
+        data = store.get(ids=list(chunk_ids), include=["embeddings", "documents", "metadatas"])
+        delta = delta.with_chunks(data["embeddings"], data["documents"], data["metadatas"])
+    delta.removed_recipe_ids = np.union1d(previous.removed_recipe_ids, touched)
+
+    base_chunks = len(np.load(os.path.join(base_path, "chunk_recipe_ids.npy"), mmap_mode="r"))
+    if len(delta.documents) > max(SNAPSHOT_DELTA_MIN_CHUNKS, SNAPSHOT_DELTA_RATIO * base_chunks):
+        return export_snapshot(generation, store)
+
+    number = int(delta_name.rpartition("-")[2]) + 1 if delta_name else 1
+    name = f"delta-{number:06d}"
+    _new_dir_atomically(os.path.join(base_path, name), delta.save)
+    pointer = f"{base_id}/{name}"
+    _write_pointer(snapshot_pointer(generation), pointer)
+
+    # A worker may still be switching from the previous delta
+    deltas = sorted(n for n in os.listdir(base_path) if n.startswith("delta-") and not n.endswith(".tmp"))
+    for old in deltas[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(base_path, old), ignore_errors=True)
+    return pointer
+
+
+# Compact into a full snapshot once the delta holds this share of the base's
+# chunks (but never for fewer than SNAPSHOT_DELTA_MIN_CHUNKS)
+SNAPSHOT_DELTA_RATIO = float(os.getenv("SNAPSHOT_DELTA_RATIO", "0.1"))
+SNAPSHOT_DELTA_MIN_CHUNKS = 256
+
+
+class SnapshotDelta:
+    """Changes since a snapshot's base: tombstoned recipes and their current chunks"""
+
+    def __init__(self, removed_recipe_ids, chunk_vectors, documents: List[Dict], recipe_ids, recipe_vectors):
+        self.removed_recipe_ids = removed_recipe_ids
+        self.chunk_vectors = chunk_vectors
+        self.documents = documents
+        self.recipe_ids = recipe_ids
+        self.recipe_vectors = recipe_vectors
+
+    @classmethod
+    def empty(cls) -> "SnapshotDelta":
+        return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), [],
+                   np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+
+    @classmethod
+    def load(cls, path: str) -> "SnapshotDelta":
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+            documents = json.load(f)
+        return cls(
+            np.load(os.path.join(path, "removed_recipe_ids.npy")),
+            np.load(os.path.join(path, "chunk_vectors.npy")),
+            documents,
+            np.load(os.path.join(path, "recipe_ids.npy")),
+            np.load(os.path.join(path, "recipe_vectors.npy")),
+        )
+
+    def save(self, path: str) -> None:
+        np.save(os.path.join(path, "removed_recipe_ids.npy"), self.removed_recipe_ids)
+        np.save(os.path.join(path, "chunk_vectors.npy"), self.chunk_vectors)
+        np.save(os.path.join(path, "recipe_ids.npy"), self.recipe_ids)
+        np.save(os.path.join(path, "recipe_vectors.npy"), self.recipe_vectors)
+        with open(os.path.join(path, "documents.json"), "w", encoding="utf-8") as f:
+            json.dump(self.documents, f, ensure_ascii=False)
+
+    def without_recipes(self, recipe_ids: np.ndarray) -> "SnapshotDelta":
+        """This delta minus the chunks and vectors of the given recipes"""
+        chunk_ids = _chunk_recipe_ids([d["metadata"] for d in self.documents])
+        keep_chunks = np.flatnonzero(~np.isin(chunk_ids, recipe_ids))
+        keep_recipes = ~np.isin(self.recipe_ids, recipe_ids)
+        return SnapshotDelta(
+            self.removed_recipe_ids,
+            self.chunk_vectors[keep_chunks] if len(self.documents) else self.chunk_vectors,
+            [self.documents[i] for i in keep_chunks],
+            self.recipe_ids[keep_recipes],
+            self.recipe_vectors[keep_recipes] if len(self.recipe_ids) else self.recipe_vectors,
+        )
+
+    def with_chunks(self, embeddings, documents, metadatas) -> "SnapshotDelta":
+        """This delta plus new chunks (and the recipe vectors they make up)"""
+        if not len(documents):
+            return self
+        raw = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+        recipe_ids, recipe_vectors = average_recipe_vectors(raw, metadatas)
+        return SnapshotDelta(
+            self.removed_recipe_ids,
+            _stack(self.chunk_vectors, normalize_rows(raw.copy())),
+            self.documents + [{"page_content": t, "metadata": m or {}} for t, m in zip(documents, metadatas)],
+            np.concatenate([self.recipe_ids, recipe_ids]),
+            _stack(self.recipe_vectors, recipe_vectors),
+        )
+
+
+def _stack(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-concatenate two 2-D arrays where either may be empty"""
+    if not len(a):
+        return b
+    if not len(b):
+        return a
+    return np.vstack([a, b])
+
+
+def _open_array(path: str) -> np.ndarray:
+    """Memory-map a .npy file read-only (empty arrays can't be mapped)"""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+
+class IndexSnapshot:
+    """
+    Read-only view of one snapshot, optionally with its delta. The base
+    vectors are memory-mapped, so every worker process reading the same
+    snapshot shares one copy in the page cache; a new delta reuses the base
+    already opened (pass it as base). Searches answer like the Chroma calls
+    /ask uses.
+    """
+
+    def __init__(self, path: str, delta_path: Optional[str] = None, base: Optional["IndexSnapshot"] = None):
+        self.path = path
+        if base is not None and base.path == path:
+            self._base_vectors, self._base_documents = base._base_vectors, base._base_documents
+            self._base_chunk_recipe_ids = base._base_chunk_recipe_ids
+            self._base_recipe_ids, self._base_recipe_vectors = base._base_recipe_ids, base._base_recipe_vectors
+        else:
+            self._base_vectors = _open_array(os.path.join(path, "chunk_vectors.npy"))
+            self._base_recipe_ids = _open_array(os.path.join(path, "recipe_ids.npy"))
+            self._base_recipe_vectors = _open_array(os.path.join(path, "recipe_vectors.npy"))
+            with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+                self._base_documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.load(f)]
+            ids_path = os.path.join(path, "chunk_recipe_ids.npy")
+            self._base_chunk_recipe_ids = _open_array(ids_path) if os.path.exists(ids_path) else None
+
+        self.documents = self._base_documents
+        self.recipe_ids, self.recipe_vectors = self._base_recipe_ids, self._base_recipe_vectors
+        self._hidden = None
+        self._delta_vectors = None
+        if delta_path is not None:
+            delta = SnapshotDelta.load(delta_path)
+            self._hidden = np.flatnonzero(np.isin(self._base_chunk_recipe_ids, delta.removed_recipe_ids))
+            self._delta_vectors = delta.chunk_vectors
+            self.documents = self._base_documents + [
+                Document(page_content=d["page_content"], metadata=d["metadata"]) for d in delta.documents
+            ]
+            keep = ~np.isin(self._base_recipe_ids, delta.removed_recipe_ids)
+            self.recipe_ids = np.concatenate([self._base_recipe_ids[keep], delta.recipe_ids])
+            self.recipe_vectors = _stack(np.asarray(self._base_recipe_vectors)[keep], delta.recipe_vectors)
+
+    def _top(self, embedding, k: int) -> List[Tuple[Document, float]]:
+        if k <= 0 or not self.documents:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self._base_vectors @ query if len(self._base_documents) else np.empty(0, dtype=np.float32)
+        if self._hidden is not None:
+            scores[self._hidden] = -np.inf
+            if len(self._delta_vectors):
+                scores = np.concatenate([scores, self._delta_vectors @ query])
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.documents[i], float(scores[i])) for i in best]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self._top(embedding, k)]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4) -> List[Tuple[Document, float]]:
+        """(document, distance) like Chroma: squared L2, i.e. 2 - 2 * cosine for unit vectors"""
+        return [(doc, 2 - 2 * score) for doc, score in self._top(embedding, k)]
+
+
+class VectorIndex:
+    """
+    Live handle to the active index generation.
+
+    ``reader()`` serves searches from the generation's memory-mapped snapshot
+    (falling back to Chroma for generations built before snapshots existed);
+    ``store()`` is the Chroma store writers use. Both notice when CURRENT has
+    moved (one os.stat per call) and switch over; in-flight requests keep the
+    object they already hold, so the swap never blocks or breaks a running query.
+    """
+
+    def __init__(self, embedding_function):
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._store: Optional["Chroma"] = None
+        self._generation: Optional[str] = None
+        self._pointer_mtime: Optional[float] = None
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._snapshot_generation: Optional[str] = None
+        self._snapshot_key: Optional[Tuple] = None
+        # Bumped on every swap or in-place write, so derived caches know to rebuild
+        self.version = 0
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self._generation
+
+    def mark_changed(self) -> None:
+        """Record an in-place write to the active generation (e.g. outbox sync)"""
+        self.version += 1
+
+    def _pointer_changed(self) -> bool:
+        return _mtime(CURRENT_POINTER) != self._pointer_mtime
+
+    def store(self) -> "Chroma":
+        """Return the Chroma store for the active generation"""
+        if self._store is None or self._pointer_changed():
+            self.reload()
+        return self._store
+
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """The active generation's published snapshot, or None if it has none"""
+        current_mtime = _mtime(CURRENT_POINTER)
+        generation = self._snapshot_generation
+        if self._snapshot_key is None or current_mtime != self._snapshot_key[0]:
+            generation = current_generation()
+        key = (current_mtime, generation, _mtime(snapshot_pointer(generation)))
+        if key != self._snapshot_key:
+            with self._lock:
+                if key != self._snapshot_key:
+                    pointer = _read_pointer(snapshot_pointer(generation))
+                    snapshot = None
+                    if pointer is not None:
+                        snapshot_id, _, delta_name = pointer.partition("/")
+                        path = os.path.join(snapshots_dir(generation), snapshot_id)
+                        snapshot = IndexSnapshot(
+                            path,
+                            os.path.join(path, delta_name) if delta_name else None,
+                            # Same base as before: only the (small) delta is read
+                            base=self._snapshot if self._snapshot_generation == generation else None,
+                        )
+                    self._snapshot = snapshot
+                    self._snapshot_generation = generation
+                    self._snapshot_key = key
+                    self.version += 1
+        return self._snapshot
+
+    def reader(self):
+        """What searches use: the snapshot, or the Chroma store without one"""
+        snapshot = self.snapshot()
+        return snapshot if snapshot is not None else self.store()
+
+    def retriever(self, k: int = 2):
+        return self.store().as_retriever(search_kwargs={"k": k})
+
+    def reload(self) -> None:
+        """Open whatever generation CURRENT points at and swap it in"""
+        with self._lock:
+            mtime = _mtime(CURRENT_POINTER)
+            name = current_generation()
+            if self._store is not None and name == self._generation:
+                self._pointer_mtime = mtime
+                return
+            # Imported here: chromadb is slow to import and only needed once queried
+            from langchain_chroma import Chroma
+            store = Chroma(
+                persist_directory=generation_path(name),
+                embedding_function=self.embedding_function
+            )
+            # Single reference assignment: readers see old or new, never a mix
+            self._store = store
+            self._generation = name
+            self._pointer_mtime = mtime
+            self.version += 1
+
+
+def build_generation(chunks, embedding_function) -> str:
+    """
+    Embed chunks into a brand-new generation, export its snapshot, then make
+    it the active one. Call it while holding the writer lock.
+    Returns the generation name. On failure the half-built directory is removed
+    and CURRENT is left untouched.
+    """
+    from langchain_chroma import Chroma
+
+    name = new_generation()
+    try:
+        store = Chroma.from_documents(
+            documents=chunks,
+            embedding=embedding_function,
+            persist_directory=generation_path(name)
+        )
+        export_snapshot(name, store)
+    except Exception:
+        shutil.rmtree(generation_path(name), ignore_errors=True)
+        raise
+    activate_generation(name)
+    prune_generations()
+    return name
@@ -0,0 +1,94 @@
+"""
+Check read/write routing against a primary and a read replica.
+
+Two SQLite files stand in for the primary and the replica. Both are migrated,
+then the replica is given a goal the primary doesn't have, so every response
+shows which database served it:
+
+    1. a client that never wrote reads from the replica
+    2. right after a write, the same client reads from the primary (read-your-writes)
+    3. once READ_YOUR_WRITES_SECONDS have passed, it reads from the replica again
+    4. a cached endpoint (GET /api/goals/{id}) still shows a client its own
+       update when another client has just read the stale replica copy
+
+    python benchmarks/check_read_replica.py
+
+Exits with status 1 if any step is routed to the wrong database.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOW_SECONDS = 1.0
+
+
+def migrate(url):
+    env = dict(os.environ, DATABASE_URL=url)
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+
+
+def goal_titles(client):
+    response = client.get("/api/goals", params={"user_id": 1})
+    response.raise_for_status()
+    return [goal["title"] for goal in response.json()["items"]]
+
+
+def goal_title(client, goal_id):
+    response = client.get(f"/api/goals/{goal_id}", params={"user_id": 1})
+    response.raise_for_status()
+    return response.json()["title"]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        primary, replica = os.path.join(tmp, "primary.db"), os.path.join(tmp, "replica.db")
+        migrate(f"sqlite:///{primary}")
+        migrate(f"sqlite:///{replica}")
+        with sqlite3.connect(replica) as connection:
+            connection.execute("INSERT INTO users (id) VALUES (1)")
+            connection.execute("INSERT INTO goals (user_id, title, status, target_recipes_per_week) VALUES (1, 'from replica', 'active', 2)")
+
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{primary}",
+            DATABASE_REPLICA_URL=f"sqlite:///{replica}",
+            READ_YOUR_WRITES_SECONDS=str(WINDOW_SECONDS),
+        )
+        os.environ.setdefault("OPENAI_API_KEY", "sk-check")
+        os.environ.setdefault("INDEX_SYNC_INTERVAL_SECONDS", "3600")
+        sys.path.insert(0, ROOT)
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        checks = []
+        with TestClient(app) as client:
+            checks.append(("read without a prior write -> replica", goal_titles(client), ["from replica"]))
+
+            client.post("/api/users").raise_for_status()
+            client.post("/api/goals", params={"user_id": 1}, json={"title": "from primary"}).raise_for_status()
+            checks.append(("read right after a write -> primary", goal_titles(client), ["from primary"]))
+
+            time.sleep(WINDOW_SECONDS + 0.2)
+            checks.append(("read after the window -> replica", goal_titles(client), ["from replica"]))
+
+            # Goal 1 exists in both databases with different titles
+            other = TestClient(app)
+            other.get("/api/goals/1", params={"user_id": 1}).raise_for_status()
+            client.put("/api/goals/1", params={"user_id": 1}, json={"title": "updated"}).raise_for_status()
+            checks.append(("another client reads the lagging replica", goal_title(other, 1), "from replica"))
+            checks.append(("cached read right after an update -> own write", goal_title(client, 1), "updated"))
+
+    failed = 0
+    for name, got, expected in checks:
+        ok = got == expected
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {got}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
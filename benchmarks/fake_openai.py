@@ -0,0 +1,156 @@
+"""
+Local OpenAI-compatible stand-in for load tests (no API key, no cost).
+
+Serves the two endpoints the app calls, with configurable latency:
+
+    POST /v1/embeddings         deterministic unit vectors (same text -> same vector)
+    POST /v1/chat/completions   a canned answer; with "stream": true it is sent as
+                                server-sent events, one chunk every --chunk-delay-ms
+
+Run it, then start the API with OPENAI_BASE_URL pointing at it:
+
+    python benchmarks/fake_openai.py --port 8799 --embedding-latency-ms 80 --chat-latency-ms 800
+    OPENAI_BASE_URL=http://127.0.0.1:8799/v1 OPENAI_API_KEY=sk-fake uvicorn app.main:app
+
+benchmarks/load_test.py starts it for you. GET /stats returns request counters,
+including "connections": distinct client connections (address, port) seen,
+i.e. how many connections the callers had to set up.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "Claro, porque obviamente nadie sabe hacer masa de pizza vegana. Mezcla harina, agua, "
+    "levadura, sal y aceite de oliva, amasa diez minutos y deja levar una hora. De nada."
+)
+
+
+class Settings:
+    embedding_latency_ms = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50"))
+    chat_latency_ms = float(os.getenv("FAKE_CHAT_LATENCY_MS", "500"))
+    chunk_delay_ms = float(os.getenv("FAKE_CHUNK_DELAY_MS", "20"))
+    dimensions = int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", "1536"))
+
+
+app = FastAPI(title="Fake OpenAI")
+stats = {"embedding_requests": 0, "embedding_inputs": 0, "chat_requests": 0, "connections": 0}
+_clients = set()
+
+
+def count_connection(request: Request):
+    if request.client and (request.client.host, request.client.port) not in _clients:
+        _clients.add((request.client.host, request.client.port))
+        stats["connections"] += 1
+
+
+def embed(text, dimensions, encoding_format="float"):
+    """Unit vector seeded by the text, so results are stable across runs"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    # The openai SDK asks for base64 (little-endian float32) by default
+    if encoding_format == "base64":
+        return base64.b64encode(vector.astype("<f4").tobytes()).decode()
+    return vector.tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    count_connection(request)
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(Settings.embedding_latency_ms / 1000)
+    dimensions = body.get("dimensions") or Settings.dimensions
+    stats["embedding_requests"] += 1
+    stats["embedding_inputs"] += len(inputs)
+    data = [
+        # Token-id inputs are embedded by their textual form
+        {"object": "embedding", "index": i, "embedding": embed(str(text), dimensions, body.get("encoding_format", "float"))}
+        for i, text in enumerate(inputs)
+    ]
+    tokens = sum(len(str(text).split()) for text in inputs)
+    return {"object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    count_connection(request)
+    body = await request.json()
+    model = body.get("model", "fake")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    completion_tokens = len(ANSWER.split())
+    stats["chat_requests"] += 1
+
+    if not body.get("stream"):
+        await asyncio.sleep(Settings.chat_latency_ms / 1000)
+        return {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    async def events():
+        # Time to first token, then one word per chunk
+        await asyncio.sleep(Settings.chat_latency_ms / 1000)
+        yield f"data: {json.dumps(_chunk(completion_id, model, {'role': 'assistant', 'content': ''}))}\n\n"
+        for word in ANSWER.split(" "):
+            await asyncio.sleep(Settings.chunk_delay_ms / 1000)
+            yield f"data: {json.dumps(_chunk(completion_id, model, {'content': word + ' '}))}\n\n"
+        yield f"data: {json.dumps(_chunk(completion_id, model, {}, 'stop'))}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}, {"id": "text-embedding-3-small", "object": "model"}]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return JSONResponse(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--embedding-latency-ms", type=float, default=Settings.embedding_latency_ms)
+    parser.add_argument("--chat-latency-ms", type=float, default=Settings.chat_latency_ms)
+    parser.add_argument("--chunk-delay-ms", type=float, default=Settings.chunk_delay_ms)
+    parser.add_argument("--dimensions", type=int, default=Settings.dimensions)
+    args = parser.parse_args()
+
+    Settings.embedding_latency_ms = args.embedding_latency_ms
+    Settings.chat_latency_ms = args.chat_latency_ms
+    Settings.chunk_delay_ms = args.chunk_delay_ms
+    Settings.dimensions = args.dimensions
+    # Keep idle connections open past the clients' keep-alive (uvicorn defaults to 5 s),
+    # so connection reuse is decided by the client pool under test
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", timeout_keep_alive=120)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Load test: goal endpoint latency while /ask is saturated.
+
+Floods POST /ask with concurrent requests (which fill the server's ask
+executor) and, at the same time, samples GET /api/goals sequentially. Goal handlers
+run on the event loop with the async engine, so their latency should stay flat.
+
+The flood runs in a separate process with its own client: sharing an event
+loop with 64 /ask callers would add the benchmark's own scheduling delay to
+every goal sample.
+
+Run against a running server:
+    python benchmarks/goals_under_ask_load.py --base-url http://localhost:8000 \
+        --ask-concurrency 64 --duration 30
+
+Exits with status 1 if the goal p95 exceeds --budget-ms (default 50).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def flood_ask(client, stop, counters):
+    while not stop.is_set():
+        try:
+            response = await client.post("/ask", json={"question": "¿Cómo hago masa de pizza vegana?"})
+            counters["ask_ok" if response.status_code == 200 else "ask_error"] += 1
+        except httpx.HTTPError:
+            counters["ask_error"] += 1
+
+
+async def _flood(base_url, concurrency, done):
+    counters = {"ask_ok": 0, "ask_error": 0}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        flooders = [asyncio.create_task(flood_ask(client, stop, counters)) for _ in range(concurrency)]
+        await asyncio.get_running_loop().run_in_executor(None, done.wait)
+        stop.set()
+        await asyncio.gather(*flooders)
+    return counters
+
+
+def flood_process(base_url, concurrency, done, results):
+    """Entry point of the flood process: /ask until done is set"""
+    results.put(asyncio.run(_flood(base_url, concurrency, done)))
+
+
+async def sample_goals(client, stop, latencies, counters):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.get("/api/goals")
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                counters["goals_error"] += 1
+        except httpx.HTTPError:
+            counters["goals_error"] += 1
+        await asyncio.sleep(0.01)
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        # Make sure user 1 exists so /api/goals returns 200
+        await client.post("/api/users")
+
+        # Baseline: goal latency with no /ask traffic
+        stop = asyncio.Event()
+        idle_latencies, counters = [], {"goals_error": 0}
+        sampler = asyncio.create_task(sample_goals(client, stop, idle_latencies, counters))
+        await asyncio.sleep(min(5, args.duration))
+        stop.set()
+        await sampler
+
+        # Under load
+        done, results = multiprocessing.Event(), multiprocessing.Queue()
+        flood = multiprocessing.Process(
+            target=flood_process, args=(args.base_url, args.ask_concurrency, done, results)
+        )
+        flood.start()
+        await asyncio.sleep(1)  # let /ask fill the thread pool
+        stop = asyncio.Event()
+        loaded_latencies = []
+        sampler = asyncio.create_task(sample_goals(client, stop, loaded_latencies, counters))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await sampler
+        done.set()
+        counters.update(await asyncio.get_running_loop().run_in_executor(None, results.get))
+        flood.join()
+
+    def summary(samples):
+        return {
+            "requests": len(samples),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "mean_ms": round(statistics.mean(samples), 2) if samples else 0.0,
+        }
+
+    return {
+        "ask_concurrency": args.ask_concurrency,
+        "duration_seconds": args.duration,
+        "goals_idle": summary(idle_latencies),
+        "goals_under_ask_load": summary(loaded_latencies),
+        **counters,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--ask-concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if report["goals_under_ask_load"]["p95_ms"] > args.budget_ms:
+        print(f"❌ /api/goals p95 above {args.budget_ms} ms while /ask is saturated")
+        raise SystemExit(1)
+    print(f"✅ /api/goals p95 within {args.budget_ms} ms while /ask is saturated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cold-start budget: how long a fresh interpreter takes to import app.main.
+
+Each run imports the app in a new process (nothing cached in memory, .pyc
+files already compiled), so the median is close to what a new container
+instance pays before it can serve /health. The run fails when the median
+exceeds the budget, or when a module that should load lazily (OpenAI SDK,
+Chroma, LangChain chains) is imported anyway.
+
+    python benchmarks/import_time.py                    # budget from IMPORT_BUDGET_MS (default 2000)
+    python benchmarks/import_time.py --budget-ms 1200 --runs 7
+    python benchmarks/import_time.py --output import_time.json
+
+The report lists the slowest top-level imports (python -X importtime) to show
+what to defer next.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by `import app.main`
+DEFERRED_MODULES = ("langchain_openai", "openai", "chromadb", "langchain_chroma", "langchain.chains")
+
+MEASURE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("DATABASE_URL", "sqlite:///./import_time_check.db")
+    env["PYTHONPATH"] = ROOT
+    return env
+
+
+def measure_once():
+    result = subprocess.run([sys.executable, "-c", MEASURE], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=10):
+    """Direct imports of app.main by cumulative time, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=ROOT,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # One leading space, then two more per nesting level; children are
+        # listed before the module that imported them
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative_us), name.strip()))
+        elif depth == 0:
+            if name.strip() == "app.main":
+                break
+            children = []
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(children, reverse=True)[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "2000")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    measure_once()  # Compile .pyc files and warm the OS page cache
+    runs = [measure_once() for _ in range(args.runs)]
+    timings_ms = [run["seconds"] * 1000 for run in runs]
+    loaded = sorted({module for run in runs for module in run["loaded"]})
+    median_ms = statistics.median(timings_ms)
+
+    report = {
+        "budget_ms": args.budget_ms,
+        "median_ms": round(median_ms, 1),
+        "min_ms": round(min(timings_ms), 1),
+        "max_ms": round(max(timings_ms), 1),
+        "runs": args.runs,
+        "deferred_modules_loaded": loaded,
+        "slowest_imports": slowest_imports(),
+    }
+    report["passed"] = median_ms <= args.budget_ms and not loaded
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    if loaded:
+        print(f"❌ app.main importa módulos que deberían cargarse al primer uso: {', '.join(loaded)}")
+    if median_ms > args.budget_ms:
+        print(f"❌ Importar app.main tarda {median_ms:.0f} ms (presupuesto: {args.budget_ms:.0f} ms)")
+    if report["passed"]:
+        print(f"✅ Importar app.main tarda {median_ms:.0f} ms (presupuesto: {args.budget_ms:.0f} ms)")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
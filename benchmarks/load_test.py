@@ -0,0 +1,241 @@
+"""
+End-to-end load test of /ask, /api/goals and /health against a fake OpenAI.
+
+Starts benchmarks/fake_openai.py (configurable embedding/chat latency) and the
+API with uvicorn on a throwaway SQLite database and Chroma directory, with
+OPENAI_BASE_URL pointing at the fake, so /ask runs its real code path without
+an API key or cost. Each endpoint is then driven at every concurrency level
+for --duration seconds, and throughput, p50/p95/p99 latency and error rate are
+reported as JSON.
+
+    python benchmarks/load_test.py --concurrency 1,8,32,64 --duration 10 --output after.json
+    python benchmarks/load_test.py --chat-latency-ms 1500 --compare after.json
+
+--compare prints the change in throughput and p95 against a previous report.
+With --base-url the servers are not started and the given API is tested.
+--workers runs the API as that many uvicorn worker processes:
+
+    for n in 1 2 4; do python benchmarks/load_test.py --workers $n --output workers-$n.json; done
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION = "¿Cómo hago masa de pizza vegana?"
+
+SCENARIOS = {
+    "ask": ("POST", "/ask", {"question": QUESTION}),
+    "goals": ("GET", "/api/goals", None),
+    "health": ("GET", "/health", None),
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
+
+
+def start_fake_openai(args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"), "--port", str(args.fake_port),
+         "--embedding-latency-ms", str(args.embedding_latency_ms),
+         "--chat-latency-ms", str(args.chat_latency_ms),
+         "--chunk-delay-ms", str(args.chunk_delay_ms)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_up(f"http://127.0.0.1:{args.fake_port}/v1/models", process)
+    return process
+
+
+def start_api(args, tmp):
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load_test.db')}",
+        CHROMA_DIR=os.path.join(tmp, "chroma_db"),
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+        OPENAI_API_KEY="sk-fake",
+        LOG_LEVEL="WARNING",
+    )
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+    subprocess.run([sys.executable, "-m", "app.seed_recipes"], cwd=ROOT, env=env, capture_output=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_up(f"http://127.0.0.1:{args.port}/health", process)
+    return process
+
+
+def prepare_data(base_url):
+    """A user with a few goals, and a recipe index for /ask to search"""
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        client.post("/api/users").raise_for_status()
+        for i in range(20):
+            client.post("/api/goals", json={"title": f"Load test goal {i}", "target_skill": "dough"})
+        job = client.post("/api/ingest", json={"sources": ["recipes"]}).json()
+        deadline = time.time() + 120
+        while job.get("status") in ("pending", "running") and time.time() < deadline:
+            time.sleep(0.5)
+            job = client.get(f"/api/ingest/{job['id']}").json()
+    if job.get("status") != "completed":
+        # /ask still runs end to end, searching an empty index
+        print(f"⚠️  La ingesta no se completó ({job.get('error') or job.get('status')}); /ask buscará en un índice vacío")
+    return job.get("status")
+
+
+async def run_level(base_url, scenario, concurrency, duration):
+    method, path, body = SCENARIOS[scenario]
+    latencies, errors = [], 0
+    stop = asyncio.Event()
+
+    async def worker(client):
+        nonlocal errors
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await client.request(method, path, json=body)  # Untimed: first-use loading isn't steady state
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(worker(client)) for _ in range(concurrency)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+    }
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparación con {baseline_path}:")
+    print(f"{'endpoint':<8} {'conc':>5} {'rps':>16} {'p95 ms':>20}")
+    for scenario, levels in report["results"].items():
+        for concurrency, result in levels.items():
+            before = baseline.get("results", {}).get(scenario, {}).get(concurrency)
+            if not before:
+                continue
+
+            def delta(key):
+                if not before[key]:
+                    return ""
+                return f"({(result[key] - before[key]) / before[key]:+.0%})"
+
+            print(f"{scenario:<8} {concurrency:>5} {result['throughput_rps']:>8} {delta('throughput_rps'):>7} "
+                  f"{result['p95_ms']:>10} {delta('p95_ms'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per endpoint and level")
+    parser.add_argument("--endpoints", default="ask,goals,health", help=f"Subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=500)
+    parser.add_argument("--chunk-delay-ms", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--fake-port", type=int, default=8799)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the API")
+    parser.add_argument("--base-url", help="Test this running API instead of starting one")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [name.strip() for name in args.endpoints.split(",")]
+    report = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                         capture_output=True, text=True).stdout.strip() or None,
+            "python": platform.python_version(),
+            "duration_seconds": args.duration,
+            "workers": None if args.base_url else args.workers,
+            "cpu_count": os.cpu_count(),
+            "fake_openai": None if args.base_url else {
+                "embedding_latency_ms": args.embedding_latency_ms,
+                "chat_latency_ms": args.chat_latency_ms,
+                "chunk_delay_ms": args.chunk_delay_ms,
+            },
+        },
+        "results": {},
+    }
+
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            base_url = args.base_url
+            if base_url is None:
+                processes.append(start_fake_openai(args))
+                processes.append(start_api(args, tmp))
+                base_url = f"http://127.0.0.1:{args.port}"
+                report["meta"]["ingest"] = prepare_data(base_url)
+
+            for scenario in scenarios:
+                report["results"][scenario] = {}
+                for concurrency in levels:
+                    result = asyncio.run(run_level(base_url, scenario, concurrency, args.duration))
+                    report["results"][scenario][str(concurrency)] = result
+                    print(f"{scenario:<8} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                          f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                          f"errores={result['error_rate']:.1%}", flush=True)
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
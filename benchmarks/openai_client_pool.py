@@ -0,0 +1,147 @@
+"""
+Connection reuse of the OpenAI clients: one shared pool vs. one per client.
+
+Runs the same workload (an embedding call followed by a chat completion, the
+two calls of an /ask) from --concurrency threads against
+benchmarks/fake_openai.py, with the clients built three ways:
+
+    fresh      new clients for every sequence (what ask.py and each ingestion
+               job did: every run opened its own connections)
+    separate   one embeddings and one chat client, each with its own default
+               pool (the API before the shared pool)
+    shared     app.openai_clients: both clients on one keep-alive pool
+
+For each mode it reports the p50/p95 latency of a sequence and how many
+connections the fake server saw, i.e. how many TCP (+TLS against the real API)
+setups the callers paid for.
+
+    python benchmarks/openai_client_pool.py
+    python benchmarks/openai_client_pool.py --concurrency 16 --requests 20 --pause-ms 6000 --output pool.json
+
+--pause-ms adds idle time between a thread's sequences: the openai SDK drops
+idle connections after 5 s, the shared pool keeps them OPENAI_KEEPALIVE_SECONDS.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+from load_test import percentile, start_fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION = "¿Cómo hago masa de pizza vegana?"
+MODES = ("fresh", "separate", "shared")
+
+
+def build_clients(mode, base_url):
+    """Embeddings and chat client factories for a mode (called per sequence)"""
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+    def unshared():
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", base_url=base_url,
+                                      check_embedding_ctx_length=False, timeout=30, max_retries=2)
+        chat = ChatOpenAI(model="gpt-4o-mini", temperature=0, base_url=base_url, timeout=60, max_retries=2)
+        return embeddings, chat
+
+    if mode == "fresh":
+        return unshared
+    if mode == "separate":
+        clients = unshared()
+        return lambda: clients
+
+    from app import openai_clients
+    return lambda: (openai_clients.get_embeddings(), openai_clients.get_chat_model())
+
+
+def run_mode(mode, args, fake_url):
+    clients_for_sequence = build_clients(mode, f"{fake_url}/v1")
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        for i in range(args.requests):
+            start = time.perf_counter()
+            try:
+                embeddings, chat = clients_for_sequence()
+                embeddings.embed_query(f"{QUESTION} {worker_id}-{i}")
+                chat.invoke(QUESTION)
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            if args.pause_ms:
+                time.sleep(args.pause_ms / 1000)
+
+    connections_before = httpx.get(f"{fake_url}/stats").json()["connections"]
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    connections = httpx.get(f"{fake_url}/stats").json()["connections"] - connections_before
+
+    return {
+        "sequences": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "connections": connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=25, help="Sequences per thread")
+    parser.add_argument("--pause-ms", type=float, default=0, help="Idle time between a thread's sequences")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Subset of {','.join(MODES)}")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=200)
+    parser.add_argument("--chunk-delay-ms", type=float, default=0)
+    parser.add_argument("--fake-port", type=int, default=8798)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    # Read by app.openai_clients on import, and by the openai SDK
+    os.environ["OPENAI_BASE_URL"] = f"{fake_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("OPENAI_POOL_SIZE", str(args.concurrency))
+    sys.path.insert(0, ROOT)
+
+    report = {
+        "concurrency": args.concurrency,
+        "requests_per_thread": args.requests,
+        "pause_ms": args.pause_ms,
+        "fake_openai": {"embedding_latency_ms": args.embedding_latency_ms, "chat_latency_ms": args.chat_latency_ms},
+        "results": {},
+    }
+    fake = start_fake_openai(args)
+    try:
+        for mode in args.modes.split(","):
+            result = run_mode(mode.strip(), args, fake_url)
+            report["results"][mode] = result
+            print(f"{mode:<9} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"conexiones={result['connections']} errores={result['errors']}", flush=True)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()